@@ -1,10 +1,12 @@
-import numpy as np
 from ultralytics import YOLO
 import cv2
 import cvzone
-import math
 import time
-from sort import *
+from sort import BatchSort
+from roi import MaskROI
+from detections import DetectionFilter
+from scheduling import DetectionScheduler
+from counting import TrafficCounter
 
 # Open video file or webcam
 cap = cv2.VideoCapture("./video/Video.mp4")  # For Webcam, you can uncomment the lines below and set the webcam parameters
@@ -27,21 +29,29 @@ classNames = ["person", "bicycle", "car", "motorbike", "aeroplane", "bus", "trai
               "microwave", "oven", "toaster", "sink", "refrigerator", "book", "clock", "vase", "scissors",
               "teddy bear", "hair drier", "toothbrush"]
 
+# Vehicle classes above 0.3 confidence go to the tracker
+detectionFilter = DetectionFilter(classNames, {name: 0.3 for name in ["car", "truck", "bus", "motorbike"]})
+
 # Initialize previous and current time for FPS calculation
 prev_frame_time = 0
 new_frame_time = 0
 
-# Load mask
+# Load mask; only its bounding region is sent to the detector
 mask = cv2.imread("Masks/mask.png")
+roi = MaskROI(mask)
 
 # Initialize SORT tracker
-tracker = Sort(max_age=20, min_hits=3, iou_threshold=0.3)
-totalCount = []
+tracker = BatchSort(max_age=20, min_hits=3, iou_threshold=0.3)
 Count = 0
 
 # Define start and end points for counting
 start = [450, 347, 620, 347]
 end = [300, 447, 600, 447]
+# Counts a vehicle when its centroid's path crosses start, and uncounts it at end
+counter = TrafficCounter({'start': [start[:2], start[2:]], 'end': [end[:2], end[2:]]})
+
+# Detect at most every 4th frame when quiet; every frame near the counting lines
+scheduler = DetectionScheduler(max_interval=4)
 
 while True:
     new_frame_time = time.time()
@@ -50,32 +60,27 @@ while True:
     if not success:
         break
 
-    # Resize mask to match video frame size
-    mask_resized = cv2.resize(mask, (img.shape[1], img.shape[0]))
-    imgRegion = cv2.bitwise_and(img, mask_resized)
+    # Between detections the tracker carries vehicles on its Kalman predictions
+    detect = scheduler.step()
+    if detect:
+        # Crop to the mask's region of interest (mask resizing is cached per frame size)
+        imgRegion, (offset_x, offset_y) = roi.apply(img)
 
     imgGraphics = cv2.imread("assets/graphics.png", cv2.IMREAD_UNCHANGED)
     cvzone.overlayPNG(img, imgGraphics, (0, 0))
-    results = model(imgRegion, stream=True)
-
-    detections = np.empty((0, 5))
-    for r in results:
-        boxes = r.boxes
-        for box in boxes:
-            x1, y1, x2, y2 = box.xyxy[0]
-            x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-            w, h = x2 - x1, y2 - y1
-
-            conf = math.ceil((box.conf[0] * 100)) / 100
-            cls = int(box.cls[0])
-            currentClass = classNames[cls]
-
-            if (currentClass in ["car", "truck", "bus", "motorbike"] and conf > 0.3):
-                cvzone.cornerRect(img, (x1, y1, w, h), l=9)
-                currentArray = np.array([x1, y1, x2, y2, conf])
-                detections = np.vstack((detections, currentArray))
-
-    resultsTracker = tracker.update(detections)
+
+    if detect:
+        results = model(imgRegion, stream=True, imgsz=roi.imgsz(img))
+
+        detections, _ = detectionFilter(next(results).boxes, (offset_x, offset_y))
+        for x1, y1, x2, y2, conf in detections.astype(int):
+            cvzone.cornerRect(img, (x1, y1, x2 - x1, y2 - y1), l=9)
+
+        resultsTracker = tracker.update(detections)
+    else:
+        resultsTracker = tracker.predict()
+    scheduler.observe(resultsTracker, [start, end], unsettled=tracker.unsettled())
+
     cv2.line(img, (start[0], start[1]), (start[2], start[3]), (255, 0, 0), 5)
     cv2.line(img, (end[0], end[1]), (end[2], end[3]), (255, 0, 0), 5)
 
@@ -88,17 +93,13 @@ while True:
         cx, cy = x1 + w // 2, y1 + h // 2
         cv2.circle(img, (cx, cy), 5, (0, 0, 255), cv2.FILLED)
 
-        if start[0] < cx < start[2] and start[1] - 15 < cy < start[1] + 15:
-            if totalCount.count(Id) == 0:
-                totalCount.append(Id)
-                Count += 1
-                cv2.line(img, (start[0], start[1]), (start[2], start[3]), (0, 255, 0), 5)
-
-        if end[0] < cx < end[2] and end[1] - 15 < cy < end[1] + 15:
-            if totalCount.count(Id) != 0:
-                totalCount.remove(Id)
-                Count -= 1
-                cv2.line(img, (end[0], end[1]), (end[2], end[3]), (255, 0, 0), 5)
+    events = counter.update(resultsTracker, tracker.live_ids())
+    for Id, line, change in counter.tally(events, 'start', 'end'):
+        Count += change
+        if line == 'start':
+            cv2.line(img, (start[0], start[1]), (start[2], start[3]), (0, 255, 0), 5)
+        else:
+            cv2.line(img, (end[0], end[1]), (end[2], end[3]), (255, 0, 0), 5)
 
     cv2.putText(img, str(Count), (255, 100), cv2.FONT_HERSHEY_PLAIN, 5, (50, 50, 255), 8)
 
@@ -0,0 +1,181 @@
+"""
+Shared-memory channel between the headless worker and its viewers.
+
+The worker owns one fixed-size shared-memory slot per stream holding the newest
+JPEG frame and its metadata (counts, alerts), plus a status slot listing the
+streams and the worker's stats. Each write is guarded by a sequence number that is
+odd while the slot is being written, so readers copy a slot without locks and retry
+on a torn read. Viewers only ever see the newest frame; nothing queues up when a
+viewer is slow or absent.
+"""
+
+import os
+import sys
+import json
+import time
+import struct
+import logging
+from multiprocessing import shared_memory
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct('<QII')  # sequence, metadata length, data length
+SEQUENCE = struct.Struct('<Q')
+# Status of a channel whose worker has not published yet; never alive
+STARTING = {'streams': [], 'pid': None, 'heartbeat': 0.0, 'stats': {}}
+
+
+class SharedSlot:
+    """One seqlock-guarded [header | JSON metadata | data] shared-memory block"""
+
+    def __init__(self, name, meta_size=65536, data_size=0, create=False, untrack=True):
+        """
+        create: create the block (replacing a stale one) instead of attaching to it
+        untrack: before Python 3.13, when attaching, unregister the block from this process's
+                 resource tracker so it is not unlinked at exit; child processes of the creator
+                 share its tracker and pass False. From 3.13 attaching never registers the block.
+        Only the creator unlinks the block, in close().
+        """
+        self.name = name
+        self.meta_size = meta_size
+        self.create = create
+        if create:
+            size = HEADER.size + meta_size + data_size
+            try:
+                self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+            except FileExistsError:
+                # Left behind by a worker that did not shut down cleanly
+                logger.warning(f"Replacing existing shared memory {name}")
+                stale = shared_memory.SharedMemory(name)
+                stale.close()
+                stale.unlink()
+                self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+            HEADER.pack_into(self.shm.buf, 0, 0, 0, 0)
+        elif sys.version_info >= (3, 13):
+            self.shm = shared_memory.SharedMemory(name, track=False)
+        else:
+            self.shm = shared_memory.SharedMemory(name)
+            if untrack and os.name == 'posix':
+                # Attaching registers the block too; without this a viewer exiting
+                # would unlink the worker's memory
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(self.shm._name, 'shared_memory')
+        self.data_size = self.shm.size - HEADER.size - meta_size
+
+    @property
+    def sequence(self):
+        return SEQUENCE.unpack_from(self.shm.buf, 0)[0]
+
+    def write(self, meta, data=b''):
+        """Replace the slot's contents; raises ValueError if they do not fit"""
+        meta = json.dumps(meta).encode()
+        if len(meta) > self.meta_size or len(data) > self.data_size:
+            raise ValueError(f"{self.name}: {len(meta)} B metadata / {len(data)} B data exceed the slot")
+        buf = self.shm.buf
+        sequence = self.sequence
+        # Odd while in progress; the sequence alone is stored last so a reader never pairs
+        # the new sequence with old lengths
+        HEADER.pack_into(buf, 0, sequence + 1, len(meta), len(data))
+        buf[HEADER.size:HEADER.size + len(meta)] = meta
+        start = HEADER.size + self.meta_size
+        buf[start:start + len(data)] = data
+        SEQUENCE.pack_into(buf, 0, sequence + 2)
+
+    def read(self, retries=100):
+        """(sequence, metadata, data) of the last complete write; None before the first"""
+        buf = self.shm.buf
+        for _ in range(retries):
+            sequence = self.sequence
+            if sequence == 0:
+                return None
+            if sequence % 2 == 0:
+                _, meta_length, data_length = HEADER.unpack_from(buf, 0)
+                meta = bytes(buf[HEADER.size:HEADER.size + meta_length])
+                start = HEADER.size + self.meta_size
+                data = bytes(buf[start:start + data_length])
+                if self.sequence == sequence:
+                    return sequence, json.loads(meta), data
+            time.sleep(0.0005)
+        return None
+
+    def close(self):
+        self.shm.close()
+        if self.create:
+            self.shm.unlink()
+
+
+class ChannelPublisher:
+    """Worker side: newest JPEG and metadata per stream, plus worker status"""
+
+    def __init__(self, name, streams, frame_bytes, create=True):
+        """
+        name: channel name shared with the viewers
+        streams: stream names, in display order
+        frame_bytes: largest encoded frame a stream can publish
+        create: create the channel; False attaches to the channel of the parent process,
+                which keeps publishing the status and removes the channel
+        """
+        self.streams = list(streams)
+        self.status = SharedSlot(f"{name}-status", create=create, untrack=False)
+        self.slots = {stream: SharedSlot(f"{name}-{i}", data_size=frame_bytes, create=create, untrack=False)
+                      for i, stream in enumerate(self.streams)}
+        if create:
+            self.publish_status({})
+
+    def publish(self, stream, jpeg, meta):
+        self.slots[stream].write(meta, jpeg)
+
+    def publish_status(self, stats):
+        self.status.write({'streams': self.streams, 'pid': os.getpid(), 'heartbeat': time.time(), 'stats': stats})
+
+    def close(self):
+        for slot in (self.status, *self.slots.values()):
+            slot.close()
+
+
+class ChannelSubscriber:
+    """Viewer side; raises FileNotFoundError when no worker has created the channel"""
+
+    def __init__(self, name):
+        self.status_slot = SharedSlot(f"{name}-status")
+        self.last_status = STARTING
+        self.streams = self.status()['streams']
+        self.slots = {stream: SharedSlot(f"{name}-{i}") for i, stream in enumerate(self.streams)}
+
+    def status(self):
+        """The worker's last status: streams, pid, heartbeat (epoch seconds) and stats
+
+        Falls back to the last status read while the slot is being rewritten, and to
+        STARTING before the worker's first publish.
+        """
+        latest = self.status_slot.read()
+        if latest is not None:
+            self.last_status = latest[1]
+        return self.last_status
+
+    def alive(self, timeout=5.0):
+        """Whether the worker published its status within timeout seconds"""
+        return time.time() - self.status()['heartbeat'] < timeout
+
+    def wait(self, sequences, timeout=1.0, poll=0.005):
+        """Frames newer than sequences ({stream: sequence}, updated in place).
+
+        Returns {stream: (metadata, jpeg)} for every stream with a new frame, or {}
+        on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            updates = {}
+            for stream, slot in self.slots.items():
+                if slot.sequence != sequences.get(stream, 0):
+                    latest = slot.read()
+                    if latest is not None:
+                        sequences[stream] = latest[0]
+                        updates[stream] = latest[1:]
+            if updates or time.monotonic() >= deadline:
+                return updates
+            time.sleep(poll)
+
+    def close(self):
+        for slot in (self.status_slot, *self.slots.values()):
+            slot.close()
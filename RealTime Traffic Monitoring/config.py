@@ -0,0 +1,52 @@
+import os
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+# Configuration shared by the worker (worker.py) and the viewer (main.py)
+class Config:
+    TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
+    TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
+    TWILIO_FROM_NUMBER = os.getenv('TWILIO_FROM_NUMBER')
+    TWILIO_TO_NUMBER = os.getenv('TWILIO_TO_NUMBER')
+    YOLO_CUSTOM_MODEL = os.getenv('YOLO_CUSTOM_MODEL_PATH', '../Yolo-Weights/best-2.pt')
+    YOLO_STANDARD_MODEL = os.getenv('YOLO_STANDARD_MODEL_PATH', '../Yolo-Weights/yolov8l.pt')
+    FRAME_SIZE = (720, 640)
+    # Frames buffered per stream before the oldest are dropped
+    PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '2'))
+    # Largest number of frames (across all streams) sent to a model in one call
+    INFERENCE_MAX_BATCH = int(os.getenv('INFERENCE_MAX_BATCH', '8'))
+    # dual: both models on every frame; scheduled: standard model every SECOND_MODEL_INTERVAL
+    # frames or when the custom model is unsure; merged: one model trained for all classes
+    DETECTOR_MODE = os.getenv('DETECTOR_MODE', 'dual')
+    YOLO_MERGED_MODEL = os.getenv('YOLO_MERGED_MODEL_PATH', '../Yolo-Weights/merged.pt')
+    SECOND_MODEL_INTERVAL = int(os.getenv('SECOND_MODEL_INTERVAL', '5'))
+    AMBIGUITY_CONF = float(os.getenv('AMBIGUITY_CONF', '0.15'))
+    CROSS_MODEL_IOU = float(os.getenv('CROSS_MODEL_IOU', '0.5'))
+    # Adaptive detection: at most MAX_DETECTION_INTERVAL frames between detections per lane
+    # (1 = every frame); SORT predictions carry tracks across the skipped frames
+    MAX_DETECTION_INTERVAL = int(os.getenv('MAX_DETECTION_INTERVAL', '4'))
+    DENSE_TRACKS = int(os.getenv('DENSE_TRACKS', '8'))
+    FAST_TRACK_SPEED = float(os.getenv('FAST_TRACK_SPEED', '12'))
+    LINE_MARGIN = int(os.getenv('LINE_MARGIN', '40'))
+    # Accepted relative count error against per-frame detection (checked by scheduling.py)
+    COUNT_TOLERANCE = float(os.getenv('COUNT_TOLERANCE', '0.05'))
+    # Tracker association grid cell in px (about one vehicle); 0 compares every box pair
+    TRACKER_GRID_CELL = int(os.getenv('TRACKER_GRID_CELL', '0'))
+    # Worker: video files play at PLAYBACK_SPEED times their frame rate (0 = as fast as possible)
+    PLAYBACK_SPEED = float(os.getenv('PLAYBACK_SPEED', '1'))
+    LOOP_VIDEO = os.getenv('LOOP_VIDEO', 'true').lower() == 'true'
+    # Shared-memory channel the worker publishes annotated JPEG frames and counts on
+    CHANNEL_NAME = os.getenv('CHANNEL_NAME', 'traffic')
+    JPEG_QUALITY = int(os.getenv('JPEG_QUALITY', '80'))
+    # Streams to process (see streams.yaml) and the worker processes sharing them; WORKERS=0
+    # starts one worker per CORES_PER_WORKER cores, at most one per stream
+    STREAMS_CONFIG = os.getenv('STREAMS_CONFIG', 'streams.yaml')
+    WORKERS = int(os.getenv('WORKERS', '0'))
+    CORES_PER_WORKER = int(os.getenv('CORES_PER_WORKER', '4'))
+    # Estimated inference time a worker spends per batch; when its due streams need more,
+    # they take turns by inference time used (0 = detect every due stream)
+    INFERENCE_SLICE_MS = float(os.getenv('INFERENCE_SLICE_MS', '200'))
@@ -0,0 +1,154 @@
+"""
+Line-crossing and zone counting for tracked vehicles.
+
+Each stream has named polylines and zones. A crossing is detected when the segment
+from a track's previous centroid to its current one intersects a polyline, so fast
+vehicles cannot skip over a counting band. Per-track state lives in dicts and sets
+keyed by track ID and is evicted as soon as the tracker drops the ID.
+
+Line directions: 'forward' is a crossing onto the right-hand side of the polyline
+when walking from its first point to its last in image coordinates. For a line drawn
+left to right that means moving down the frame. 'backward' is the opposite.
+"""
+
+import numpy as np
+
+
+def scale_points(shapes, size):
+    """{name: [(x, y), ...]} given as fractions of the frame -> pixel arrays for size (w, h)"""
+    return {name: np.asarray(points, dtype=float) * size for name, points in shapes.items()}
+
+
+def _cross(origin, direction, points):
+    """z of the 2D cross product direction x (points - origin), broadcast over leading axes"""
+    offset = points - origin
+    return direction[..., 0] * offset[..., 1] - direction[..., 1] * offset[..., 0]
+
+
+def points_in_polygon(points, polygon):
+    """Even-odd rule: which (N, 2) points lie inside a closed (M, 2) polygon"""
+    a = polygon[None, :, :]
+    b = np.roll(polygon, -1, axis=0)[None, :, :]
+    x, y = points[:, None, 0], points[:, None, 1]
+    spans = (a[..., 1] > y) != (b[..., 1] > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cross = a[..., 0] + (y - a[..., 1]) * (b[..., 0] - a[..., 0]) / (b[..., 1] - a[..., 1])
+    return (spans & (x < x_cross)).sum(axis=1) % 2 == 1
+
+
+class TrafficCounter:
+    """Per-direction line crossings and zone entries/exits for one stream's tracks"""
+
+    def __init__(self, lines=None, zones=None):
+        """
+        lines: {name: [(x, y), ...]} open polylines in pixels
+        zones: {name: [(x, y), ...]} closed polygons in pixels
+        """
+        self.lines = {name: np.asarray(points, dtype=float) for name, points in (lines or {}).items()}
+        self.zones = {name: np.asarray(points, dtype=float) for name, points in (zones or {}).items()}
+        self.counts = {name: {'forward': 0, 'backward': 0} for name in self.lines}
+        self.counts.update({name: {'enter': 0, 'exit': 0} for name in self.zones})
+        self.previous = {}  # track id -> centroid when last seen
+        self.crossed = {name: {} for name in self.lines}  # track id -> direction of its last crossing
+        self.inside = {name: set() for name in self.zones}
+        self.entered = {name: set() for name in self.zones}  # tracks whose entry was counted
+        self.counted = set()  # tracks in the lane count, until they cross its exit line
+
+    def segments(self):
+        """All line segments as an (L, 4) [x1, y1, x2, y2] array"""
+        if not self.lines:
+            return np.empty((0, 4))
+        return np.concatenate([np.hstack((points[:-1], points[1:])) for points in self.lines.values()])
+
+    def has_crossed(self, track_id, line, direction=None):
+        """Whether a live track has crossed line (last in direction, if given)"""
+        last = self.crossed[line].get(track_id)
+        return last is not None and (direction is None or last == direction)
+
+    def tally(self, events, entry, exit):
+        """Lane-count changes for update()'s events: [(track_id, line, +1 or -1)]
+
+        A track adds 1 on its first forward crossing of entry and takes it back on a forward
+        crossing of exit, so a centroid jittering across either line is counted once.
+        """
+        changes = []
+        for track_id, name, direction in events:
+            if direction != 'forward':
+                continue
+            if name == entry and track_id not in self.counted:
+                self.counted.add(track_id)
+                changes.append((track_id, name, 1))
+            elif name == exit and track_id in self.counted:
+                self.counted.discard(track_id)
+                changes.append((track_id, name, -1))
+        return changes
+
+    def occupancy(self, zone):
+        return len(self.inside[zone])
+
+    def update(self, tracks, live_ids=None):
+        """Count this frame's tracker output; returns [(track_id, name, direction)] events
+
+        tracks: (N, 5) [x1, y1, x2, y2, id] from the tracker
+        live_ids: IDs the tracker still holds (e.g. BatchSort.live_ids()); state for any
+                  other ID is dropped
+        """
+        events = []
+        ids = tracks[:, 4].astype(int)
+        current = (tracks[:, :2] + tracks[:, 2:4]) / 2
+
+        seen = np.array([i in self.previous for i in ids], dtype=bool)
+        if self.lines and seen.any():
+            moved_ids = ids[seen]
+            start = np.array([self.previous[i] for i in moved_ids])
+            end = current[seen]
+            for name, points in self.lines.items():
+                a, b = points[None, :-1], points[None, 1:]
+                side_start = _cross(a, b - a, start[:, None]) < 0
+                side_end = _cross(a, b - a, end[:, None]) < 0
+                # Movement and line segment straddle each other; 0 counts as the positive side
+                move = (end - start)[:, None]
+                straddle = (_cross(start[:, None], move, a) < 0) != (_cross(start[:, None], move, b) < 0)
+                hits = (side_start != side_end) & straddle
+                for row in np.flatnonzero(hits.any(axis=1)):
+                    segment = hits[row].argmax()
+                    direction = 'forward' if side_start[row, segment] else 'backward'
+                    track_id = int(moved_ids[row])
+                    self.counts[name][direction] += 1
+                    self.crossed[name][track_id] = direction
+                    events.append((track_id, name, direction))
+
+        for name, polygon in self.zones.items():
+            inside, entered = self.inside[name], self.entered[name]
+            for track_id, now_inside, known in zip(ids.tolist(), points_in_polygon(current, polygon), seen):
+                was_inside = track_id in inside
+                if now_inside and not was_inside:
+                    inside.add(track_id)
+                    if known:
+                        entered.add(track_id)
+                        self.counts[name]['enter'] += 1
+                        events.append((track_id, name, 'enter'))
+                elif was_inside and not now_inside:
+                    inside.discard(track_id)
+                    # Tracks first seen inside never counted an entry, so their exit is not counted either
+                    if track_id in entered:
+                        entered.discard(track_id)
+                        self.counts[name]['exit'] += 1
+                        events.append((track_id, name, 'exit'))
+
+        self.previous.update(zip(ids.tolist(), current))
+        if live_ids is not None:
+            self.evict(live_ids)
+        return events
+
+    def evict(self, live_ids):
+        """Forget every track the tracker no longer holds"""
+        for track_id in [i for i in self.previous if i not in live_ids]:
+            del self.previous[track_id]
+            for crossed in self.crossed.values():
+                crossed.pop(track_id, None)
+            for inside in self.inside.values():
+                inside.discard(track_id)
+            for entered in self.entered.values():
+                entered.discard(track_id)
+            self.counted.discard(track_id)
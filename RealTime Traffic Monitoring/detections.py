@@ -0,0 +1,111 @@
+"""
+Vectorized detection ingestion.
+
+Instead of iterating over an ultralytics Boxes object box by box (one small
+tensor read per field per box) and growing the detections with np.vstack, the
+whole [x1, y1, x2, y2, conf, cls] table is copied to NumPy once. Class names are
+resolved to per-class confidence thresholds up front, so filtering is a single
+boolean index.
+
+Run as a script to compare both approaches at 10, 100 and 500 boxes per frame.
+"""
+
+import time
+
+import numpy as np
+
+from roi import shift_boxes
+
+
+def boxes_table(boxes):
+    """(N, 6+) [x1, y1, x2, y2, ..., conf, cls] array of an ultralytics Boxes, in one transfer"""
+    data = boxes.data
+    if hasattr(data, 'cpu'):
+        data = data.cpu().numpy()
+    return data
+
+
+class DetectionFilter:
+    """Per-class confidence thresholds turning model Boxes into the (N, 5) SORT input"""
+
+    def __init__(self, class_names, thresholds, default=None):
+        """
+        class_names: the model's names, as {id: name} or a list
+        thresholds: {class name: confidence a box must exceed}
+        default: threshold for classes not in thresholds (None drops them)
+        """
+        if not isinstance(class_names, dict):
+            class_names = dict(enumerate(class_names))
+        self.ids = {name: cls for cls, name in class_names.items()}
+        # Indexed by class id; inf never passes
+        self.thresholds = np.full(max(class_names) + 1, np.inf if default is None else default)
+        for name, threshold in thresholds.items():
+            if name in self.ids:
+                self.thresholds[self.ids[name]] = threshold
+
+    def class_mask(self, names):
+        """Boolean lookup over class ids that is True for the given class names"""
+        mask = np.zeros(len(self.thresholds), dtype=bool)
+        mask[[self.ids[name] for name in names if name in self.ids]] = True
+        return mask
+
+    def __call__(self, boxes, offset=(0, 0)):
+        """Returns (detections, classes): (N, 5) [x1, y1, x2, y2, conf] in frame coordinates
+        (integer pixel corners) and the (N,) class id of each kept box"""
+        data = boxes_table(boxes)
+        conf = data[:, -2]
+        classes = data[:, -1].astype(int)
+        keep = conf > self.thresholds[classes]
+        detections = np.empty((int(keep.sum()), 5))
+        detections[:, :4] = data[keep, :4].astype(int)
+        detections[:, 4] = conf[keep]
+        return shift_boxes(detections, offset), classes[keep]
+
+    def ambiguous(self, boxes, floor):
+        """Whether any box of a class this filter keeps scored between floor and its class's threshold"""
+        data = boxes_table(boxes)
+        conf = data[:, -2]
+        thresholds = self.thresholds[data[:, -1].astype(int)]
+        return bool(((conf >= floor) & (conf <= thresholds) & np.isfinite(thresholds)).any())
+
+
+def _per_box(boxes, class_names, wanted, threshold):
+    """The per-box loop DetectionFilter replaces, kept for the benchmark"""
+    detections = np.empty((0, 5))
+    for box in boxes:
+        x1, y1, x2, y2 = map(int, box.xyxy[0])
+        conf = float(box.conf[0])
+        cls = int(box.cls[0])
+        if class_names[cls] in wanted and conf > threshold:
+            detections = np.vstack((detections, [x1, y1, x2, y2, conf]))
+    return detections
+
+
+if __name__ == '__main__':
+    import torch
+    from ultralytics.engine.results import Boxes
+
+    class_names = {i: f"class{i}" for i in range(80)}
+    class_names.update({2: "car", 3: "motorbike", 5: "bus", 7: "truck"})
+    wanted = ["car", "truck", "bus", "motorbike"]
+    detection_filter = DetectionFilter(class_names, {name: 0.3 for name in wanted})
+    rng = np.random.default_rng(0)
+
+    for count in (10, 100, 500):
+        xy = rng.uniform(0, 600, (count, 2))
+        data = np.c_[xy, xy + rng.uniform(20, 120, (count, 2)), rng.uniform(0, 1, count), rng.integers(0, 8, count)]
+        boxes = Boxes(torch.tensor(data, dtype=torch.float32), (640, 720))
+
+        expected = _per_box(boxes, class_names, wanted, 0.3)
+        assert np.allclose(detection_filter(boxes)[0], expected)
+
+        timings = {}
+        for name, run in (("per-box", lambda: _per_box(boxes, class_names, wanted, 0.3)),
+                          ("vectorized", lambda: detection_filter(boxes))):
+            repeats = max(3, 2000 // count)
+            started = time.perf_counter()
+            for _ in range(repeats):
+                run()
+            timings[name] = (time.perf_counter() - started) / repeats * 1000
+        print(f"{count:4d} boxes: per-box {timings['per-box']:8.3f} ms, vectorized {timings['vectorized']:6.3f} ms "
+              f"({timings['per-box'] / timings['vectorized']:.0f}x)")
@@ -0,0 +1,178 @@
+"""
+Preallocated frame buffers.
+
+Every decoded frame used to be a fresh array: cap.read() allocated the full source
+resolution (25 MB per 4K frame), cv2.resize allocated the pipeline frame and the
+mask step allocated the detector crop. At 1080p and 4K those allocations (and the
+page faults that come with them) cost as much as the resize itself. A FramePool
+holds a fixed set of frames allocated once; stages pass FrameBuffer handles along
+and the last one to release a frame returns it to the pool. Resizes are written
+straight into a pooled frame.
+
+The pool is backed by a shared-memory block when given a name, so stages in other
+processes can map the same frames by index.
+
+Run as a script to compare per-frame allocations and time at 1080p and 4K:
+
+    python framepool.py
+    python framepool.py --video video/Video.mp4
+"""
+
+import time
+import queue
+import argparse
+import threading
+import tracemalloc
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+
+class FrameBuffer:
+    """Reference-counted handle on one pooled frame"""
+
+    __slots__ = ('pool', 'index', 'array', 'refs')
+
+    def __init__(self, pool, index, array):
+        self.pool = pool
+        self.index = index
+        self.array = array
+        self.refs = 0
+
+    def retain(self):
+        with self.pool.lock:
+            self.refs += 1
+
+    def release(self):
+        """Drop one reference; the frame goes back to the pool with the last one"""
+        with self.pool.lock:
+            self.refs -= 1
+            if self.refs:
+                return
+        self.pool.free.put(self.index)
+
+
+class FramePool:
+    """Fixed set of same-shape frames, allocated once and reused"""
+
+    def __init__(self, shape, count, dtype=np.uint8, name=None):
+        """
+        shape: (height, width, channels) of every frame
+        count: frames in the pool; acquire blocks while all of them are in use
+        name: back the pool with this shared-memory block instead of process memory
+        """
+        self.shape = tuple(shape)
+        self.shm = None
+        nbytes = count * int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if name is not None:
+            self.shm = shared_memory.SharedMemory(name, create=True, size=nbytes)
+            self.arrays = np.ndarray((count,) + self.shape, dtype, self.shm.buf)
+        else:
+            self.arrays = np.empty((count,) + self.shape, dtype)
+        self.buffers = [FrameBuffer(self, i, self.arrays[i]) for i in range(count)]
+        self.lock = threading.Lock()
+        self.free = queue.Queue()
+        for i in range(count):
+            self.free.put(i)
+        self.waits = 0
+
+    def acquire(self, timeout=None):
+        """A free frame holding one reference, or None if none freed up within timeout"""
+        try:
+            index = self.free.get_nowait()
+        except queue.Empty:
+            self.waits += 1
+            try:
+                index = self.free.get(timeout=timeout)
+            except queue.Empty:
+                return None
+        buffer = self.buffers[index]
+        buffer.refs = 1
+        return buffer
+
+    def stats(self):
+        return {'buffers': len(self.buffers), 'free': self.free.qsize(), 'waits': self.waits}
+
+    def close(self):
+        if self.shm is not None:
+            del self.buffers, self.arrays
+            self.shm.close()
+            self.shm.unlink()
+
+
+def _measure(step, frames):
+    """Milliseconds per frame and the largest allocation of any frame for step(i)"""
+    step(0)  # first call allocates reusable buffers
+    tracemalloc.start()
+    started = time.perf_counter()
+    for i in range(frames):
+        step(i)
+    elapsed = time.perf_counter() - started
+    allocated = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed / frames * 1000, allocated
+
+
+def benchmark(source_size, frame_size=(720, 640), frames=100, video=None):
+    """Decode (or copy a synthetic frame), resize and mask-crop, allocating vs pooled"""
+    from roi import MaskROI
+
+    width, height = source_size
+    mask = np.zeros((height, width, 3), np.uint8)
+    mask[height // 3:, width // 8:width * 7 // 8] = 255
+    source = np.random.default_rng(0).integers(0, 255, (height, width, 3), np.uint8)
+    cap = cv2.VideoCapture(video) if video else None
+
+    def decode(raw=None):
+        if cap is None:
+            if raw is None:
+                return source.copy()
+            np.copyto(raw, source)
+            return raw
+        success, frame = cap.read(raw)
+        if not success:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            success, frame = cap.read(raw)
+        return frame
+
+    roi = MaskROI(mask)
+
+    def allocating(i):
+        frame = cv2.resize(decode(), frame_size)
+        # MaskROI.apply before the crop buffer was reused
+        x1, y1, x2, y2, crop = roi._prepare(*frame_size)[:5]
+        cv2.bitwise_and(frame[y1:y2, x1:x2], crop)
+
+    pool = FramePool((frame_size[1], frame_size[0], 3), 4)
+    pooled_roi = MaskROI(mask)
+    raw = [None]
+
+    def pooled(i):
+        raw[0] = decode(raw[0])
+        buffer = pool.acquire()
+        cv2.resize(raw[0], frame_size, dst=buffer.array)
+        pooled_roi.apply(buffer.array)
+        buffer.release()
+
+    results = {name: _measure(step, frames) for name, step in (('allocating', allocating), ('pooled', pooled))}
+    if cap is not None:
+        cap.release()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-frame cost of allocating vs pooled frame buffers')
+    parser.add_argument('--video', help='Decode this video instead of copying a synthetic frame')
+    parser.add_argument('--frames', type=int, default=100)
+    args = parser.parse_args()
+
+    sizes = {'1080p': (1920, 1080), '4K': (3840, 2160)}
+    if args.video:
+        cap = cv2.VideoCapture(args.video)
+        sizes = {args.video: (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))}
+        cap.release()
+    for label, size in sizes.items():
+        results = benchmark(size, frames=args.frames, video=args.video)
+        print(f"{label}: " + ", ".join(f"{name} {ms:.2f} ms/frame, {allocated / 1e6:.1f} MB allocated per frame"
+                                       for name, (ms, allocated) in results.items()))
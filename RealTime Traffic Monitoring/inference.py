@@ -0,0 +1,95 @@
+"""
+Cross-stream batched inference.
+
+Frames gathered from every active camera are stacked into one batch so each model
+runs a single forward pass per pipeline step instead of one pass per stream.
+"""
+
+import time
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceScheduler:
+    """Run each model once over a batch of frames and scatter the results per frame"""
+
+    def __init__(self, models, max_batch=8):
+        """
+        models: {name: YOLO model}; every model sees every frame of a batch
+        max_batch: largest batch handed to a model in one call
+        """
+        self.models = models
+        self.max_batch = max_batch
+        self.model_calls = {name: 0 for name in models}
+        self.model_frames = {name: 0 for name in models}
+        self.model_seconds = {name: 0.0 for name in models}
+
+    def infer(self, images, names=None, imgsz=None):
+        """Detect on all images; returns [{model_name: Results}] aligned with images
+
+        names: models to run (default: all of them)
+        imgsz: detector input size for this call (default: the model's own)
+        """
+        outputs = [{} for _ in images]
+        if not images:
+            return outputs
+        options = {'verbose': False}
+        if imgsz:
+            options['imgsz'] = imgsz
+
+        for name in names or self.models:
+            model = self.models[name]
+            started = time.perf_counter()
+            for start in range(0, len(images), self.max_batch):
+                chunk = images[start:start + self.max_batch]
+                for offset, result in enumerate(model(chunk, **options)):
+                    outputs[start + offset][name] = result
+            self.model_seconds[name] += time.perf_counter() - started
+            self.model_calls[name] += 1
+            self.model_frames[name] += len(images)
+        return outputs
+
+    def stats(self):
+        """Per model: frames processed, average batch size and time per frame"""
+        return {
+            name: {
+                'frames': self.model_frames[name],
+                'avg_batch': round(self.model_frames[name] / self.model_calls[name], 2) if self.model_calls[name] else 0.0,
+                'ms_per_frame': round(seconds / self.model_frames[name] * 1000, 1) if self.model_frames[name] else 0.0
+            }
+            for name, seconds in self.model_seconds.items()
+        }
+
+
+def box_iou(boxes_a, boxes_b):
+    """Pairwise IoU between (N, 4+) and (M, 4+) [x1, y1, x2, y2, ...] arrays"""
+    a = boxes_a[:, None, :4]
+    b = boxes_b[None, :, :4]
+    w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = w * h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-9)
+
+
+def cross_model_nms(detections_a, detections_b, iou_threshold=0.5):
+    """Merge (N, 5) [x1, y1, x2, y2, conf] detections from two models.
+
+    Boxes are visited in confidence order and each kept box suppresses overlapping
+    boxes from the other model only; each model's own NMS is left untouched.
+    """
+    if not len(detections_a) or not len(detections_b):
+        return np.vstack((detections_a, detections_b))
+
+    detections = np.vstack((detections_a, detections_b))
+    source = np.r_[np.zeros(len(detections_a), dtype=bool), np.ones(len(detections_b), dtype=bool)]
+    duplicate = (box_iou(detections, detections) > iou_threshold) & (source[:, None] != source[None, :])
+    suppressed = np.zeros(len(detections), dtype=bool)
+    for i in np.argsort(-detections[:, 4], kind='stable'):
+        if not suppressed[i]:
+            suppressed |= duplicate[i]
+    return detections[~suppressed]
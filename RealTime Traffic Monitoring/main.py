@@ -1,52 +1,16 @@
 import streamlit as st
-import cv2
-from ultralytics import YOLO
-import cvzone
-from sort import *
-import time
 import pandas as pd
-import os
-from dotenv import load_dotenv
 import requests
 from twilio.rest import Client
 from twilio.twiml.voice_response import VoiceResponse
 import logging
-
-# Load environment variables
-load_dotenv()
+from config import Config
+from channel import ChannelSubscriber
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configuration
-class Config:
-    TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
-    TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
-    TWILIO_FROM_NUMBER = os.getenv('TWILIO_FROM_NUMBER')
-    TWILIO_TO_NUMBER = os.getenv('TWILIO_TO_NUMBER')
-    YOLO_CUSTOM_MODEL = os.getenv('YOLO_CUSTOM_MODEL_PATH', '../Yolo-Weights/best-2.pt')
-    YOLO_STANDARD_MODEL = os.getenv('YOLO_STANDARD_MODEL_PATH', '../Yolo-Weights/yolov8l.pt')
-
-# Load models and assets only once
-@st.cache_resource
-def load_models_and_assets():
-    try:
-        model = YOLO(Config.YOLO_CUSTOM_MODEL)
-        model2 = YOLO(Config.YOLO_STANDARD_MODEL)
-        classNames = list(model.names.values())
-        mask1 = cv2.imread("Masks/mask.png")
-        mask2 = cv2.imread("Masks/mask3.png")
-        
-        if mask1 is None or mask2 is None:
-            st.error("❌ Failed to load mask images. Please check Masks/ directory.")
-            st.stop()
-            
-        return model, model2, classNames, mask1, mask2
-    except Exception as e:
-        st.error(f"❌ Failed to load models: {e}")
-        st.stop()
-
 # Emergency services integration
 def get_location():
     """Get current location using IP geolocation"""
@@ -96,18 +60,24 @@ def send_emergency_alert(location_data):
         logger.error(f"Twilio call failed: {e}")
         return False
 
-model, model2, classNames, mask1, mask2 = load_models_and_assets()
+# Detection, tracking and counting run in the headless worker (worker.py); this page
+# only shows what it publishes on the shared-memory channel
+def connect_worker():
+    """Subscriber to the worker's channel, or None while no worker is running"""
+    subscriber = st.session_state.get('subscriber')
+    if subscriber is not None and subscriber.alive():
+        return subscriber
+    if subscriber is not None:
+        subscriber.close()
+    try:
+        subscriber = ChannelSubscriber(Config.CHANNEL_NAME)
+    except FileNotFoundError:
+        subscriber = None
+    st.session_state.subscriber = subscriber
+    return subscriber
 
 # Session state initialization
-if 'cap1' not in st.session_state:
-    st.session_state.cap1 = cv2.VideoCapture("video/Video.mp4")
-    st.session_state.cap2 = cv2.VideoCapture("video/accident.mp4")
-    st.session_state.tracker1 = Sort(max_age=20, min_hits=3, iou_threshold=0.3)
-    st.session_state.tracker2 = Sort(max_age=20, min_hits=3, iou_threshold=0.3)
-    st.session_state.totalCount1 = []
-    st.session_state.totalCount2 = []
-    st.session_state.count1 = 0
-    st.session_state.count2 = 0
+if 'detection_stats' not in st.session_state:
     st.session_state.emergency_sent = False
     st.session_state.detection_stats = {'total_vehicles': 0, 'accidents': 0, 'priority_vehicles': 0}
 
@@ -191,95 +161,24 @@ with st.sidebar:
         show_debug_info = st.checkbox("Show Debug Info", False)
         emergency_mode = st.checkbox("Emergency Alerts Enabled", True)
     
-    with st.expander("📹 Video Controls", expanded=True):
-        video_speed = st.selectbox(
-            "Playback Speed",
-            ["0.5x", "1x", "1.5x", "2x"],
-            index=1
-        )
-        loop_video = st.checkbox("Loop Video", True)
-    
+
     st.markdown("### 📊 Live Statistics")
     stats_placeholder = st.empty()
     
     st.markdown("### 🚨 System Status")
     status_placeholder = st.empty()
 
-col1, col2 = st.columns(2)
-
-# Function to process frame
-def process_frame(img, tracker, totalCount, count, mask, show_lines=True, counting_enabled=True):
-    mask_resized = cv2.resize(mask, (img.shape[1], img.shape[0]))
-    imgRegion = cv2.bitwise_and(img, mask_resized)
-    height, width = img.shape[:2]
-
-    entry_line_y = int(height * 0.65)
-    exit_line_y = int(height * 0.95)
-
-    results1 = model(imgRegion, stream=True)
-    results2 = model2(imgRegion, stream=True)
-
-    detections = np.empty((0, 5))
-    lane_priority_active = False
-    accident_active = False
-
-    for r in results1:
-        for box in r.boxes:
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            conf = float(box.conf[0])
-            cls = int(box.cls[0])
-            currentClass = classNames[cls]
-
-            if currentClass == "accident" and conf > 0.3:
-                accident_active = True
-                detections = np.vstack((detections, [x1, y1, x2, y2, conf]))
-            if currentClass in ["ambulance_active", "firetruck_active", "police_active"] and conf > 0.3:
-                lane_priority_active = True
-                detections = np.vstack((detections, [x1, y1, x2, y2, conf]))
-            if currentClass in ["car", "truck", "bus", "motorbike"] and conf > 0.3:
-                detections = np.vstack((detections, [x1, y1, x2, y2, conf]))
-
-    for r in results2:
-        for box in r.boxes:
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            conf = float(box.conf[0])
-            if conf > 0.5:
-                detections = np.vstack((detections, [x1, y1, x2, y2, conf]))
-
-    resultsTracker = tracker.update(detections)
-
-    if show_lines:
-        cv2.line(img, (0, entry_line_y), (width, entry_line_y), (255, 255, 0), 4)
-        cv2.line(img, (0, exit_line_y), (width, exit_line_y), (255, 0, 255), 4)
-
-    if counting_enabled and show_lines:
-        for result in resultsTracker:
-            x1, y1, x2, y2, Id = map(int, result)
-            cx, cy = x1 + (x2 - x1) // 2, y1 + (y2 - y1) // 2
-            cvzone.cornerRect(img, (x1, y1, x2 - x1, y2 - y1), l=9, rt=2, colorR=(0, 0, 255))
-            cvzone.putTextRect(img, f'ID {Id}', (max(0, x1), max(35, y1)), scale=1, thickness=2, offset=6)
-
-            if entry_line_y - 10 < cy < entry_line_y + 10 and Id not in totalCount:
-                totalCount.append(Id)
-                count += 1
-                cv2.line(img, (0, entry_line_y), (width, entry_line_y), (0, 255, 0), 4)
-            if exit_line_y - 10 < cy < exit_line_y + 10 and Id in totalCount:
-                totalCount.remove(Id)
-                count -= 1
-                cv2.line(img, (0, exit_line_y), (width, exit_line_y), (0, 0, 255), 4)
-    else:
-        for result in resultsTracker:
-            x1, y1, x2, y2, Id = map(int, result)
-            cvzone.cornerRect(img, (x1, y1, x2 - x1, y2 - y1), l=9, rt=2, colorR=(0, 0, 255))
-            cvzone.putTextRect(img, f'ID {Id}', (max(0, x1), max(35, y1)), scale=1, thickness=2, offset=6)
 
-    return img, tracker, totalCount, count, lane_priority_active, accident_active
+subscriber = connect_worker()
+stream_names = subscriber.streams if subscriber is not None else []
 
-# Placeholders for live update
-frame_placeholder1 = col1.empty()
-frame_placeholder2 = col2.empty()
-priority_placeholder1 = col1.empty()
-priority_placeholder2 = col2.empty()
+# Placeholders for live update, GRID_COLUMNS streams per row in registry order
+GRID_COLUMNS = 2
+frame_placeholders, priority_placeholders = {}, {}
+for row in range(0, len(stream_names), GRID_COLUMNS):
+    for name, column in zip(stream_names[row:row + GRID_COLUMNS], st.columns(GRID_COLUMNS)):
+        frame_placeholders[name] = column.empty()
+        priority_placeholders[name] = column.empty()
 table_placeholder = st.empty()
 
 # Enhanced video controls
@@ -293,6 +192,8 @@ with control_col1:
 
 with control_col2:
     if st.button("🔄 Reset System", use_container_width=True):
+        if subscriber is not None:
+            subscriber.close()
         st.session_state.clear()
         st.rerun()
 
@@ -302,121 +203,99 @@ with control_col3:
 
 play_active = st.session_state.get('play', False)
 
-if play_active:
-    while st.session_state.cap1.isOpened() and st.session_state.cap2.isOpened():
-        ret1, frame1 = st.session_state.cap1.read()
-        ret2, frame2 = st.session_state.cap2.read()
-
-        if not ret1 or not ret2:
-            st.warning("🎮 End of video reached.")
+if play_active and subscriber is None:
+    st.error("❌ Traffic worker is not running. Start it with `python worker.py`.")
+elif play_active:
+    sequences, latest = {}, {}
+    while True:
+        if not subscriber.alive():
+            st.warning("🎮 Traffic worker stopped.")
             break
-
-        frame1 = cv2.resize(frame1, (720, 640))
-        frame2 = cv2.resize(frame2, (720, 640))
-
-        img1, st.session_state.tracker1, st.session_state.totalCount1, st.session_state.count1, priority1, accident1 = process_frame(
-            frame1, st.session_state.tracker1, st.session_state.totalCount1, st.session_state.count1, mask1, show_lines=True, counting_enabled=True)
-
-        img2, st.session_state.tracker2, st.session_state.totalCount2, st.session_state.count2, priority2, accident2 = process_frame(
-            frame2, st.session_state.tracker2, st.session_state.totalCount2, st.session_state.count2, mask2, show_lines=False, counting_enabled=False)
-
-        img1 = cv2.cvtColor(img1, cv2.COLOR_BGR2RGB)
-        img2 = cv2.cvtColor(img2, cv2.COLOR_BGR2RGB)
-
-        frame_placeholder1.image(img1, channels="RGB", caption=f"Lane 1 Count: {st.session_state.count1}", use_container_width=True)
-        frame_placeholder2.image(img2, channels="RGB", caption=f"Lane 2 Count: {st.session_state.count2}", use_container_width=True)
+        # Newest frame of each stream; frames published while the page renders are skipped
+        updates = subscriber.wait(sequences)
+        for name, (meta, jpeg) in updates.items():
+            latest[name] = meta
+            frame_placeholders[name].image(jpeg, caption=f"{name} Count: {meta['count']} | {meta['fps']:.1f} FPS",
+                                             use_container_width=True)
+        if not updates or len(latest) < len(stream_names):
+            continue
+
+        counts = {name: latest[name]['count'] for name in stream_names}
+        any_accident = any(latest[name]['accident'] for name in stream_names)
+        any_priority = any(latest[name]['priority'] for name in stream_names)
 
         # Handle emergency situations
-        if (accident1 or accident2) and emergency_mode and not st.session_state.emergency_sent:
+        if any_accident and emergency_mode and not st.session_state.emergency_sent:
             location_data = get_location()
             if send_emergency_alert(location_data):
                 st.session_state.emergency_sent = True
                 st.session_state.detection_stats['accidents'] += 1
 
         # Enhanced priority/emergency alerts
-        if accident1:
-            priority_placeholder1.markdown(
-                '<div class="emergency-alert">🆘 EMERGENCY - ACCIDENT DETECTED!</div>', 
-                unsafe_allow_html=True
-            )
-        elif priority1:
-            priority_placeholder1.markdown(
-                '<div class="priority-alert">🚨 PRIORITY LANE 1 ACTIVE</div>', 
-                unsafe_allow_html=True
-            )
-            st.session_state.detection_stats['priority_vehicles'] += 1
-        else:
-            priority_placeholder1.markdown(
-                '<div class="normal-status">✅ Lane 1 - Normal Traffic</div>', 
-                unsafe_allow_html=True
-            )
-
-        if accident2:
-            priority_placeholder2.markdown(
-                '<div class="emergency-alert">🆘 EMERGENCY - ACCIDENT DETECTED!</div>', 
-                unsafe_allow_html=True
-            )
-        elif priority2:
-            priority_placeholder2.markdown(
-                '<div class="priority-alert">🚨 PRIORITY LANE 2 ACTIVE</div>', 
-                unsafe_allow_html=True
-            )
-        else:
-            priority_placeholder2.markdown(
-                '<div class="normal-status">✅ Lane 2 - Normal Traffic</div>', 
-                unsafe_allow_html=True
-            )
+        for name in stream_names:
+            if latest[name]['accident']:
+                priority_placeholders[name].markdown(
+                    '<div class="emergency-alert">🆘 EMERGENCY - ACCIDENT DETECTED!</div>', 
+                    unsafe_allow_html=True
+                )
+            elif latest[name]['priority']:
+                priority_placeholders[name].markdown(
+                    f'<div class="priority-alert">🚨 PRIORITY {name.upper()} ACTIVE</div>', 
+                    unsafe_allow_html=True
+                )
+                st.session_state.detection_stats['priority_vehicles'] += 1
+            else:
+                priority_placeholders[name].markdown(
+                    f'<div class="normal-status">✅ {name} - Normal Traffic</div>', 
+                    unsafe_allow_html=True
+                )
 
         # Update statistics
-        st.session_state.detection_stats['total_vehicles'] = st.session_state.count1 + st.session_state.count2
+        st.session_state.detection_stats['total_vehicles'] = sum(counts.values())
+        previous_counts = st.session_state.detection_stats.get('prev_counts', {})
         
         # Enhanced metrics and status table
         st.markdown("### 📊 Traffic Management Dashboard")
         
-        # Metrics row
-        metric_col1, metric_col2, metric_col3, metric_col4 = st.columns(4)
+        # Metrics row: total, one per lane, emergencies
+        metric_cols = st.columns(len(stream_names) + 2)
         
-        with metric_col1:
+        with metric_cols[0]:
             st.metric(
                 "🚗 Total Vehicles", 
                 st.session_state.detection_stats['total_vehicles'],
-                delta=st.session_state.count1 + st.session_state.count2 - st.session_state.detection_stats.get('prev_total', 0)
+                delta=sum(counts.values()) - st.session_state.detection_stats.get('prev_total', 0)
             )
         
-        with metric_col2:
-            st.metric(
-                "🚨 Lane 1 Count", 
-                st.session_state.count1,
-                delta=st.session_state.count1 - st.session_state.detection_stats.get('prev_count1', 0)
-            )
+        for metric_col, name in zip(metric_cols[1:-1], stream_names):
+            with metric_col:
+                st.metric(
+                    f"🚨 {name} Count", 
+                    counts[name],
+                    delta=counts[name] - previous_counts.get(name, 0)
+                )
         
-        with metric_col3:
-            st.metric(
-                "🚨 Lane 2 Count", 
-                st.session_state.count2,
-                delta=st.session_state.count2 - st.session_state.detection_stats.get('prev_count2', 0)
-            )
-        
-        with metric_col4:
+        with metric_cols[-1]:
             st.metric(
                 "🆘 Emergencies", 
                 st.session_state.detection_stats['accidents'],
-                delta=1 if (accident1 or accident2) and not st.session_state.emergency_sent else 0
+                delta=1 if any_accident and not st.session_state.emergency_sent else 0
             )
         
         # Enhanced status table
         priority_data = {
-            "🛣️ Lane": ["Lane 1", "Lane 2"],
-            "🚗 Vehicles": [st.session_state.count1, st.session_state.count2],
+            "🛣️ Lane": stream_names,
+            "🚗 Vehicles": [counts[name] for name in stream_names],
             "📊 Status": [
-                "🆘 EMERGENCY" if accident1 else "🚨 PRIORITY" if priority1 else "✅ Normal",
-                "🆘 EMERGENCY" if accident2 else "🚨 PRIORITY" if priority2 else "✅ Normal"
+                "🆘 EMERGENCY" if latest[name]['accident'] else "🚨 PRIORITY" if latest[name]['priority'] else "✅ Normal"
+                for name in stream_names
             ],
             "⚡ Action": [
-                "🛑 Stop All Traffic" if accident1 else "⚡ Give Priority" if priority1 else "➡️ Continue",
-                "🛑 Stop All Traffic" if accident2 else "⚡ Give Priority" if priority2 else "➡️ Continue"
+                "🛑 Stop All Traffic" if latest[name]['accident'] else "⚡ Give Priority" if latest[name]['priority'] else "➡️ Continue"
+                for name in stream_names
             ],
-            "⏱️ Duration": ["Real-time", "Real-time"]
+            "🎞️ FPS": [latest[name]['fps'] for name in stream_names],
+            "⏱️ Duration": ["Real-time"] * len(stream_names)
         }
         
         df = pd.DataFrame(priority_data)
@@ -428,8 +307,7 @@ if play_active:
         
         # Update previous values for delta calculation
         st.session_state.detection_stats['prev_total'] = st.session_state.detection_stats['total_vehicles']
-        st.session_state.detection_stats['prev_count1'] = st.session_state.count1
-        st.session_state.detection_stats['prev_count2'] = st.session_state.count2
+        st.session_state.detection_stats['prev_counts'] = counts
         
         # Update sidebar statistics with enhanced styling
         with stats_placeholder.container():
@@ -442,13 +320,13 @@ if play_active:
             
             with col2:
                 st.metric("🆘 Accidents", st.session_state.detection_stats['accidents'])
-                st.metric("⚡ Active Lanes", 2)
+                st.metric("⚡ Active Lanes", len(stream_names))
         
         # System status in sidebar
         with status_placeholder.container():
-            if accident1 or accident2:
+            if any_accident:
                 st.error("🆘 EMERGENCY ACTIVE")
-            elif priority1 or priority2:
+            elif any_priority:
                 st.warning("🚨 PRIORITY MODE")
             else:
                 st.success("✅ NORMAL OPERATION")
@@ -457,10 +335,8 @@ if play_active:
             
         if show_debug_info:
             st.sidebar.subheader("🔧 Debug Info")
-            st.sidebar.json({
-                "Lane 1 IDs": st.session_state.totalCount1,
-                "Lane 2 IDs": st.session_state.totalCount2,
-                "Emergency Sent": st.session_state.emergency_sent
-            })
-
-        time.sleep(0.03)
+            debug = {f"{name} Crossings": latest[name]['crossings'] for name in stream_names}
+            debug["Emergency Sent"] = st.session_state.emergency_sent
+            # Pipeline, inference, fair-share and detection scheduler stats of each worker process
+            debug.update(subscriber.status()['stats'])
+            st.sidebar.json(debug)
@@ -0,0 +1,299 @@
+"""
+Pipelined frame processing for the traffic monitor.
+
+Each video stream is decoded on its own thread into a small bounded queue, one
+inference thread consumes the queued frames of all streams as a batch, and the
+render stage (the worker's publish loop) picks up the newest result per stream. When inference falls behind, the
+oldest queued frames are dropped so end-to-end latency stays bounded.
+
+With a frame pool, decoding reuses one source-resolution buffer and resizes straight
+into pooled frames; stages pass the frames on and release them when done.
+"""
+
+import os
+import time
+import queue
+import logging
+import threading
+from collections import deque
+
+import cv2
+
+from framepool import FramePool
+
+logger = logging.getLogger(__name__)
+
+
+def put_latest(q, item):
+    """Put item on a bounded queue, discarding the oldest entry when full.
+
+    Returns the discarded items.
+    """
+    dropped = []
+    while True:
+        try:
+            q.put_nowait(item)
+            return dropped
+        except queue.Full:
+            try:
+                dropped.append(q.get_nowait())
+            except queue.Empty:
+                pass
+
+
+class StageStats:
+    """Rolling throughput and latency of one pipeline stage"""
+
+    def __init__(self, window=60):
+        self.times = deque(maxlen=window)
+        self.latencies = deque(maxlen=window)
+        self.frames = 0
+        self.dropped = 0
+
+    def tick(self, latency=None):
+        self.times.append(time.monotonic())
+        self.frames += 1
+        if latency is not None:
+            self.latencies.append(latency)
+
+    @property
+    def fps(self):
+        if len(self.times) < 2:
+            return 0.0
+        return (len(self.times) - 1) / max(self.times[-1] - self.times[0], 1e-6)
+
+    def summary(self):
+        latency = sum(self.latencies) / len(self.latencies) if self.latencies else 0.0
+        return {
+            'fps': round(self.fps, 1),
+            'latency_ms': round(latency * 1000, 1),
+            'frames': self.frames,
+            'dropped': self.dropped
+        }
+
+
+class Frame:
+    """A decoded frame travelling through the pipeline
+
+    buffer is the pooled FrameBuffer backing image, or None for an unpooled frame.
+    """
+
+    __slots__ = ('stream', 'index', 'image', 'captured', 'buffer')
+
+    def __init__(self, stream, index, image, captured, buffer=None):
+        self.stream = stream
+        self.index = index
+        self.image = image
+        self.captured = captured
+        self.buffer = buffer
+
+    def retain(self):
+        if self.buffer is not None:
+            self.buffer.retain()
+
+    def release(self):
+        """Drop a reference; a pooled image may be overwritten once all are dropped"""
+        if self.buffer is not None:
+            self.buffer.release()
+
+
+class FrameSource:
+    """Decode thread for one video stream feeding a bounded frame queue"""
+
+    def __init__(self, name, source, size=None, loop=False, speed=1.0, queue_size=2, start_frame=0, pool_size=0):
+        """
+        size: (width, height) frames are resized to
+        pool_size: decode into this many preallocated frames (needs size; 0 allocates per frame).
+                   Should cover the queue plus the frames held by inference and rendering.
+        """
+        self.name = name
+        self.source = source
+        self.position = start_frame  # index of the next frame to decode
+        self.size = size
+        self.loop = loop
+        self.speed = speed
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.pool = FramePool((size[1], size[0], 3), pool_size) if pool_size and size else None
+        self.stats = StageStats()
+        self.stop_event = threading.Event()
+        self.finished = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True, name=f"decode-{name}")
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        cap = cv2.VideoCapture(self.source)
+        # Files are paced at their native frame rate so they behave like live cameras
+        # (speed 0 reads them as fast as they decode)
+        is_file = isinstance(self.source, str) and os.path.isfile(self.source)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        interval = 1.0 / (fps * self.speed) if is_file and self.speed else 0.0
+        if is_file and self.position:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, self.position)
+        next_due = time.monotonic()
+        rewound = False
+        raw = None  # source-resolution decode buffer, reused once frames are resized
+
+        try:
+            while not self.stop_event.is_set():
+                success, image = cap.read(raw if self.size else None)
+                if not success:
+                    if self.loop and is_file and not rewound:
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        self.position = 0
+                        rewound = True
+                        continue
+                    break
+                rewound = False
+
+                buffer = None
+                if self.pool is not None:
+                    raw = image
+                    buffer = self._acquire()
+                    if buffer is None:
+                        break
+                    image = cv2.resize(raw, self.size, dst=buffer.array)
+                elif self.size:
+                    raw = image
+                    image = cv2.resize(raw, self.size)
+                for frame in put_latest(self.frames, Frame(self.name, self.position, image, time.monotonic(), buffer)):
+                    frame.release()
+                    self.stats.dropped += 1
+                self.stats.tick()
+                self.position += 1
+
+                if interval:
+                    next_due += interval
+                    delay = next_due - time.monotonic()
+                    if delay > 0:
+                        self.stop_event.wait(delay)
+                    else:
+                        next_due = time.monotonic()  # behind schedule; don't burst to catch up
+        except Exception as e:
+            logger.error(f"Decoding {self.name} failed: {e}")
+        finally:
+            cap.release()
+            self.finished.set()
+
+    def _acquire(self):
+        """A free pooled frame; waits while downstream stages hold all of them (None once stopped)"""
+        while not self.stop_event.is_set():
+            buffer = self.pool.acquire(timeout=0.1)
+            if buffer is not None:
+                return buffer
+        return None
+
+
+class Pipeline:
+    """Decode threads -> one inference thread -> newest result per stream for rendering"""
+
+    def __init__(self, sources, process):
+        """
+        sources: FrameSource instances
+        process: callable([Frame]) -> [result], run on the inference thread with
+                 at most one frame per stream
+        """
+        self.sources = {source.name: source for source in sources}
+        self.process = process
+        self.results = {}
+        self.version = 0
+        self.error = None
+        self.inference_stats = StageStats()
+        self.stream_stats = {name: StageStats() for name in self.sources}
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True, name="inference")
+
+    def start(self):
+        for source in self.sources.values():
+            source.start()
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        for source in self.sources.values():
+            source.stop()
+        with self.condition:
+            self.condition.notify_all()
+
+    @property
+    def running(self):
+        return not self.done.is_set()
+
+    def _exhausted(self):
+        return all(source.finished.is_set() and source.frames.empty()
+                   for source in self.sources.values())
+
+    def _next_frames(self):
+        """Oldest queued frame of every stream that has one"""
+        frames = []
+        for source in self.sources.values():
+            try:
+                frames.append(source.frames.get_nowait())
+            except queue.Empty:
+                pass
+        return frames
+
+    def _run(self):
+        try:
+            while not self.stop_event.is_set():
+                frames = self._next_frames()
+                if not frames:
+                    if self._exhausted():
+                        break
+                    self.stop_event.wait(0.002)
+                    continue
+                results = self.process(frames)
+                now = time.monotonic()
+                for frame in frames:
+                    self.stream_stats[frame.stream].tick(now - frame.captured)
+                self.inference_stats.tick()
+                self._publish(frames, results)
+        except Exception as e:
+            logger.exception(f"Inference stage failed: {e}")
+            self.error = e
+        finally:
+            self.done.set()
+            self.stop()
+
+    def _publish(self, frames, results):
+        with self.condition:
+            for frame, result in zip(frames, results):
+                previous = self.results.get(frame.stream)
+                self.results[frame.stream] = (frame, result)
+                if previous is not None:
+                    previous[0].release()
+            self.version += 1
+            self.condition.notify_all()
+
+    def wait(self, version, timeout=1.0):
+        """Block until results newer than version exist (or the pipeline ends).
+
+        Returns (version, {stream_name: (frame, result)}). Every returned frame is
+        retained for the caller, which must release() it when done.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != version or not self.running, timeout)
+            for frame, _ in self.results.values():
+                frame.retain()
+            return self.version, dict(self.results)
+
+    def stats(self):
+        """Per-stage throughput, latency and drop counters
+
+        'inference' counts batches; 'streams' gives each stream's processed FPS and
+        capture-to-result latency.
+        """
+        return {
+            'decode': {name: source.stats.summary() for name, source in self.sources.items()},
+            'pools': {name: source.pool.stats() for name, source in self.sources.items() if source.pool is not None},
+            'inference': self.inference_stats.summary(),
+            'streams': {name: stats.summary() for name, stats in self.stream_stats.items()}
+        }
@@ -0,0 +1,75 @@
+"""
+Region-of-interest cropping from lane masks.
+
+The mask is resized and its bounding box computed once per frame size, so each
+frame only needs a slice (plus a bitwise_and over the cropped area, written into a
+buffer reused across frames) before it is handed to the detector. Detections are
+shifted back by the crop offset.
+"""
+
+import math
+
+import cv2
+import numpy as np
+
+
+class MaskROI:
+    """Cached mask crop for one lane, keyed by frame size"""
+
+    def __init__(self, mask, detector_size=640):
+        """
+        mask: BGR or grayscale mask image; non-zero pixels are kept
+        detector_size: inference size the detector would use for a full frame
+        """
+        self.mask = mask
+        self.detector_size = detector_size
+        self._cache = {}
+
+    def _prepare(self, width, height):
+        key = (width, height)
+        if key not in self._cache:
+            resized = cv2.resize(self.mask, (width, height))
+            visible = resized if resized.ndim == 2 else resized.max(axis=2)
+            ys, xs = np.nonzero(visible)
+            if len(xs):
+                x1, y1, x2, y2 = int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1
+            else:
+                x1, y1, x2, y2 = 0, 0, width, height
+            crop = np.ascontiguousarray(resized[y1:y2, x1:x2])
+            # A fully opaque crop needs no masking at all
+            needs_mask = not crop.all()
+            out = np.empty_like(crop) if needs_mask else None
+            # Keep the full-frame detector scale so the crop costs proportionally fewer pixels
+            scale = self.detector_size / max(width, height)
+            imgsz = max(32, math.ceil(max(x2 - x1, y2 - y1) * scale / 32) * 32)
+            self._cache[key] = (x1, y1, x2, y2, crop, needs_mask, imgsz, out)
+        return self._cache[key]
+
+    def apply(self, img):
+        """Masked crop of img for the detector and its (x, y) offset in the frame
+
+        The crop is a view of img or a buffer the next apply() overwrites, so use it
+        before processing the next frame.
+        """
+        x1, y1, x2, y2, crop, needs_mask, imgsz, out = self._prepare(img.shape[1], img.shape[0])
+        region = img[y1:y2, x1:x2]
+        if needs_mask:
+            region = cv2.bitwise_and(region, crop, dst=out)
+        return region, (x1, y1)
+
+    def imgsz(self, img):
+        """Detector input size that keeps the crop at full-frame scale"""
+        return self._prepare(img.shape[1], img.shape[0])[6]
+
+    def coverage(self, img):
+        """Fraction of the frame's pixels that reach the detector"""
+        x1, y1, x2, y2 = self._prepare(img.shape[1], img.shape[0])[:4]
+        return (x2 - x1) * (y2 - y1) / (img.shape[0] * img.shape[1])
+
+
+def shift_boxes(detections, offset):
+    """Map (N, 4+) [x1, y1, x2, y2, ...] crop coordinates back to the frame in place"""
+    if len(detections):
+        detections[:, [0, 2]] += offset[0]
+        detections[:, [1, 3]] += offset[1]
+    return detections
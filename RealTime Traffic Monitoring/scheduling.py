@@ -0,0 +1,257 @@
+"""
+Adaptive detection scheduling.
+
+The detector only runs on every frame while the scene needs it. On skipped frames
+SORT's Kalman predictions carry the tracks forward (Sort.predict). The interval
+between detections shrinks when tracks are dense, fast or close to a counting line,
+and grows back towards max_interval when the scene is quiet.
+
+FairShare divides a worker's inference time evenly between its streams when they
+cannot all be detected in one batch.
+
+Run as a script to check counting on the bundled videos against per-frame detection:
+
+    python scheduling.py --max-interval 4 --tolerance 0.05
+"""
+
+import os
+import argparse
+
+import cv2
+import numpy as np
+
+from roi import MaskROI
+from detections import DetectionFilter
+from sort import BatchSort
+from counting import TrafficCounter
+
+VEHICLE_CLASSES = ("car", "truck", "bus", "motorbike")
+
+
+def line_distances(points, lines):
+    """Distance from each (N, 2) point to each (L, 4) [x1, y1, x2, y2] segment, shape (N, L)"""
+    p = points[:, None, :]
+    a = lines[None, :, :2]
+    ab = lines[None, :, 2:] - a
+    t = np.clip(((p - a) * ab).sum(-1) / np.maximum((ab * ab).sum(-1), 1e-9), 0, 1)
+    return np.linalg.norm(p - (a + t[..., None] * ab), axis=-1)
+
+
+class DetectionScheduler:
+    """Per-stream choice between running the detector and coasting on tracker predictions"""
+
+    def __init__(self, max_interval=4, min_interval=1, dense_tracks=8, fast_speed=12.0, line_margin=40):
+        """
+        max_interval: most frames between detections in a quiet scene (1 = every frame)
+        dense_tracks: track count that halves the interval
+        fast_speed: centroid speed in px/frame that halves the interval
+        line_margin: px from a counting line within which every frame is detected
+        """
+        self.max_interval = max(1, max_interval)
+        self.min_interval = max(1, min(min_interval, self.max_interval))
+        self.dense_tracks = dense_tracks
+        self.fast_speed = fast_speed
+        self.line_margin = line_margin
+        self.interval = self.min_interval
+        self.since_detection = self.max_interval  # detect on the first frame
+        self.previous = {}  # track id -> centroid on the last frame
+        self.detected = 0
+        self.coasted = 0
+
+    def step(self):
+        """Advance one frame; True if the detector should run on it"""
+        self.since_detection += 1
+        if self.since_detection >= self.interval:
+            self.since_detection = 0
+            self.detected += 1
+            return True
+        self.coasted += 1
+        return False
+
+    def postpone(self):
+        """Undo this frame's step() decision to detect; the next frame is due instead"""
+        self.since_detection = self.interval
+        self.detected -= 1
+        self.coasted += 1
+
+    def observe(self, tracks, lines=(), alert=False, unsettled=0):
+        """Set the interval from this frame's tracker output
+
+        tracks: (N, 5) [x1, y1, x2, y2, id] as returned by Sort.update/predict
+        lines: counting lines as [x1, y1, x2, y2] segments
+        alert: something on screen (accident, emergency vehicle) needs every frame
+        unsettled: Sort.unsettled(); new or just-missed tracks need consecutive
+                   detections to be confirmed and to learn their velocity
+        """
+        centroids = (tracks[:, :2] + tracks[:, 2:4]) / 2
+        ids = tracks[:, 4].astype(int)
+        speeds = np.array([np.linalg.norm(c - self.previous[i]) if i in self.previous else 0.0
+                           for i, c in zip(ids, centroids)])
+        self.previous = dict(zip(ids, centroids))
+
+        near_line = False
+        if len(tracks) and len(lines):
+            # Anything that could reach a line before the next scheduled detection
+            reach = self.line_margin + speeds * self.max_interval
+            near_line = bool((line_distances(centroids, np.asarray(lines, dtype=float)) <= reach[:, None]).any())
+
+        if alert or near_line or unsettled:
+            self.interval = self.min_interval
+        else:
+            load = len(tracks) / self.dense_tracks + (speeds.max() if len(speeds) else 0.0) / self.fast_speed
+            self.interval = int(np.clip(round(self.max_interval / (1 + load)), self.min_interval, self.max_interval))
+
+    def stats(self):
+        frames = self.detected + self.coasted
+        return {
+            'interval': self.interval,
+            'detected': self.detected,
+            'coasted': self.coasted,
+            'detection_ratio': round(self.detected / frames, 3) if frames else 1.0
+        }
+
+
+class FairShare:
+    """Start-time fair queuing of inference time across the streams of one worker.
+
+    Each stream's virtual time advances by the inference seconds it used. A batch takes
+    due streams in order of virtual time until their estimated cost fills the budget, so
+    expensive streams (large ROI, several models) get as much time as cheap ones, not more.
+    Streams left out coast on their tracker and come first in the next batch.
+    """
+
+    def __init__(self, budget=0.1, smoothing=0.2):
+        """
+        budget: most estimated inference seconds per batch (0 = every due stream)
+        smoothing: weight of the newest measurement in each stream's cost estimate
+        """
+        self.budget = budget
+        self.smoothing = smoothing
+        self.vtime = {}
+        self.cost = {}  # stream -> estimated inference seconds per detection
+        self.clock = 0.0  # virtual time of the most recently served stream
+        self.used = {}
+        self.deferred = {}
+
+    def select(self, streams):
+        """The streams to detect this batch, in order of service"""
+        for stream in streams:
+            # Streams that were idle do not get to catch up on the time they missed
+            self.vtime[stream] = max(self.vtime.get(stream, self.clock), self.clock)
+        if self.budget <= 0:
+            return list(streams)
+        chosen, total = [], 0.0
+        for stream in sorted(streams, key=self.vtime.get):
+            cost = self.cost.get(stream, 0.0)
+            if chosen and total + cost > self.budget:
+                self.deferred[stream] = self.deferred.get(stream, 0) + 1
+                continue
+            chosen.append(stream)
+            total += cost
+        self.clock = self.vtime[chosen[0]] if chosen else self.clock
+        return chosen
+
+    def charge(self, stream, seconds):
+        """Account seconds of inference to a served stream"""
+        self.vtime[stream] = self.vtime.get(stream, self.clock) + seconds
+        self.used[stream] = self.used.get(stream, 0.0) + seconds
+        previous = self.cost.get(stream)
+        self.cost[stream] = seconds if previous is None else previous + self.smoothing * (seconds - previous)
+
+    def stats(self):
+        return {
+            stream: {
+                'ms_per_detection': round(self.cost.get(stream, 0.0) * 1000, 1),
+                'inference_s': round(self.used.get(stream, 0.0), 2),
+                'deferred': self.deferred.get(stream, 0)
+            }
+            for stream in self.vtime
+        }
+
+
+def detect_video(video, mask, model, frame_size, conf=0.3):
+    """Vehicle detections of every frame of a video, as (N, 5) arrays in frame coordinates"""
+    roi = MaskROI(cv2.imread(mask))
+    detection_filter = DetectionFilter(model.names, {name: conf for name in VEHICLE_CLASSES})
+    detections = []
+    cap = cv2.VideoCapture(video)
+    while True:
+        success, img = cap.read()
+        if not success:
+            break
+        img = cv2.resize(img, frame_size)
+        region, offset = roi.apply(img)
+        boxes = model(region, verbose=False, imgsz=roi.imgsz(img))[0].boxes
+        detections.append(detection_filter(boxes, offset)[0])
+    cap.release()
+    return detections
+
+
+def replay_counts(detections, frame_size, scheduler=None):
+    """Track and count precomputed detections with main.py's entry/exit lines.
+
+    Without a scheduler every frame is detected. Returns (vehicles entered, still inside).
+    """
+    tracker = BatchSort(max_age=20, min_hits=3, iou_threshold=0.3)
+    width, height = frame_size
+    entry_line_y, exit_line_y = height * 0.65, height * 0.95
+    counter = TrafficCounter({'entry': [(0, entry_line_y), (width, entry_line_y)],
+                              'exit': [(0, exit_line_y), (width, exit_line_y)]})
+    lines = counter.segments()
+    inside, entered = set(), 0
+
+    for dets in detections:
+        if scheduler is None or scheduler.step():
+            tracks = tracker.update(dets)
+        else:
+            tracks = tracker.predict()
+        if scheduler is not None:
+            scheduler.observe(tracks, lines, unsettled=tracker.unsettled())
+        for Id, line, direction in counter.update(tracks, tracker.live_ids()):
+            if direction != 'forward':
+                continue
+            if line == 'entry':
+                inside.add(Id)
+                entered += 1
+            elif Id in inside:
+                inside.remove(Id)
+    return entered, len(inside)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Compare adaptive detection counts against per-frame detection')
+    parser.add_argument('--stream', nargs=2, action='append', metavar=('VIDEO', 'MASK'),
+                        help='Video and its mask (default: both bundled lanes)')
+    parser.add_argument('--model', default=os.getenv('YOLO_STANDARD_MODEL_PATH', '../Yolo-Weights/yolov8l.pt'))
+    parser.add_argument('--max-interval', type=int, default=int(os.getenv('MAX_DETECTION_INTERVAL', '4')))
+    parser.add_argument('--dense-tracks', type=int, default=int(os.getenv('DENSE_TRACKS', '8')))
+    parser.add_argument('--fast-speed', type=float, default=float(os.getenv('FAST_TRACK_SPEED', '12')))
+    parser.add_argument('--line-margin', type=int, default=int(os.getenv('LINE_MARGIN', '40')))
+    parser.add_argument('--tolerance', type=float, default=float(os.getenv('COUNT_TOLERANCE', '0.05')),
+                        help='Largest accepted relative error of the entry count')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    from ultralytics import YOLO
+
+    args = parse_args()
+    streams = args.stream or [("video/Video.mp4", "Masks/mask.png"), ("video/accident.mp4", "Masks/mask3.png")]
+    frame_size = (720, 640)
+    model = YOLO(args.model)
+    failed = False
+
+    for video, mask in streams:
+        detections = detect_video(video, mask, model, frame_size)
+        baseline, _ = replay_counts(detections, frame_size)
+        scheduler = DetectionScheduler(args.max_interval, dense_tracks=args.dense_tracks,
+                                       fast_speed=args.fast_speed, line_margin=args.line_margin)
+        adaptive, _ = replay_counts(detections, frame_size, scheduler)
+        error = abs(adaptive - baseline) / max(baseline, 1)
+        within = error <= args.tolerance
+        failed |= not within
+        print(f"{'✅' if within else '❌'} {video}: {baseline} counted per-frame, {adaptive} adaptive "
+              f"({error:.1%} error), detector ran on {scheduler.stats()['detection_ratio']:.0%} of "
+              f"{len(detections)} frames")
+
+    raise SystemExit(1 if failed else 0)
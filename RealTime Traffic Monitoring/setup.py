@@ -61,7 +61,8 @@ def main():
     print("\n📋 Next steps:")
     print("1. Edit .env file with your Twilio credentials")
     print("2. Place YOLO model weights in ../Yolo-Weights/")
-    print("3. Run: streamlit run main.py")
+    print("3. Run: python worker.py")
+    print("4. In another terminal: streamlit run main.py")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
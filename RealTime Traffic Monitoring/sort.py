@@ -18,20 +18,16 @@
 from __future__ import print_function
 
 import os
-import numpy as np
-import matplotlib
-
-matplotlib.use('TkAgg')
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-from skimage import io
-
+import sys
 import glob
 import time
 import argparse
-from filterpy.kalman import KalmanFilter
+import subprocess
+import numpy as np
 
-np.random.seed(0)
+# The tracker core only needs numpy. filterpy (reference KalmanBoxTracker), lap/scipy
+# (assignment) and matplotlib/skimage (--display) are imported where they are used, so
+# importing this module stays fast and works on headless machines without Tk.
 
 
 def linear_assignment(cost_matrix):
@@ -45,13 +41,10 @@ def linear_assignment(cost_matrix):
         return np.array(list(zip(x, y)))
 
 
-def iou_batch(bb_test, bb_gt):
+def iou_pairs(bb_test, bb_gt):
     """
-    From SORT: Computes IOU between two bboxes in the form [x1,y1,x2,y2]
+    IOU of paired rows of two [x1,y1,x2,y2] arrays (or of any shapes that broadcast)
     """
-    bb_gt = np.expand_dims(bb_gt, 0)
-    bb_test = np.expand_dims(bb_test, 1)
-
     xx1 = np.maximum(bb_test[..., 0], bb_gt[..., 0])
     yy1 = np.maximum(bb_test[..., 1], bb_gt[..., 1])
     xx2 = np.minimum(bb_test[..., 2], bb_gt[..., 2])
@@ -64,6 +57,13 @@ def iou_batch(bb_test, bb_gt):
     return (o)
 
 
+def iou_batch(bb_test, bb_gt):
+    """
+    From SORT: Computes IOU between two bboxes in the form [x1,y1,x2,y2]
+    """
+    return iou_pairs(np.expand_dims(bb_test, 1), np.expand_dims(bb_gt, 0))
+
+
 def convert_bbox_to_z(bbox):
     """
     Takes a bounding box in the form [x1,y1,x2,y2] and returns z in the form
@@ -102,6 +102,8 @@ class KalmanBoxTracker(object):
         """
         Initialises a tracker using initial bounding box.
         """
+        from filterpy.kalman import KalmanFilter
+
         # define constant velocity model
         self.kf = KalmanFilter(dim_x=7, dim_z=4)
         self.kf.F = np.array(
@@ -135,17 +137,20 @@ class KalmanBoxTracker(object):
         self.hit_streak += 1
         self.kf.update(convert_bbox_to_z(bbox))
 
-    def predict(self):
+    def predict(self, observed=True):
         """
         Advances the state vector and returns the predicted bounding box estimate.
+        observed=False is for frames the detector skipped: they only count as a miss
+        for tracks that were already unmatched.
         """
         if ((self.kf.x[6] + self.kf.x[2]) <= 0):
             self.kf.x[6] *= 0.0
         self.kf.predict()
         self.age += 1
-        if (self.time_since_update > 0):
-            self.hit_streak = 0
-        self.time_since_update += 1
+        if observed or self.time_since_update > 0:
+            if (self.time_since_update > 0):
+                self.hit_streak = 0
+            self.time_since_update += 1
         self.history.append(convert_x_to_bbox(self.kf.x))
         return self.history[-1]
 
@@ -156,59 +161,109 @@ class KalmanBoxTracker(object):
         return convert_x_to_bbox(self.kf.x)
 
 
-def associate_detections_to_trackers(detections, trackers, iou_threshold=0.3):
+def grid_cells(bboxes, cell):
+    """
+    Every (box index, grid cell key) pair for the square cells each [x1,y1,x2,y2] box touches
+    """
+    first = np.floor(bboxes[:, :2] / cell).astype(np.int64)
+    span = np.maximum(np.floor(bboxes[:, 2:4] / cell).astype(np.int64) - first + 1, 1)
+    counts = span[:, 0] * span[:, 1]
+    index = np.repeat(np.arange(len(bboxes)), counts)
+    offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cx = first[index, 0] + offset % span[index, 0]
+    cy = first[index, 1] + offset // span[index, 0]
+    return index, (cx << 32) + cy
+
+
+def grid_candidates(detections, trackers, cell):
+    """
+    Detection-tracker index pairs sharing a grid cell; every overlapping pair is among them
+    """
+    det_index, det_keys = grid_cells(detections, cell)
+    trk_index, trk_keys = grid_cells(trackers, cell)
+    order = np.argsort(trk_keys, kind='stable')
+    trk_keys, trk_index = trk_keys[order], trk_index[order]
+    lo = np.searchsorted(trk_keys, det_keys, 'left')
+    counts = np.searchsorted(trk_keys, det_keys, 'right') - lo
+    total = counts.sum()
+    rows = np.repeat(det_index, counts)
+    cols = trk_index[np.repeat(lo - (np.cumsum(counts) - counts), counts) + np.arange(total)]
+    pairs = np.unique(rows * len(trackers) + cols)
+    return pairs // len(trackers), pairs % len(trackers)
+
+
+def sparse_assignment(iou_matrix, rows, cols):
+    """
+    Maximum-IOU assignment when only (rows, cols) can overlap. Pairs that only overlap each
+    other are matched directly; the linear assignment runs on the remaining contested boxes.
+    """
+    positive = iou_matrix[rows, cols] > 0
+    rows, cols = rows[positive], cols[positive]
+    row_degree = np.bincount(rows, minlength=iou_matrix.shape[0])
+    col_degree = np.bincount(cols, minlength=iou_matrix.shape[1])
+    isolated = (row_degree[rows] == 1) & (col_degree[cols] == 1)
+    matched = [np.stack((rows[isolated], cols[isolated]), axis=1)]
+    contested_rows = np.unique(rows[~isolated])
+    contested_cols = np.unique(cols[~isolated])
+    if len(contested_rows):
+        sub = linear_assignment(-iou_matrix[np.ix_(contested_rows, contested_cols)]).reshape(-1, 2)
+        matched.append(np.stack((contested_rows[sub[:, 0]], contested_cols[sub[:, 1]]), axis=1))
+    matched = np.concatenate(matched).astype(int)
+    return matched[np.argsort(matched[:, 0], kind='stable')]  # row order, like linear_assignment
+
+
+def associate_detections_to_trackers(detections, trackers, iou_threshold=0.3, grid=None):
     """
     Assigns detections to tracked object (both represented as bounding boxes)
+    grid: cell size in pixels (about a typical box size) to only compare boxes sharing a
+          grid cell; None compares every pair
 
     Returns 3 lists of matches, unmatched_detections and unmatched_trackers
     """
     if (len(trackers) == 0):
         return np.empty((0, 2), dtype=int), np.arange(len(detections)), np.empty((0, 5), dtype=int)
 
-    iou_matrix = iou_batch(detections, trackers)
+    if grid and len(detections):
+        rows, cols = grid_candidates(detections, trackers, grid)
+        iou_matrix = np.zeros((len(detections), len(trackers)))
+        iou_matrix[rows, cols] = iou_pairs(detections[rows], trackers[cols])
+    else:
+        iou_matrix = iou_batch(detections, trackers)
 
     if min(iou_matrix.shape) > 0:
         a = (iou_matrix > iou_threshold).astype(np.int32)
         if a.sum(1).max() == 1 and a.sum(0).max() == 1:
             matched_indices = np.stack(np.where(a), axis=1)
+        elif grid:
+            matched_indices = sparse_assignment(iou_matrix, rows, cols)
         else:
             matched_indices = linear_assignment(-iou_matrix)
     else:
         matched_indices = np.empty(shape=(0, 2))
-
-    unmatched_detections = []
-    for d, det in enumerate(detections):
-        if (d not in matched_indices[:, 0]):
-            unmatched_detections.append(d)
-    unmatched_trackers = []
-    for t, trk in enumerate(trackers):
-        if (t not in matched_indices[:, 1]):
-            unmatched_trackers.append(t)
+    matched_indices = matched_indices.reshape(-1, 2).astype(int)
 
     # filter out matched with low IOU
-    matches = []
-    for m in matched_indices:
-        if (iou_matrix[m[0], m[1]] < iou_threshold):
-            unmatched_detections.append(m[0])
-            unmatched_trackers.append(m[1])
-        else:
-            matches.append(m.reshape(1, 2))
-    if (len(matches) == 0):
-        matches = np.empty((0, 2), dtype=int)
-    else:
-        matches = np.concatenate(matches, axis=0)
+    low = iou_matrix[matched_indices[:, 0], matched_indices[:, 1]] < iou_threshold
+    matched_dets = np.zeros(len(detections), dtype=bool)
+    matched_dets[matched_indices[:, 0]] = True
+    matched_trks = np.zeros(len(trackers), dtype=bool)
+    matched_trks[matched_indices[:, 1]] = True
+    unmatched_detections = np.concatenate((np.nonzero(~matched_dets)[0], matched_indices[low, 0]))
+    unmatched_trackers = np.concatenate((np.nonzero(~matched_trks)[0], matched_indices[low, 1]))
 
-    return matches, np.array(unmatched_detections), np.array(unmatched_trackers)
+    return matched_indices[~low], unmatched_detections, unmatched_trackers
 
 
 class Sort(object):
-    def __init__(self, max_age=1, min_hits=3, iou_threshold=0.3):
+    def __init__(self, max_age=1, min_hits=3, iou_threshold=0.3, grid=None):
         """
         Sets key parameters for SORT
+        grid: optional association grid cell size in pixels (see associate_detections_to_trackers)
         """
         self.max_age = max_age
         self.min_hits = min_hits
         self.iou_threshold = iou_threshold
+        self.grid = grid
         self.trackers = []
         self.frame_count = 0
 
@@ -234,7 +289,7 @@ class Sort(object):
         trks = np.ma.compress_rows(np.ma.masked_invalid(trks))
         for t in reversed(to_del):
             self.trackers.pop(t)
-        matched, unmatched_dets, unmatched_trks = associate_detections_to_trackers(dets, trks, self.iou_threshold)
+        matched, unmatched_dets, unmatched_trks = associate_detections_to_trackers(dets, trks, self.iou_threshold, self.grid)
 
         # update matched trackers with assigned detections
         for m in matched:
@@ -257,6 +312,225 @@ class Sort(object):
             return np.concatenate(ret)
         return np.empty((0, 5))
 
+    def predict(self):
+        """
+        Advances every track one frame on its Kalman prediction alone, for frames where
+        detection was skipped. Unlike update(np.empty((0, 5))), tracks matched at the last
+        detection keep their hit streak and are still returned.
+        Returns the same format as update().
+        """
+        self.frame_count += 1
+        ret = []
+        i = len(self.trackers)
+        for trk in reversed(self.trackers):
+            i -= 1
+            d = trk.predict(observed=False)[0]
+            # remove diverged or dead tracklet
+            if np.any(np.isnan(d)) or (trk.time_since_update > self.max_age):
+                self.trackers.pop(i)
+                continue
+            if (trk.time_since_update < 1) and (trk.hit_streak >= self.min_hits or self.frame_count <= self.min_hits):
+                ret.append(np.concatenate((d, [trk.id + 1])).reshape(1, -1))
+        if (len(ret) > 0):
+            return np.concatenate(ret)
+        return np.empty((0, 5))
+
+    def unsettled(self):
+        """
+        Number of live tracks that are not confirmed yet or missed their last detection.
+        """
+        return sum(1 for trk in self.trackers if trk.time_since_update > 0 or trk.hit_streak < self.min_hits)
+
+    def live_ids(self):
+        """
+        Output IDs of every track still held, shown or not; a missing ID has been dropped.
+        """
+        return {trk.id + 1 for trk in self.trackers}
+
+
+def convert_bboxes_to_z(bboxes):
+    """
+    Vectorized convert_bbox_to_z: (N, 4+) [x1,y1,x2,y2,...] boxes to (N, 4) [x,y,s,r] rows
+    """
+    w = bboxes[:, 2] - bboxes[:, 0]
+    h = bboxes[:, 3] - bboxes[:, 1]
+    return np.stack([bboxes[:, 0] + w / 2., bboxes[:, 1] + h / 2., w * h, w / h], axis=1)
+
+
+def convert_xs_to_bboxes(xs):
+    """
+    Vectorized convert_x_to_bbox: (N, 4+) [x,y,s,r,...] states to (N, 4) [x1,y1,x2,y2] boxes
+    """
+    w = np.sqrt(xs[:, 2] * xs[:, 3])
+    h = xs[:, 2] / w
+    return np.stack([xs[:, 0] - w / 2., xs[:, 1] - h / 2., xs[:, 0] + w / 2., xs[:, 1] + h / 2.], axis=1)
+
+
+class BatchSort(object):
+    """
+    Sort with every track's Kalman state held in stacked arrays, so predict and update run
+    once for all tracks instead of once per KalmanBoxTracker. Same constant velocity model
+    and bookkeeping as Sort, and the same output for the same input.
+    """
+    # Constant velocity model as in KalmanBoxTracker
+    R = np.diag([1., 1., 10., 10.])
+    Q = np.diag([1., 1., 1., 1., 0.01, 0.01, 0.0001])
+    P0 = np.diag([10., 10., 10., 10., 10000., 10000., 10000.])
+
+    def __init__(self, max_age=1, min_hits=3, iou_threshold=0.3, grid=None):
+        """
+        Sets key parameters for SORT
+        grid: optional association grid cell size in pixels (see associate_detections_to_trackers)
+        """
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.iou_threshold = iou_threshold
+        self.grid = grid
+        self.frame_count = 0
+        self.x = np.empty((0, 7))  # states [x,y,s,r,vx,vy,vs]
+        self.P = np.empty((0, 7, 7))  # covariances
+        self.ids = np.empty(0, dtype=int)
+        self.time_since_update = np.empty(0, dtype=int)
+        self.hit_streak = np.empty(0, dtype=int)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _keep(self, keep):
+        self.x, self.P, self.ids = self.x[keep], self.P[keep], self.ids[keep]
+        self.time_since_update, self.hit_streak = self.time_since_update[keep], self.hit_streak[keep]
+
+    def _predict(self, observed=True):
+        """
+        KalmanBoxTracker.predict for all tracks; returns the predicted boxes.
+        F only adds velocities, so F x and F P F' are written as sums, which is exact.
+        """
+        self.x[self.x[:, 6] + self.x[:, 2] <= 0, 6] *= 0.0
+        self.x[:, :3] += self.x[:, 4:]
+        self.P[:, :3] += self.P[:, 4:]
+        self.P[:, :, :3] += self.P[:, :, 4:]
+        self.P += self.Q
+        counted = np.ones(len(self), dtype=bool) if observed else self.time_since_update > 0
+        self.hit_streak[counted & (self.time_since_update > 0)] = 0
+        self.time_since_update[counted] += 1
+        return convert_xs_to_bboxes(self.x)
+
+    def _update(self, rows, bboxes):
+        """
+        KalmanBoxTracker.update of the tracks at rows with their matched boxes.
+        H only selects [x,y,s,r], so H x, P H' and K H are slices.
+        """
+        x, P = self.x[rows], self.P[rows]
+        y = convert_bboxes_to_z(bboxes) - x[:, :4]
+        PHT = np.ascontiguousarray(P[:, :, :4])
+        K = PHT @ np.linalg.inv(P[:, :4, :4] + self.R)
+        x = x + (K @ y[:, :, None])[:, :, 0]
+        I_KH = np.broadcast_to(np.eye(7), P.shape).copy()
+        I_KH[:, :, :4] -= K
+        KR = K * np.diag(self.R)
+        self.x[rows] = x
+        self.P[rows] = (I_KH @ P) @ I_KH.transpose(0, 2, 1) + KR @ K.transpose(0, 2, 1)
+        self.time_since_update[rows] = 0
+        self.hit_streak[rows] += 1
+
+    def _add(self, bboxes):
+        """
+        New tracks for unmatched boxes. IDs come from KalmanBoxTracker.count, shared with
+        Sort, so both trackers number tracks the same way.
+        """
+        n = len(bboxes)
+        x = np.zeros((n, 7))
+        x[:, :4] = convert_bboxes_to_z(bboxes)
+        ids = np.arange(KalmanBoxTracker.count, KalmanBoxTracker.count + n)
+        KalmanBoxTracker.count += n
+        self.x = np.concatenate((self.x, x))
+        self.P = np.concatenate((self.P, np.broadcast_to(self.P0, (n, 7, 7))))
+        self.ids = np.concatenate((self.ids, ids))
+        self.time_since_update = np.concatenate((self.time_since_update, np.zeros(n, dtype=int)))
+        self.hit_streak = np.concatenate((self.hit_streak, np.zeros(n, dtype=int)))
+
+    def _output(self, boxes):
+        """
+        Confirmed tracks matched at the last detection, in Sort's (reversed) order.
+        """
+        shown = (self.time_since_update < 1) & ((self.hit_streak >= self.min_hits) | (self.frame_count <= self.min_hits))
+        shown = np.nonzero(shown)[0][::-1]
+        if len(shown) > 0:
+            return np.concatenate((boxes[shown], self.ids[shown, None] + 1.), axis=1)  # +1 as MOT benchmark requires positive
+        return np.empty((0, 5))
+
+    def update(self, dets=np.empty((0, 5))):
+        """
+        Same contract as Sort.update.
+        """
+        self.frame_count += 1
+        # get predicted locations from existing trackers.
+        trks = self._predict()
+        valid = ~np.any(np.isnan(trks), axis=1)
+        if not valid.all():
+            self._keep(valid)
+            trks = trks[valid]
+        trks = np.concatenate((trks, np.zeros((len(trks), 1))), axis=1)
+        matched, unmatched_dets, unmatched_trks = associate_detections_to_trackers(dets, trks, self.iou_threshold, self.grid)
+
+        # update matched trackers with assigned detections
+        if len(matched) > 0:
+            self._update(matched[:, 1], dets[matched[:, 0], :4])
+
+        # create and initialise new trackers for unmatched detections
+        if len(unmatched_dets) > 0:
+            self._add(dets[unmatched_dets.astype(int), :4])
+        ret = self._output(convert_xs_to_bboxes(self.x))
+        # remove dead tracklets
+        self._keep(self.time_since_update <= self.max_age)
+        return ret
+
+    def predict(self):
+        """
+        Same contract as Sort.predict.
+        """
+        self.frame_count += 1
+        boxes = self._predict(observed=False)
+        keep = ~np.any(np.isnan(boxes), axis=1) & (self.time_since_update <= self.max_age)
+        self._keep(keep)
+        return self._output(boxes[keep])
+
+    def unsettled(self):
+        """
+        Number of live tracks that are not confirmed yet or missed their last detection.
+        """
+        return int(np.count_nonzero((self.time_since_update > 0) | (self.hit_streak < self.min_hits)))
+
+    def live_ids(self):
+        """
+        Same contract as Sort.live_ids.
+        """
+        return set((self.ids + 1).tolist())
+
+
+def load_display():
+    """Plotting modules for --display (TkAgg window)."""
+    import matplotlib
+    matplotlib.use('TkAgg')
+    import matplotlib.pyplot as plt
+    import matplotlib.patches as patches
+    from skimage import io
+    return plt, patches, io
+
+
+def startup_benchmark(runs=5):
+    """Time importing this module in fresh interpreters (numpy included)."""
+    code = ("import sys, time; started = time.perf_counter(); import sort; "
+            "print(time.perf_counter() - started); "
+            "print(' '.join(m for m in ('filterpy', 'scipy', 'matplotlib', 'skimage', 'tkinter') if m in sys.modules))")
+    times = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                             capture_output=True, text=True, check=True).stdout.splitlines()
+        times.append(float(out[0]))
+    print("import sort: median %.1f ms over %d runs, heavy modules loaded: %s" % (
+        sorted(times)[runs // 2] * 1000, runs, out[1] if len(out) > 1 and out[1] else 'none'))
+
 
 def parse_args():
     """Parse input arguments."""
@@ -272,6 +546,14 @@ def parse_args():
                         help="Minimum number of associated detections before track is initialised.",
                         type=int, default=3)
     parser.add_argument("--iou_threshold", help="Minimum IOU for match.", type=float, default=0.3)
+    parser.add_argument("--tracker", help="Tracker implementation to run [sort].", choices=['sort', 'batch'],
+                        default='sort')
+    parser.add_argument("--grid", help="Association grid cell size in pixels, 0 compares every pair [0].",
+                        type=int, default=0)
+    parser.add_argument('--startup', help='Benchmark importing the tracker and exit [False]',
+                        action='store_true')
+    parser.add_argument('--verify', help='Check every frame against the reference Sort [False]',
+                        action='store_true')
     args = parser.parse_args()
     return args
 
@@ -279,12 +561,19 @@ def parse_args():
 if __name__ == '__main__':
     # all train
     args = parse_args()
+    if (args.startup):
+        startup_benchmark()
+        sys.exit()
     display = args.display
     phase = args.phase
     total_time = 0.0
     total_frames = 0
+    mismatched_frames = 0
+    tracker_class = BatchSort if args.tracker == 'batch' else Sort
+    np.random.seed(0)
     colours = np.random.rand(32, 3)  # used only for display
     if (display):
+        plt, patches, io = load_display()
         if not os.path.exists('mot_benchmark'):
             print(
                 '\n\tERROR: mot_benchmark link not found!\n\n    Create a symbolic link to the MOT benchmark\n    (https://motchallenge.net/data/2D_MOT_2015/#download). E.g.:\n\n    $ ln -s /path/to/MOT2015_challenge/2DMOT2015 mot_benchmark\n\n')
@@ -297,9 +586,13 @@ if __name__ == '__main__':
         os.makedirs('output')
     pattern = os.path.join(args.seq_path, phase, '*', 'det', 'det.txt')
     for seq_dets_fn in glob.glob(pattern):
-        mot_tracker = Sort(max_age=args.max_age,
-                           min_hits=args.min_hits,
-                           iou_threshold=args.iou_threshold)  # create instance of the SORT tracker
+        mot_tracker = tracker_class(max_age=args.max_age,
+                                    min_hits=args.min_hits,
+                                    iou_threshold=args.iou_threshold,
+                                    grid=args.grid or None)  # create instance of the SORT tracker
+        if (args.verify):
+            reference = Sort(max_age=args.max_age, min_hits=args.min_hits, iou_threshold=args.iou_threshold)
+            reference_count = KalmanBoxTracker.count
         seq_dets = np.loadtxt(seq_dets_fn, delimiter=',')
         seq = seq_dets_fn[pattern.find('*'):].split(os.path.sep)[0]
 
@@ -322,6 +615,14 @@ if __name__ == '__main__':
                 cycle_time = time.time() - start_time
                 total_time += cycle_time
 
+                if (args.verify):
+                    # both trackers draw IDs from KalmanBoxTracker.count; give the reference its own sequence
+                    tracked_count, KalmanBoxTracker.count = KalmanBoxTracker.count, reference_count
+                    expected = reference.update(dets)
+                    reference_count, KalmanBoxTracker.count = KalmanBoxTracker.count, tracked_count
+                    if not np.array_equal(trackers, expected):
+                        mismatched_frames += 1
+
                 for d in trackers:
                     print('%d,%d,%.2f,%.2f,%.2f,%.2f,1,-1,-1,-1' % (frame, d[4], d[0], d[1], d[2] - d[0], d[3] - d[1]),
                           file=out_file)
@@ -337,6 +638,8 @@ if __name__ == '__main__':
 
     print("Total Tracking took: %.3f seconds for %d frames or %.1f FPS" % (
     total_time, total_frames, total_frames / total_time))
+    if (args.verify):
+        print("%d of %d frames differ from the reference Sort" % (mismatched_frames, total_frames))
 
     if (display):
         print("Note: to get real runtime results run without the option: --display")
\ No newline at end of file
@@ -0,0 +1,43 @@
+"""
+Stream registry.
+
+Cameras and videos are configured in a YAML file (STREAMS_CONFIG, streams.yaml by
+default) instead of in code. Each stream has its own source, mask, counting lines
+and zones, and the models that run on it; a `defaults` section applies to every
+stream. See streams.yaml for the format.
+"""
+
+import yaml
+
+MODEL_NAMES = ('custom', 'standard')
+
+DEFAULTS = {
+    'mask': None,             # None sends the whole frame to the detector
+    'show_lines': True,
+    'counting_enabled': True,
+    'lines': {},              # name: [[x, y], ...] polyline, as fractions of the frame
+    'zones': {},              # name: [[x, y], ...] polygon, as fractions of the frame
+    'models': list(MODEL_NAMES)
+}
+
+
+def load_streams(path):
+    """{stream name: spec} in file order; raises ValueError for an invalid file"""
+    with open(path) as f:
+        config = yaml.safe_load(f) or {}
+    defaults = dict(DEFAULTS, **(config.get('defaults') or {}))
+
+    streams = {}
+    for name, spec in (config.get('streams') or {}).items():
+        spec = dict(defaults, **(spec or {}))
+        if spec.get('source') is None:
+            raise ValueError(f"{path}: stream '{name}' has no source")
+        unknown = [model for model in spec['models'] if model not in MODEL_NAMES]
+        if unknown or not spec['models']:
+            raise ValueError(f"{path}: stream '{name}' needs models from {MODEL_NAMES}, got {spec['models']}")
+        if spec['counting_enabled'] and not {'entry', 'exit'} <= set(spec['lines']):
+            raise ValueError(f"{path}: stream '{name}' counts vehicles but has no 'entry' and 'exit' lines")
+        streams[str(name)] = spec
+    if not streams:
+        raise ValueError(f"{path}: no streams configured")
+    return streams
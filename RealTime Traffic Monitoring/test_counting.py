@@ -0,0 +1,44 @@
+import numpy as np
+
+from counting import TrafficCounter
+
+
+def track(track_id, cy, cx=100, half=10):
+    """(1, 5) tracker row with its centroid at (cx, cy)"""
+    return np.array([[cx - half, cy - half, cx + half, cy + half, track_id]], dtype=float)
+
+
+def lane_count(counter, path, track_id=1):
+    count = 0
+    for cy in path:
+        events = counter.update(track(track_id, cy), {track_id})
+        count += sum(change for _, _, change in counter.tally(events, 'entry', 'exit'))
+    return count
+
+
+def make_counter():
+    return TrafficCounter({'entry': [(0, 347), (200, 347)], 'exit': [(0, 600), (200, 600)]})
+
+
+def test_oscillating_centroid_counts_once():
+    counter = make_counter()
+    # Crosses the entry line forward three times while jittering around it
+    assert lane_count(counter, [330, 350, 344, 352, 345, 355]) == 1
+    assert counter.counts['entry']['forward'] == 3
+
+
+def test_exit_uncounts_once():
+    counter = make_counter()
+    assert lane_count(counter, [330, 350, 595, 605, 598, 610]) == 0
+
+
+def test_exit_without_entry_is_ignored():
+    counter = make_counter()
+    assert lane_count(counter, [590, 610]) == 0
+
+
+def test_counted_track_is_evicted():
+    counter = make_counter()
+    lane_count(counter, [330, 350])
+    counter.evict(set())
+    assert not counter.counted
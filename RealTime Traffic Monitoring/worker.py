@@ -0,0 +1,379 @@
+"""
+Headless traffic-monitoring worker.
+
+Runs capture -> detect -> track -> count for every stream of the registry
+(streams.yaml, see streams.py), independently of any browser session, and publishes
+each stream's newest annotated frame (JPEG) with its counts, alerts and FPS on a
+shared-memory channel (channel.py). The Streamlit app (main.py) is only a viewer of
+that channel.
+
+Streams are spread round-robin over a pool of worker processes sized to the
+machine's cores (WORKERS / CORES_PER_WORKER). Each worker batches its streams'
+frames into shared forward passes and divides its inference time fairly between
+them (scheduling.FairShare), so adding cameras only needs a new streams.yaml entry.
+
+    python worker.py
+    python worker.py --config streams.yaml --workers 2
+    python worker.py --speed 0 --no-loop    # process the videos once, as fast as possible
+"""
+
+import os
+import time
+import queue
+import logging
+import argparse
+import multiprocessing as mp
+
+import cv2
+import cvzone
+import numpy as np
+from ultralytics import YOLO
+
+from config import Config
+from sort import BatchSort
+from pipeline import FrameSource, Pipeline
+from inference import InferenceScheduler, cross_model_nms
+from roi import MaskROI
+from detections import DetectionFilter
+from scheduling import DetectionScheduler, FairShare
+from counting import TrafficCounter, scale_points
+from channel import ChannelPublisher
+from streams import load_streams
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_CLASSES = ["ambulance_active", "firetruck_active", "police_active"]
+VEHICLE_CLASSES = ["car", "truck", "bus", "motorbike"]
+
+LINE_COLORS = {'entry': (255, 255, 0), 'exit': (255, 0, 255)}
+CROSSING_COLORS = {'entry': (0, 255, 0), 'exit': (0, 0, 255)}
+
+
+def stream_models(spec):
+    """Models run on a stream, primary first; merged mode has one model for every class"""
+    if Config.DETECTOR_MODE == 'merged':
+        return ['custom']
+    return list(dict.fromkeys(spec['models']))
+
+
+def load_models(names):
+    """{name: YOLO model} for the given model names ('custom' is the merged model in merged mode)"""
+    paths = {'custom': Config.YOLO_MERGED_MODEL if Config.DETECTOR_MODE == 'merged' else Config.YOLO_CUSTOM_MODEL,
+             'standard': Config.YOLO_STANDARD_MODEL}
+    return {name: YOLO(paths[name]) for name in names}
+
+
+def make_filters(models):
+    """Per-model, per-class confidence thresholds, applied to each result's boxes in one vectorized pass"""
+    filters = {}
+    for name, model in models.items():
+        if name == 'custom':
+            detection_filter = DetectionFilter(
+                model.names, {cls: 0.3 for cls in ["accident"] + PRIORITY_CLASSES + VEHICLE_CLASSES})
+        else:
+            # Every class of the standard model counts once it is confident enough
+            detection_filter = DetectionFilter(model.names, {}, default=0.5)
+        filters[name] = {
+            'filter': detection_filter,
+            'accident': detection_filter.class_mask(["accident"]),
+            'priority': detection_filter.class_mask(PRIORITY_CLASSES)
+        }
+    return filters
+
+
+def make_lane(spec):
+    """Tracking and counting state of one stream"""
+    if spec['mask'] is None:
+        mask = np.full((Config.FRAME_SIZE[1], Config.FRAME_SIZE[0]), 255, np.uint8)
+    else:
+        mask = cv2.imread(spec['mask'])
+        if mask is None:
+            raise FileNotFoundError(f"Mask {spec['mask']} not found")
+    return dict(spec, models=stream_models(spec), roi=MaskROI(mask), count=0, alerts=(False, False),
+                tracker=BatchSort(max_age=20, min_hits=3, iou_threshold=0.3, grid=Config.TRACKER_GRID_CELL or None),
+                counter=TrafficCounter(scale_points(spec['lines'], Config.FRAME_SIZE),
+                                       scale_points(spec['zones'], Config.FRAME_SIZE)),
+                scheduler=DetectionScheduler(Config.MAX_DETECTION_INTERVAL, dense_tracks=Config.DENSE_TRACKS,
+                                             fast_speed=Config.FAST_TRACK_SPEED, line_margin=Config.LINE_MARGIN))
+
+
+# Decide whether a lane's other models also run on its frame, from its primary model's results
+# and the filter those results go through
+def needs_second_model(lane, results1, detection_filter):
+    if Config.DETECTOR_MODE != 'scheduled':
+        return True
+    lane['frames_since_second'] = lane.get('frames_since_second', 0) + 1
+    ambiguous = detection_filter.ambiguous(results1.boxes, Config.AMBIGUITY_CONF)
+    if ambiguous or lane['frames_since_second'] >= Config.SECOND_MODEL_INTERVAL:
+        lane['frames_since_second'] = 0
+        return True
+    return False
+
+
+# Function to process frame; results is this frame's [(model name, Results)], primary model
+# first (models that did not run are left out), in coordinates of the ROI crop at offset.
+# results is None on frames where detection was skipped; tracks then move on their Kalman
+# predictions. Vehicles are counted by the counter's line crossings.
+# Also returns the tracker output.
+def process_frame(img, tracker, counter, count, results, filters, offset=(0, 0), show_lines=True,
+                  counting_enabled=True):
+    lane_priority_active = False
+    accident_active = False
+
+    if results is None:
+        resultsTracker = tracker.predict()
+    else:
+        detections = None
+        for name, result in results:
+            model_detections, classes = filters[name]['filter'](result.boxes, offset)
+            accident_active |= bool(filters[name]['accident'][classes].any())
+            lane_priority_active |= bool(filters[name]['priority'][classes].any())
+            # Vehicles found by several models would otherwise reach the tracker twice
+            detections = model_detections if detections is None else cross_model_nms(
+                detections, model_detections, Config.CROSS_MODEL_IOU)
+        resultsTracker = tracker.update(detections)
+
+    if show_lines:
+        for name, points in counter.lines.items():
+            cv2.polylines(img, [points.astype(np.int32)], False, LINE_COLORS.get(name, (255, 255, 0)), 4)
+
+    for result in resultsTracker:
+        x1, y1, x2, y2, Id = map(int, result)
+        cvzone.cornerRect(img, (x1, y1, x2 - x1, y2 - y1), l=9, rt=2, colorR=(0, 0, 255))
+        cvzone.putTextRect(img, f'ID {Id}', (max(0, x1), max(35, y1)), scale=1, thickness=2, offset=6)
+
+    if counting_enabled and show_lines:
+        # Crossings of the segment between each track's last and current centroid
+        events = counter.update(resultsTracker, tracker.live_ids())
+        for Id, name, change in counter.tally(events, 'entry', 'exit'):
+            count += change
+            cv2.polylines(img, [counter.lines[name].astype(np.int32)], False, CROSSING_COLORS[name], 4)
+
+    return img, tracker, counter, count, lane_priority_active, accident_active, resultsTracker
+
+
+def make_lane_processor(lanes, scheduler, filters, fair):
+    """Per-batch work run on the pipeline's inference thread: one forward pass per model
+    over the newest frame of every lane due for detection, then tracking and counting per lane.
+    Each result is (annotated image, metadata to publish)."""
+    def process(frames):
+        # Lanes whose detection scheduler skips this frame coast on their tracker's predictions
+        due = [i for i, frame in enumerate(frames) if lanes[frame.stream]['scheduler'].step()]
+        # Due lanes beyond this batch's share of inference time coast too and go first next time
+        served = set(fair.select([frames[i].stream for i in due]))
+        for i in due:
+            if frames[i].stream not in served:
+                lanes[frames[i].stream]['scheduler'].postpone()
+        due = [i for i in due if frames[i].stream in served]
+        # Only the masked ROI of each frame reaches the detector, at full-frame scale
+        crops = {i: lanes[frames[i].stream]['roi'].apply(frames[i].image) for i in due}
+        detected = {i: [] for i in due}
+        seconds = {i: 0.0 for i in due}
+
+        def infer(group, name):
+            started = time.perf_counter()
+            outputs = scheduler.infer([crops[i][0] for i in group], [name], imgsz=imgsz)
+            # Frames of one call share its time; they are padded to the same input size
+            share = (time.perf_counter() - started) / len(group)
+            for i, results in zip(group, outputs):
+                detected[i].append((name, results[name]))
+                seconds[i] += share
+
+        if due:
+            imgsz = max(lanes[frames[i].stream]['roi'].imgsz(frames[i].image) for i in due)
+            # Lanes with the same primary model share its forward pass
+            for name in scheduler.models:
+                group = [i for i in due if lanes[frames[i].stream]['models'][0] == name]
+                if group:
+                    infer(group, name)
+            second = [i for i in due if len(lanes[frames[i].stream]['models']) > 1
+                      and needs_second_model(lanes[frames[i].stream], detected[i][0][1],
+                                             filters[detected[i][0][0]]['filter'])]
+            for name in scheduler.models:
+                group = [i for i in second if name in lanes[frames[i].stream]['models'][1:]]
+                if group:
+                    infer(group, name)
+            for i in due:
+                fair.charge(frames[i].stream, seconds[i])
+                # Merge in the lane's model order whichever batch each result came from
+                order = lanes[frames[i].stream]['models']
+                detected[i].sort(key=lambda item: order.index(item[0]))
+
+        outputs = []
+        for i, frame in enumerate(frames):
+            lane = lanes[frame.stream]
+            img, lane['tracker'], lane['counter'], lane['count'], priority, accident, tracks = process_frame(
+                frame.image, lane['tracker'], lane['counter'], lane['count'], detected.get(i), filters,
+                offset=crops[i][1] if i in crops else (0, 0), show_lines=lane['show_lines'],
+                counting_enabled=lane['counting_enabled'])
+            # Alerts only come from detections, so hold the last ones across coasted frames
+            if i in detected:
+                lane['alerts'] = (priority, accident)
+            priority, accident = lane['alerts']
+
+            lines = []
+            if lane['show_lines'] and lane['counting_enabled']:
+                lines = lane['counter'].segments()
+            lane['scheduler'].observe(tracks, lines, alert=priority or accident, unsettled=lane['tracker'].unsettled())
+            outputs.append((img, {
+                'frame': frame.index,
+                'count': lane['count'],
+                'crossings': {name: dict(counts) for name, counts in lane['counter'].counts.items()},
+                'priority': priority,
+                'accident': accident
+            }))
+        return outputs
+    return process
+
+
+def serve(specs, publisher, report, speed=1.0, loop=True, quality=Config.JPEG_QUALITY, status_interval=1.0,
+          stop=None):
+    """Process the given streams ({name: spec}) until their videos end (or forever when
+    looping / live) or stop is set, publishing each new annotated frame on publisher and
+    passing this worker's stats to report every status_interval seconds"""
+    lanes = {name: make_lane(spec) for name, spec in specs.items()}
+    models = load_models(dict.fromkeys(model for lane in lanes.values() for model in lane['models']))
+    filters = make_filters(models)
+    scheduler = InferenceScheduler(models, max_batch=Config.INFERENCE_MAX_BATCH)
+    fair = FairShare(budget=Config.INFERENCE_SLICE_MS / 1000)
+    sources = [
+        # Pooled frames cover the queue, the decoder, inference, the latest result and this loop
+        FrameSource(name, lane['source'], size=Config.FRAME_SIZE, loop=loop, speed=speed,
+                    queue_size=Config.PIPELINE_QUEUE_SIZE, pool_size=Config.PIPELINE_QUEUE_SIZE + 4)
+        for name, lane in lanes.items()
+    ]
+    pipeline = Pipeline(sources, make_lane_processor(lanes, scheduler, filters, fair)).start()
+    logger.info(f"Processing {', '.join(lanes)}")
+
+    published = {}
+    version, last_status = 0, 0.0
+    try:
+        while pipeline.running and not (stop is not None and stop.is_set()):
+            # This loop is the render stage: JPEG encoding overlaps the next inference batch
+            version, results = pipeline.wait(version)
+            for name, (frame, (img, meta)) in results.items():
+                if published.get(name) is not frame:
+                    published[name] = frame
+                    meta['fps'] = round(pipeline.stream_stats[name].fps, 1)
+                    ok, jpeg = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+                    if ok:
+                        # Copied once, from the encoder's output straight into shared memory
+                        publisher.publish(name, jpeg.reshape(-1), meta)
+                frame.release()
+            now = time.monotonic()
+            if now - last_status >= status_interval:
+                last_status = now
+                report({
+                    'Pipeline': pipeline.stats(),
+                    'Inference': scheduler.stats(),
+                    'Fair share': fair.stats(),
+                    'Detection': {name: lane['scheduler'].stats() for name, lane in lanes.items()}
+                })
+        if pipeline.error:
+            raise pipeline.error
+        logger.info(f"Streams ended: {', '.join(lanes)}")
+    except KeyboardInterrupt:
+        logger.info("Stopping")
+    finally:
+        pipeline.stop()
+
+
+def _serve_process(index, specs, channel, streams, speed, loop, quality, status_interval, threads, reports, stop):
+    """Entry point of one pool worker: attach to the parent's channel and serve specs"""
+    logging.basicConfig(level=logging.INFO, format=f'[worker {index + 1}] %(levelname)s:%(name)s:%(message)s')
+    # Each worker gets its share of the cores instead of every worker using all of them
+    import torch
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(threads)
+    width, height = Config.FRAME_SIZE
+    publisher = ChannelPublisher(channel, streams, frame_bytes=width * height * 3, create=False)
+    try:
+        serve(specs, publisher, lambda stats: reports.put((index, stats)), speed=speed, loop=loop,
+              quality=quality, status_interval=status_interval, stop=stop)
+    finally:
+        publisher.close()
+
+
+def default_workers(streams):
+    """One worker per CORES_PER_WORKER cores, at least one and at most one per stream"""
+    if Config.WORKERS > 0:
+        return min(Config.WORKERS, len(streams))
+    return max(1, min(len(streams), (os.cpu_count() or 1) // max(1, Config.CORES_PER_WORKER)))
+
+
+def run(specs, workers=1, speed=1.0, loop=True, channel=Config.CHANNEL_NAME, quality=Config.JPEG_QUALITY,
+        status_interval=1.0):
+    """Process every stream ({name: spec}) on a pool of worker processes, publishing each
+    new annotated frame on the channel. Streams are assigned to workers round-robin; with
+    one worker everything runs in this process."""
+    names = list(specs)
+    width, height = Config.FRAME_SIZE
+    publisher = ChannelPublisher(channel, names, frame_bytes=width * height * 3)
+    workers = max(1, min(workers, len(names)))
+    logger.info(f"Publishing {len(names)} streams on channel '{channel}' with {workers} worker(s)")
+    if workers == 1:
+        try:
+            serve(specs, publisher, lambda stats: publisher.publish_status({'Worker 1': stats}), speed=speed,
+                  loop=loop, quality=quality, status_interval=status_interval)
+        finally:
+            publisher.close()
+        return
+
+    # Spawned, not forked: the parent's threads and model state must not leak into workers
+    context = mp.get_context('spawn')
+    reports = context.Queue()
+    stop = context.Event()
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    processes = [
+        context.Process(target=_serve_process, name=f"worker-{k + 1}",
+                        args=(k, {name: specs[name] for name in names[k::workers]}, channel, names, speed, loop,
+                              quality, status_interval, threads, reports, stop))
+        for k in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    stats = {f'Worker {k + 1}': {} for k in range(workers)}
+    try:
+        while any(process.is_alive() for process in processes):
+            try:
+                index, worker_stats = reports.get(timeout=status_interval)
+                stats[f'Worker {index + 1}'] = worker_stats
+            except queue.Empty:
+                pass
+            # The heartbeat keeps going while any worker runs
+            publisher.publish_status(stats)
+        logger.info("All streams ended")
+    except KeyboardInterrupt:
+        logger.info("Stopping")
+    finally:
+        stop.set()
+        for process in processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+            elif process.exitcode:
+                logger.error(f"{process.name} exited with code {process.exitcode}")
+        publisher.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Headless detection, tracking and counting for all streams')
+    parser.add_argument('--config', default=Config.STREAMS_CONFIG, help='Stream registry (YAML)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes (default: WORKERS, or one per CORES_PER_WORKER cores)')
+    parser.add_argument('--speed', type=float, default=Config.PLAYBACK_SPEED,
+                        help='Playback speed of video files (0 = as fast as possible)')
+    parser.add_argument('--no-loop', dest='loop', action='store_false', default=Config.LOOP_VIDEO,
+                        help='Stop at the end of the videos instead of restarting them')
+    parser.add_argument('--channel', default=Config.CHANNEL_NAME, help='Shared-memory channel name')
+    parser.add_argument('--quality', type=int, default=Config.JPEG_QUALITY, help='JPEG quality of published frames')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    streams = load_streams(args.config)
+    run(streams, workers=args.workers or default_workers(streams), speed=args.speed, loop=args.loop,
+        channel=args.channel, quality=args.quality)
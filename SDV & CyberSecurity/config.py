@@ -6,6 +6,10 @@ CAN_INTERFACE = "socketcan"
 
 # File Paths
 LOG_FILE = "can_log.csv"
+VERDICT_LOG_FILE = "can_verdicts.bin"
+TIMING_PROFILE_FILE = "timing_profiles.json"
+ROLLUP_DB_FILE = "can_rollups.db"
+HISTORY_DIR = "can_history"
 MODEL_FILE = "ids_model.pkl"
 TRAINING_DATA_FILE = "can_data.csv"
 
@@ -20,6 +24,54 @@ FEATURE_EXTRACTION_ENABLED = True
 MODEL_TYPES = ['isolation_forest', 'xgboost', 'random_forest']
 TIME_SERIES_FEATURES = True
 
+# Alert Aggregation Configuration
+INCIDENT_GAP_SECONDS = 2.0       # close an incident after this much quiet time
+INCIDENT_MAX_DURATION = 60.0     # split long-running incidents for periodic reporting
+INCIDENT_SAMPLE_FRAMES = 3       # frames kept as evidence per incident
+INCIDENT_EMIT_RATE = 2.0         # incident records per second
+INCIDENT_EMIT_BURST = 5
+INCIDENT_BACKLOG = 100           # closed incidents waiting for an emit slot
+
+# Tiered Evaluation Configuration
+IDS_BATCH_SIZE = 64              # frames drained from the bus per evaluation pass
+PREFILTER_ENABLED = True         # cheap vectorized rules run before the ML model
+PREFILTER_ACCEPT_NORMAL = True   # rules may also clear fully-decoded, on-time frames
+
+# Timing Detector Configuration
+TIMING_SKETCH_ACCURACY = 0.02    # relative error of the inter-arrival quantile sketch
+TIMING_LOW_QUANTILE = 0.01
+TIMING_HIGH_QUANTILE = 0.99
+TIMING_TOLERANCE = 0.25          # slack around the learned [low, high] period band
+TIMING_MIN_VIOLATIONS = 3        # early arrivals (leaky count) before a frame is flagged
+TIMING_MIN_SAMPLES = 20          # frames needed before an ID gets a profile
+
+# Metrics Configuration
+METRICS_ENABLED = True
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+
+# Streaming Dashboard Backend Configuration
+STREAM_HOST = "127.0.0.1"
+STREAM_PORT = 8765
+STREAM_TICK = 0.5                # seconds between delta pushes
+STREAM_TIMELINE_MINUTES = 60     # rolling per-minute timeline kept in memory
+STREAM_RECENT_INCIDENTS = 50
+STREAM_CLIENT_QUEUE = 256        # pending deltas per client before it is resynced
+STREAM_PROBE_TTL = 10.0          # seconds the dashboard reuses its stream server check
+
+# Rollup Store Configuration
+# Bucket width in seconds -> how long buckets of that width are kept
+ROLLUP_RETENTION = {
+    1: 60 * 60,              # per-second buckets for the last hour
+    60: 3 * 24 * 60 * 60,    # per-minute buckets for three days
+    3600: 400 * 24 * 60 * 60 # per-hour buckets for ~13 months
+}
+ROLLUP_MAX_BUCKETS = 800     # finest resolution that fits this many buckets is used
+
+# History Store Configuration
+HISTORY_SEGMENT_SECONDS = 3600   # time span of one columnar segment
+HISTORY_QUERY_LIMIT = 10000      # most recent matching rows returned by a query
+
 # Dashboard Configuration
 REFRESH_INTERVAL = 2  # seconds
 MAX_DISPLAY_ROWS = 50
@@ -45,6 +97,22 @@ CAN_IDS = {
     "FUEL_LEVEL": 0x105
 }
 
+# Signal Database (DBC-style subset): one entry per physical signal.
+# Physical value = raw * scale + offset; values outside [min, max] are unrealistic.
+SIGNAL_DATABASE = [
+    {"name": "speed", "id": CAN_IDS["SPEED"], "start_byte": 0, "length": 1,
+     "byte_order": "big", "scale": 1.0, "offset": 0.0, "min": 0, "max": 200, "unit": "km/h"},
+    {"name": "rpm", "id": CAN_IDS["RPM"], "start_byte": 0, "length": 2,
+     "byte_order": "big", "scale": 1.0, "offset": 0.0, "min": 0, "max": 8000, "unit": "rpm"},
+    {"name": "engine_temp", "id": CAN_IDS["ENGINE_TEMP"], "start_byte": 0, "length": 1,
+     "byte_order": "big", "scale": 1.0, "offset": 0.0, "min": 0, "max": 120, "unit": "°C"},
+]
+
+# Attack Engine Configuration
+ATTACK_HISTORY_CAPACITY = 10000  # most recent sent frames kept in memory
+ATTACK_CAPTURE_FILE = None       # e.g. "attack_capture.bin" to spill every sent frame to disk
+ATTACK_QUEUE_SIZE = 1000         # frames generators may queue ahead of the bus sender
+
 # Attack Parameters
 ATTACK_PARAMS = {
     "DOS": {"burst_count": 100, "interval": 0.01},
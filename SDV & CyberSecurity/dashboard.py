@@ -6,8 +6,72 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import ast
+import json
+import urllib.request
+import streamlit.components.v1 as components
 from config import *
 from attack_engine_sync import AttackEngine
+from rollups import RollupStore
+from history import HistoryStore
+
+STREAM_URL = f"http://{STREAM_HOST}:{STREAM_PORT}"
+
+# Live panel fed by stream_server.py over Server-Sent Events. It applies deltas
+# in the browser, so live numbers update without rerunning this script.
+LIVE_PANEL_HTML = """
+<style>
+body { font-family: sans-serif; margin: 0; }
+.row { display: flex; gap: 1rem; margin-bottom: 0.5rem; }
+.card { flex: 1; background: #f0f2f6; border-radius: 0.5rem; padding: 0.5rem 1rem; }
+.card b { font-size: 1.6rem; display: block; }
+.types span { display: inline-block; margin-right: 1rem; }
+ul { margin: 0.3rem 0; padding-left: 1.2rem; font-size: 0.85rem; }
+</style>
+<div class="row">
+  <div class="card">Frames (window)<b id="frames">0</b></div>
+  <div class="card">Anomalies<b id="anomalies">0</b></div>
+  <div class="card">Rate (msg/s)<b id="rate">0</b></div>
+</div>
+<div class="types" id="types"></div>
+<ul id="incidents"></ul>
+<script>
+const ICONS = __ICONS__;
+const state = {frames: 0, anomalies: 0, by_type: {}, incidents: []};
+function render() {
+  document.getElementById('frames').textContent = state.frames.toLocaleString();
+  document.getElementById('anomalies').textContent = state.anomalies.toLocaleString();
+  document.getElementById('types').innerHTML = Object.entries(state.by_type)
+    .map(([t, c]) => `<span>${ICONS[t] || '🚨'} ${t}: ${c.toLocaleString()}</span>`).join('');
+  document.getElementById('incidents').innerHTML = state.incidents.slice(-8).reverse()
+    .map(i => `<li>${ICONS[i.attack_type] || '🚨'} ${i.timestamp} ${i.attack_type}: ` +
+              `${i.count || 1} frames, peak ${i.peak_rate || '-'} msg/s, IDs ${i.ids || i.id}</li>`).join('');
+}
+const source = new EventSource('__URL__/events');
+source.onmessage = (e) => {
+  const msg = JSON.parse(e.data);
+  if (msg.type === 'snapshot') {
+    state.frames = msg.totals.frames; state.anomalies = msg.totals.anomalies;
+    state.by_type = msg.by_type; state.incidents = msg.incidents;
+  } else {
+    state.frames += msg.frames; state.anomalies += msg.anomalies;
+    for (const [t, c] of Object.entries(msg.by_type)) state.by_type[t] = (state.by_type[t] || 0) + c;
+    state.incidents = state.incidents.concat(msg.incidents).slice(-50);
+  }
+  document.getElementById('rate').textContent = msg.rate;
+  render();
+};
+</script>
+"""
+
+@st.cache_data(ttl=STREAM_PROBE_TTL, show_spinner=False)
+def stream_available():
+    """True if the streaming aggregation service is reachable; checked at most once per
+    STREAM_PROBE_TTL so reruns are not held up while the service is down"""
+    try:
+        with urllib.request.urlopen(f"{STREAM_URL}/snapshot", timeout=0.5):
+            return True
+    except Exception:
+        return False
 
 st.set_page_config(
     page_title=DASHBOARD_TITLE, 
@@ -49,6 +113,13 @@ st.markdown("""
 st.title(DASHBOARD_TITLE)
 st.markdown("**Real-time CAN Bus Security Monitoring & Attack Simulation**")
 
+# Live numbers are pushed by stream_server.py; without it, fall back to periodic reruns
+live_stream = stream_available()
+if live_stream:
+    st.subheader("⚡ Live Stream")
+    icons = json.dumps({k: v['icon'] for k, v in ATTACK_TYPES.items()})
+    components.html(LIVE_PANEL_HTML.replace('__URL__', STREAM_URL).replace('__ICONS__', icons), height=230)
+
 # Sidebar for attack controls
 with st.sidebar:
     st.header("🎯 Attack Control Panel")
@@ -88,78 +159,113 @@ with st.sidebar:
     if st.button("Clear History"):
         st.session_state.attack_engine.clear_history()
         st.info("History cleared")
+    
+    # Analytics below the live panel refresh on demand when streaming is active
+    st.button("🔄 Refresh Analytics")
 
 # Main dashboard
 col1, col2, col3 = st.columns([2, 2, 1])
 
-# Wait for log file
-if not os.path.exists(LOG_FILE):
-    st.warning("⚠️ Waiting for IDS to create log file. Make sure `ids.py` is running.")
-    time.sleep(2)
-    st.rerun()
+# Row styles are derived once per attack type rather than once per row
+ROW_STYLE = "background-color: {color}20"  # 20 for transparency
 
-# Load and process data
-try:
+@st.cache_data(max_entries=2, show_spinner=False)
+def load_log(path, mtime, size):
+    """Parse the incident log; re-runs only when the file changes"""
     # Handle inconsistent CSV format
-    df = pd.read_csv(LOG_FILE, on_bad_lines='skip', low_memory=False)
+    df = pd.read_csv(path, on_bad_lines='skip', low_memory=False)
     if len(df) == 0:
-        raise ValueError("Empty log file")
-except Exception as e:
-    st.error(f"Could not read log file: {e}")
-    if st.button("Clear Log File"):
-        import os
-        if os.path.exists(LOG_FILE):
-            os.remove(LOG_FILE)
-            st.success("Log file cleared. Restart IDS to create new log.")
-            st.rerun()
-    st.stop()
+        return df
+    
+    # Handle log format
+    if 'timestamp' in df.columns:
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+    else:
+        df['timestamp'] = pd.to_datetime(df.index)
+    
+    # Ensure attack_type column exists
+    if 'attack_type' not in df.columns:
+        df['attack_type'] = 'NORMAL'
+        df.loc[df['prediction'] == 'Anomaly', 'attack_type'] = 'DOS'
+    df['attack_type'] = df['attack_type'].fillna('NORMAL').astype(str)
+    
+    # Incident rows carry the number of frames they aggregate
+    if 'count' not in df.columns:
+        df['count'] = 1
+    df['count'] = pd.to_numeric(df['count'], errors='coerce').fillna(1).astype(int)
+    
+    return df.sort_values('timestamp').tail(1000)
 
-if len(df) == 0:
-    st.info("No CAN data available yet. Waiting for traffic...")
-    time.sleep(REFRESH_INTERVAL)
-    st.rerun()
+# Charts render from pre-aggregated rollup buckets, never from raw rows
+CHART_RANGES = {
+    "Last 5 minutes": 5 * 60,
+    "Last hour": 60 * 60,
+    "Last 24 hours": 24 * 60 * 60,
+    "Last 7 days": 7 * 24 * 60 * 60,
+    "Last 30 days": 30 * 24 * 60 * 60,
+}
+RESOLUTION_LABELS = {1: "per second", 60: "per minute", 3600: "per hour"}
 
-# Handle log format
-if 'timestamp' in df.columns:
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-else:
-    df['timestamp'] = pd.to_datetime(df.index)
+@st.cache_resource
+def get_rollup_store():
+    return RollupStore()
 
-# Ensure attack_type column exists
-if 'attack_type' not in df.columns:
-    df['attack_type'] = 'NORMAL'
-    df.loc[df['prediction'] == 'Anomaly', 'attack_type'] = 'DOS'
+@st.cache_resource
+def get_history_store():
+    return HistoryStore()
 
-df = df.sort_values('timestamp').tail(1000)
+rollups = get_rollup_store()
+history = get_history_store()
+if not live_stream:
+    # stream_server.py keeps the rollups and history current when it runs; otherwise catch up here
+    rollups.update()
+    history.update()
 
-# Add attack type colors and icons
-def get_attack_style(attack_type):
-    return ATTACK_TYPES.get(attack_type, ATTACK_TYPES['NORMAL'])
+# Incidents are optional: counts and charts come from the rollups, which every verdict feeds
+df = pd.DataFrame()
+if os.path.exists(LOG_FILE):
+    try:
+        log_stat = os.stat(LOG_FILE)
+        df = load_log(LOG_FILE, log_stat.st_mtime, log_stat.st_size)
+    except Exception as e:
+        st.error(f"Could not read incident log: {e}")
+        if st.button("Clear Log File"):
+            os.remove(LOG_FILE)
+            st.success("Log file cleared. Restart IDS to create new log.")
+            st.rerun()
 
-df['color'] = df['attack_type'].apply(lambda x: get_attack_style(x)['color'])
-df['icon'] = df['attack_type'].apply(lambda x: get_attack_style(x)['icon'])
-df['attack_display'] = df.apply(lambda row: f"{row['icon']} {row['attack_type']}", axis=1)
+# Metrics row over every verdict kept in the rollups, normal traffic included
+now = time.time()
+all_totals = rollups.totals(0, now)
+recent_totals = rollups.totals(now - 5 * 60, now)
+total_messages = sum(all_totals.values())
+anomalies = total_messages - all_totals.get('NORMAL', 0)
 
-# Metrics row
 with col1:
-    total_messages = len(df)
-    anomalies = len(df[df['prediction'] == 'Anomaly'])
     st.metric("Total Messages", total_messages)
 
 with col2:
     st.metric("Anomalies Detected", anomalies, delta=f"{(anomalies/total_messages*100):.1f}%" if total_messages > 0 else "0%")
 
 with col3:
-    recent_anomalies = len(df[(df['timestamp'] > datetime.now() - timedelta(minutes=5)) & (df['prediction'] == 'Anomaly')])
+    recent_anomalies = sum(recent_totals.values()) - recent_totals.get('NORMAL', 0)
     st.metric("Recent (5min)", recent_anomalies)
 
+if not total_messages:
+    st.info("No CAN data available yet. Make sure `ids.py` is running.")
+
+chart_range = st.selectbox("Chart Range", list(CHART_RANGES), index=1)
+range_end = time.time()
+range_start = range_end - CHART_RANGES[chart_range]
+color_map = {k: v['color'] for k, v in ATTACK_TYPES.items()}
+
 # Attack type distribution
 st.subheader("📈 Attack Type Distribution")
-attack_counts = df['attack_type'].value_counts()
+attack_totals = rollups.totals(range_start, range_end)
+attack_counts = pd.Series(attack_totals, dtype='int64').sort_values(ascending=False)
 
 if len(attack_counts) > 0:
     # Create color mapping with fallbacks
-    color_map = {k: v['color'] for k, v in ATTACK_TYPES.items()}
     for attack_type in attack_counts.index:
         if attack_type not in color_map:
             color_map[attack_type] = '#808080'
@@ -178,21 +284,23 @@ else:
 
 # Timeline visualization
 st.subheader("🕰️ Attack Timeline")
-if len(df) > 0:
-    # Group by minute for timeline
-    df['minute'] = df['timestamp'].dt.floor('min')
-    timeline_data = df.groupby(['minute', 'attack_type']).size().reset_index(name='count')
+resolution, timeline_rows = rollups.timeline(range_start, range_end)
+if timeline_rows:
+    timeline_data = pd.DataFrame(timeline_rows, columns=['bucket', 'attack_type', 'count'])
+    timeline_data['bucket'] = timeline_data['bucket'].map(datetime.fromtimestamp)
     
     fig_timeline = px.bar(
         timeline_data,
-        x='minute',
+        x='bucket',
         y='count',
         color='attack_type',
-        title="Attacks Over Time",
-        color_discrete_map={k: v['color'] for k, v in ATTACK_TYPES.items()}
+        title=f"Attacks Over Time ({RESOLUTION_LABELS.get(resolution, f'{resolution}s buckets')})",
+        color_discrete_map=color_map
     )
     fig_timeline.update_layout(xaxis_title="Time", yaxis_title="Message Count")
     st.plotly_chart(fig_timeline, width='stretch')
+else:
+    st.info("No traffic in the selected range.")
 
 # Live traffic feed
 st.subheader("📡 Live CAN Traffic Feed")
@@ -210,43 +318,35 @@ with col2:
 with col3:
     max_rows = st.slider("Max Rows", 10, 100, MAX_DISPLAY_ROWS)
 
-# Apply filters
-filtered_df = df.copy()
-if not show_normal:
-    filtered_df = filtered_df[filtered_df['prediction'] == 'Anomaly']
-if selected_types:
-    filtered_df = filtered_df[filtered_df['attack_type'].isin(selected_types)]
+# Most recent verdicts from the history store; normal frames only when asked for
+feed_types = selected_types + ['NORMAL'] if show_normal and selected_types else selected_types
+feed = history.query(attack_types=feed_types or None, prediction=None if show_normal else -1, limit=max_rows)
 
 # Display table with styling
-if len(filtered_df) > 0:
-    # Use available columns
-    cols_to_show = ['timestamp', 'id', 'data', 'attack_display', 'prediction']
-    available_cols = [col for col in cols_to_show if col in filtered_df.columns]
-    display_df = filtered_df[available_cols].tail(max_rows)
+if len(feed['timestamp']) > 0:
+    attack = pd.Series(feed['attack_type']).astype('category')
+    styles = [ATTACK_TYPES.get(t, ATTACK_TYPES['NORMAL']) for t in attack.cat.categories]
+    display_df = pd.DataFrame({
+        'Timestamp': pd.Series(feed['timestamp']).map(datetime.fromtimestamp),
+        'CAN ID': [f"0x{i:03X}" for i in feed['id']],
+        'Data': [bytes(d[:n]).hex() for d, n in zip(feed['data'], feed['dlc'])],
+        'Attack Type': attack.cat.rename_categories(
+            [f"{style['icon']} {t}" for style, t in zip(styles, attack.cat.categories)]),
+        'Status': pd.Series(feed['prediction']).map({-1: 'Anomaly', 1: 'Normal'})
+    }).iloc[::-1]
     
-    # Rename columns
-    col_mapping = {
-        'timestamp': 'Timestamp',
-        'id': 'CAN ID', 
-        'data': 'Data',
-        'attack_display': 'Attack Type',
-        'prediction': 'Status'
-    }
-    display_df = display_df.rename(columns=col_mapping)
-    
-    # Style the dataframe
-    def style_row(row):
-        attack_type = row['Attack Type'].split(' ', 1)[1] if ' ' in row['Attack Type'] else 'NORMAL'
-        color = ATTACK_TYPES.get(attack_type, ATTACK_TYPES['NORMAL'])['color']
-        return [f'background-color: {color}20'] * len(row)  # 20 for transparency
-    
-    styled_df = display_df.style.apply(style_row, axis=1)
+    # Style the whole slice at once from the per-type CSS
+    row_css = attack.map(
+        {t: ROW_STYLE.format(color=style['color']) for style, t in zip(styles, attack.cat.categories)}
+    ).astype(str).iloc[::-1]
+    css = pd.DataFrame({col: row_css.values for col in display_df.columns}, index=display_df.index)
+    styled_df = display_df.style.apply(lambda _: css, axis=None)
     st.dataframe(styled_df, width='stretch', height=400)
 else:
     st.info("No messages match the current filters.")
 
-# Attack details panel
-if len(df[df['prediction'] == 'Anomaly']) > 0:
+# Attack details panel, from the aggregated incidents
+if len(df) > 0 and (df['prediction'] == 'Anomaly').any():
     st.subheader("🔍 Attack Analysis")
     
     # Recent attacks summary
@@ -254,7 +354,7 @@ if len(df[df['prediction'] == 'Anomaly']) > 0:
     recent_attacks = recent_df[recent_df['prediction'] == 'Anomaly']
     
     if len(recent_attacks) > 0:
-        attack_summary = recent_attacks['attack_type'].value_counts()
+        attack_summary = recent_attacks.groupby('attack_type')['count'].sum().sort_values(ascending=False)
         
         cols = st.columns(len(attack_summary))
         for i, (attack_type, count) in enumerate(attack_summary.items()):
@@ -266,7 +366,55 @@ if len(df[df['prediction'] == 'Anomaly']) > 0:
                     <p><strong>{count}</strong> attacks in last 10 min</p>
                 </div>
                 """, unsafe_allow_html=True)
+    
+    # Latest incidents as logged by ids.py
+    incident_cols = {'timestamp': 'Start', 'end': 'End', 'attack_type': 'Attack Type', 'count': 'Frames',
+                     'peak_rate': 'Peak msg/s', 'ids': 'CAN IDs'}
+    incident_df = df[[col for col in incident_cols if col in df.columns]].tail(max_rows).iloc[::-1]
+    st.dataframe(incident_df.rename(columns=incident_cols), width='stretch', hide_index=True)
 
-# Auto-refresh
-time.sleep(REFRESH_INTERVAL)
-st.rerun()
\ No newline at end of file
+# Historical search over the segmented verdict history
+st.subheader("🗂️ History")
+with st.form("history_query"):
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        history_days = st.date_input("Date range", value=(datetime.now().date() - timedelta(days=7), datetime.now().date()))
+    with col2:
+        history_ids = st.text_input("CAN IDs (hex, comma separated)", placeholder="0x100, 0x101")
+    with col3:
+        history_types = st.multiselect("Attack Types", options=list(ATTACK_TYPES.keys()))
+    with col4:
+        history_status = st.selectbox("Status", ["All", "Anomaly", "Normal"])
+    if st.form_submit_button("🔍 Search History"):
+        st.session_state.history_query = (history_days, history_ids, history_types, history_status)
+
+if 'history_query' in st.session_state:
+    history_days, history_ids, history_types, history_status = st.session_state.history_query
+    try:
+        first_day, last_day = (history_days[0], history_days[-1]) if history_days else (None, None)
+        started = time.perf_counter()
+        result = history.query(
+            start=datetime.combine(first_day, datetime.min.time()).timestamp() if first_day else None,
+            end=datetime.combine(last_day + timedelta(days=1), datetime.min.time()).timestamp() if last_day else None,
+            ids=[int(i, 16) for i in history_ids.replace(',', ' ').split()] or None,
+            attack_types=history_types or None,
+            prediction={"Anomaly": -1, "Normal": 1}.get(history_status)
+        )
+        elapsed = (time.perf_counter() - started) * 1000
+        history_df = pd.DataFrame({
+            'Timestamp': pd.Series(result['timestamp']).map(datetime.fromtimestamp),
+            'CAN ID': [f"0x{i:03X}" for i in result['id']],
+            'Data': [bytes(d[:n]).hex() for d, n in zip(result['data'], result['dlc'])],
+            'Attack Type': result['attack_type'],
+            'Status': pd.Series(result['prediction']).map({-1: 'Anomaly', 1: 'Normal'})
+        })
+        st.caption(f"{len(history_df)} most recent matching frames in {elapsed:.0f} ms "
+                   f"(limit {HISTORY_QUERY_LIMIT})")
+        st.dataframe(history_df.iloc[::-1], width='stretch', height=400)
+    except ValueError as e:
+        st.error(f"Invalid history query: {e}")
+
+# Auto-refresh only when there is no push channel
+if not live_stream:
+    time.sleep(REFRESH_INTERVAL)
+    st.rerun()
\ No newline at end of file
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Historical query engine over the IDS verdict log.
+
+Verdicts are partitioned into fixed time segments stored one file per column. The
+manifest keeps each segment's min/max timestamp, IDs, attack types and anomaly count,
+and sealed segments carry a per-ID posting-list index (row numbers grouped by ID), so
+a query only opens the segments that can match and only reads the rows it returns.
+"""
+
+import os
+import json
+import time
+import argparse
+import threading
+import numpy as np
+from contextlib import contextmanager
+from datetime import datetime
+from config import *
+from alerts import VERDICT_RECORD, ATTACK_CODES, ATTACK_NAMES, tail_verdict_bytes
+
+# Same layout as alerts.VERDICT_RECORD, so raw verdict bytes load without unpacking
+VERDICT_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('id', '<u2'),
+    ('dlc', 'u1'),
+    ('anomaly', 'u1'),
+    ('code', 'u1'),
+    ('data', 'u1', (8,))
+])
+assert VERDICT_DTYPE.itemsize == VERDICT_RECORD.size
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within one process
+    fcntl = None
+
+MANIFEST_FILE = "manifest.json"
+INDEX_FILE = "index.npy"
+LOCK_FILE = "update.lock"
+
+
+class Segment:
+    """One time partition of the history, stored as one file per column"""
+
+    def __init__(self, root, meta):
+        self.meta = meta
+        self.path = os.path.join(root, str(meta['start']))
+        self._maps = {}  # sealed segments never change, so their maps are reused
+
+    @property
+    def rows(self):
+        return self.meta['rows']
+
+    @property
+    def sealed(self):
+        return self.meta.get('sealed', False)
+
+    def column(self, name):
+        """Memory-mapped column; only the rows that are indexed get read from disk"""
+        if name in self._maps:
+            return self._maps[name]
+        field = VERDICT_DTYPE.fields[name][0]
+        column = np.memmap(os.path.join(self.path, f"{name}.bin"), dtype=field.base,
+                           mode='r', shape=(self.rows,) + field.shape)
+        if self.sealed:
+            self._maps[name] = column
+        return column
+
+    def take(self, name, rows):
+        column = self.column(name)
+        return np.asarray(column if rows is None else column[rows])
+
+    def append(self, records):
+        """Append verdict records to every column and widen the segment statistics"""
+        os.makedirs(self.path, exist_ok=True)
+        for name in VERDICT_DTYPE.names:
+            path = os.path.join(self.path, f"{name}.bin")
+            # Drop anything an interrupted update wrote past the manifest
+            expected = self.rows * VERDICT_DTYPE.fields[name][0].itemsize
+            if os.path.exists(path) and os.path.getsize(path) != expected:
+                os.truncate(path, expected)
+            with open(path, 'ab') as f:
+                f.write(np.ascontiguousarray(records[name]).tobytes())
+
+        ts = records['timestamp']
+        self.meta['rows'] += len(records)
+        self.meta['min_ts'] = min(self.meta.get('min_ts', np.inf), float(ts.min()))
+        self.meta['max_ts'] = max(self.meta.get('max_ts', -np.inf), float(ts.max()))
+        self.meta['ids'] = sorted(set(self.meta.get('ids', [])) | set(np.unique(records['id']).tolist()))
+        self.meta['codes'] = sorted(set(self.meta.get('codes', [])) | set(np.unique(records['code']).tolist()))
+        self.meta['anomalies'] = self.meta.get('anomalies', 0) + int(records['anomaly'].sum())
+
+    def seal(self):
+        """Build the per-ID posting lists; the segment is not appended to afterwards
+
+        The index is the row numbers ordered by ID (stable, so each ID's rows stay
+        sorted) plus where each ID's run starts, one entry per row whatever the
+        number of distinct IDs.
+        """
+        ids = self.take('id', None)
+        order = np.argsort(ids, kind='stable').astype(np.min_scalar_type(max(len(ids) - 1, 0)))
+        np.save(os.path.join(self.path, INDEX_FILE), order)
+        self.meta['postings'] = np.searchsorted(ids[order], self.meta['ids'] + [np.inf]).tolist()
+        self.meta['sealed'] = True
+
+    def rows_for_ids(self, ids):
+        """Sorted row numbers carrying any of the IDs"""
+        if not self.sealed or 'postings' not in self.meta:
+            # Open segments, and segments sealed before the posting-list index, are scanned
+            return np.flatnonzero(np.isin(self.take('id', None), ids))
+        if INDEX_FILE not in self._maps:
+            self._maps[INDEX_FILE] = np.load(os.path.join(self.path, INDEX_FILE), mmap_mode='r')
+        order = self._maps[INDEX_FILE]
+        postings = self.meta['postings']
+        positions = [self.meta['ids'].index(msg_id) for msg_id in ids if msg_id in self.meta['ids']]
+        rows = [order[postings[p]:postings[p + 1]] for p in positions]
+        return np.sort(np.concatenate(rows)) if rows else np.empty(0, dtype=np.int64)
+
+    def could_match(self, start, end, ids, codes, anomaly):
+        """Decide from the manifest alone whether any row can satisfy the query"""
+        meta = self.meta
+        if not meta['rows']:
+            return False
+        if start is not None and meta['max_ts'] < start:
+            return False
+        if end is not None and meta['min_ts'] >= end:
+            return False
+        if ids is not None and not set(ids) & set(meta['ids']):
+            return False
+        if codes is not None and not set(codes) & set(meta['codes']):
+            return False
+        if anomaly == 1 and not meta['anomalies']:
+            return False
+        if anomaly == 0 and meta['anomalies'] == meta['rows']:
+            return False
+        return True
+
+
+class HistoryStore:
+    """Time-partitioned columnar history of every IDS verdict
+
+    It is fed by the stream server, or by the dashboard when the stream server is not
+    running. Writers take a file lock, so an overlap of the two (or of several dashboard
+    sessions sharing one store) cannot append the same verdicts twice.
+    """
+
+    def __init__(self, root=HISTORY_DIR, verdict_file=VERDICT_LOG_FILE,
+                 segment_seconds=HISTORY_SEGMENT_SECONDS):
+        self.root = root
+        self.verdict_file = verdict_file
+        self.segment_seconds = segment_seconds
+        self.manifest_path = os.path.join(root, MANIFEST_FILE)
+        self.manifest_mtime = None
+        self.segments = []
+        self.lock = threading.RLock()
+        os.makedirs(root, exist_ok=True)
+        self.refresh()
+
+    def refresh(self):
+        """Reload the manifest if another process has updated it"""
+        try:
+            mtime = os.path.getmtime(self.manifest_path)
+        except OSError:
+            self.manifest = {'offset': 0, 'segments': []}
+            self.segments = []
+            return
+        if mtime == self.manifest_mtime:
+            return
+        with open(self.manifest_path) as f:
+            self.manifest = json.load(f)
+        self.manifest_mtime = mtime
+        sealed = {seg.meta['start']: seg for seg in self.segments if seg.sealed}
+        self.segments = [
+            sealed[meta['start']] if meta.get('sealed') and meta['start'] in sealed else Segment(self.root, meta)
+            for meta in self.manifest['segments']
+        ]
+
+    def _save_manifest(self):
+        self.manifest['segments'] = [seg.meta for seg in self.segments]
+        tmp = self.manifest_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp, self.manifest_path)
+        self.manifest_mtime = os.path.getmtime(self.manifest_path)
+
+    @contextmanager
+    def _writing(self):
+        """Hold the store against other threads and, where flock exists, other processes"""
+        with self.lock, open(os.path.join(self.root, LOCK_FILE), 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)  # released when the file is closed
+            yield
+
+    def update(self):
+        """Append verdicts logged since the last update and seal finished segments"""
+        with self._writing():
+            return self._update()
+
+    def _update(self):
+        # Another writer may have moved the offset while this one waited for the lock
+        self.refresh()
+        appended = 0
+        while True:
+            chunk, offset = tail_verdict_bytes(self.verdict_file, self.manifest['offset'])
+            self.manifest['offset'] = offset
+            if not chunk:
+                break
+            records = np.frombuffer(chunk, dtype=VERDICT_DTYPE)
+            self._append(records)
+            appended += len(records)
+            self._save_manifest()
+        return appended
+
+    def _append(self, records):
+        open_segments = {seg.meta['start']: seg for seg in self.segments if not seg.sealed}
+        latest_open = max(open_segments, default=None)
+        starts = (records['timestamp'] // self.segment_seconds).astype(np.int64) * self.segment_seconds
+        if latest_open is not None:
+            # Late frames for an already sealed period go to the open segment; its
+            # min/max timestamps still describe it exactly
+            starts = np.maximum(starts, latest_open)
+        for start in np.unique(starts).tolist():
+            segment = open_segments.get(start)
+            if segment is None:
+                segment = Segment(self.root, {'start': start, 'rows': 0, 'sealed': False})
+                self.segments.append(segment)
+                open_segments[start] = segment
+            segment.append(records[starts == start])
+
+        newest = max(open_segments)
+        for start, segment in open_segments.items():
+            if start < newest:
+                segment.seal()
+
+    def query(self, start=None, end=None, ids=None, attack_types=None, prediction=None,
+              limit=HISTORY_QUERY_LIMIT):
+        """Most recent verdicts matching every given filter, oldest first
+
+        start, end: epoch seconds (start inclusive, end exclusive)
+        ids: CAN IDs; attack_types: attack type names; prediction: -1 (anomaly) or 1 (normal)
+        Returns columns {'timestamp', 'id', 'dlc', 'data', 'prediction', 'attack_type'}.
+        """
+        with self.lock:
+            return self._query(start, end, ids, attack_types, prediction, limit)
+
+    def _query(self, start, end, ids, attack_types, prediction, limit):
+        self.refresh()
+        codes = None if attack_types is None else [ATTACK_CODES[t] for t in attack_types if t in ATTACK_CODES]
+        anomaly = None if prediction is None else int(prediction == -1)
+        ids = None if ids is None else [int(i) for i in ids]
+
+        parts = []
+        remaining = limit
+        for segment in sorted(self.segments, key=lambda seg: seg.meta['max_ts'], reverse=True):
+            if remaining is not None and remaining <= 0:
+                break
+            if not segment.could_match(start, end, ids, codes, anomaly):
+                continue
+            rows = self._match(segment, start, end, ids, codes, anomaly)
+            if remaining is not None:
+                rows = rows[-remaining:]
+                remaining -= len(rows)
+            if len(rows):
+                part = np.empty(len(rows), dtype=VERDICT_DTYPE)
+                for name in VERDICT_DTYPE.names:
+                    part[name] = segment.column(name)[rows]
+                parts.append(part)
+
+        records = np.concatenate(parts) if parts else np.empty(0, dtype=VERDICT_DTYPE)
+        records = records[np.argsort(records['timestamp'], kind='stable')]
+        if limit is not None:
+            records = records[-limit:]
+        return {
+            'timestamp': records['timestamp'],
+            'id': records['id'],
+            'dlc': records['dlc'],
+            'data': records['data'],
+            'prediction': np.where(records['anomaly'] == 1, -1, 1),
+            'attack_type': np.array(ATTACK_NAMES + ['NORMAL'], dtype=object)[
+                np.minimum(records['code'], len(ATTACK_NAMES))]
+        }
+
+    def _match(self, segment, start, end, ids, codes, anomaly):
+        """Row numbers of one segment satisfying the filters, narrowing column by column"""
+        rows = None if ids is None else segment.rows_for_ids(ids)
+
+        def narrow(rows, mask):
+            return np.flatnonzero(mask) if rows is None else rows[mask]
+
+        meta = segment.meta
+        if (start is not None and meta['min_ts'] < start) or (end is not None and meta['max_ts'] >= end):
+            ts = segment.take('timestamp', rows)
+            mask = np.ones(len(ts), dtype=bool)
+            if start is not None:
+                mask &= ts >= start
+            if end is not None:
+                mask &= ts < end
+            rows = narrow(rows, mask)
+        if codes is not None:
+            rows = narrow(rows, np.isin(segment.take('code', rows), codes))
+        if anomaly is not None:
+            rows = narrow(rows, segment.take('anomaly', rows) == anomaly)
+        return np.arange(segment.rows) if rows is None else rows
+
+    def rebuild(self):
+        """Drop every segment and re-read the verdict log from the start"""
+        with self._writing():
+            self.refresh()
+            for segment in self.segments:
+                for name in os.listdir(segment.path) if os.path.isdir(segment.path) else []:
+                    os.remove(os.path.join(segment.path, name))
+                if os.path.isdir(segment.path):
+                    os.rmdir(segment.path)
+            self.segments = []
+            self.manifest = {'offset': 0, 'segments': []}
+            self._save_manifest()
+            return self._update()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain and query the IDS verdict history')
+    parser.add_argument('--rebuild', action='store_true', help='Drop all segments and re-read the verdict log')
+    parser.add_argument('--since', type=float, help='Query: hours back from now')
+    parser.add_argument('--id', action='append', help='Query: CAN ID (hex), repeatable')
+    parser.add_argument('--attack', action='append', help='Query: attack type, repeatable')
+    parser.add_argument('--anomalies', action='store_true', help='Query: anomalies only')
+    parser.add_argument('--limit', type=int, default=20, help='Query: rows to print [20]')
+    args = parser.parse_args()
+
+    store = HistoryStore()
+    start = time.perf_counter()
+    appended = store.rebuild() if args.rebuild else store.update()
+    print(f"✅ Appended {appended} verdicts to {HISTORY_DIR} in {time.perf_counter() - start:.2f}s "
+          f"({len(store.segments)} segments)")
+
+    if args.since or args.id or args.attack or args.anomalies:
+        start = time.perf_counter()
+        result = store.query(
+            start=time.time() - args.since * 3600 if args.since else None,
+            ids=[int(i, 16) for i in args.id] if args.id else None,
+            attack_types=args.attack,
+            prediction=-1 if args.anomalies else None,
+            limit=args.limit
+        )
+        elapsed = (time.perf_counter() - start) * 1000
+        for ts, msg_id, dlc, data, attack_type in zip(result['timestamp'], result['id'], result['dlc'],
+                                                      result['data'], result['attack_type']):
+            print(f"{datetime.fromtimestamp(ts).isoformat()}  0x{msg_id:03X}  "
+                  f"{bytes(data[:dlc]).hex():<16}  {attack_type}")
+        print(f"🔍 {len(result['timestamp'])} rows in {elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,41 @@
 import can
-import pandas as pd
-import joblib
 import csv
+import os
 import time
 import numpy as np
-from datetime import datetime
 from collections import defaultdict
 from config import *
+from alerts import IncidentAggregator, VerdictSink
+from metrics import MetricsRegistry, start_metrics_server
+from signals import SignalDecoder
+from timing import TimingDetector
+from rules import TieredEvaluator
+
+INCIDENT_COLUMNS = ['timestamp', 'id', 'data', 'prediction', 'attack_type', 'confidence',
+                    'end', 'count', 'peak_rate', 'ids', 'samples']
 
 class AdvancedIDS:
     def __init__(self):
         self.model = None
         self.bus = None
+        self.decoder = SignalDecoder()
         self.load_model()
         self.setup_bus()
         self.message_patterns = {}
-        self.attack_signatures = self._init_attack_signatures()
         self.message_history = defaultdict(list)
-        self.last_timestamps = {}
+        self.timing = self._load_timing_profiles()
+        self.evaluator = TieredEvaluator(self.decoder, self.timing)
         self.window_size = 5.0
+        self.verdict_sink = VerdictSink(VERDICT_LOG_FILE)
+        self.incidents = IncidentAggregator()
+        self.recent_messages = []  # Keep last 100 messages for pattern analysis
+        self.message_window = 100
+        self.metrics = MetricsRegistry()
+        self._init_metrics()
         
     def load_model(self):
         """Load the trained IDS model"""
+        import joblib
         try:
             self.model = joblib.load(MODEL_FILE)
             print("✅ IDS model loaded successfully.")
@@ -29,6 +43,15 @@ class AdvancedIDS:
             print(f"❌ ERROR loading model: {e}")
             raise
     
+    def _load_timing_profiles(self):
+        """Load learned per-ID timing profiles (timing checks are skipped without them)"""
+        if not os.path.exists(TIMING_PROFILE_FILE):
+            print(f"⚠️ No timing profiles ({TIMING_PROFILE_FILE}); run `python timing.py` on normal traffic")
+            return TimingDetector()
+        detector = TimingDetector.load(TIMING_PROFILE_FILE)
+        print(f"⏱️ Loaded timing profiles for {len(detector.profiles)} IDs")
+        return detector
+    
     def setup_bus(self):
         """Setup CAN bus connection"""
         try:
@@ -38,30 +61,31 @@ class AdvancedIDS:
             print(f"❌ ERROR connecting to CAN bus: {e}")
             raise
     
-    def _init_attack_signatures(self):
-        """Initialize attack detection signatures"""
-        return {
-            'DOS': {
-                'high_frequency': lambda msgs: len(msgs) > 50,  # >50 msgs in window
-                'repeated_id': lambda msgs: self._check_repeated_ids(msgs, threshold=20)
-            },
-            'FUZZING': {
-                'random_ids': lambda msgs: self._check_random_ids(msgs),
-                'invalid_data': lambda msgs: self._check_invalid_data(msgs)
-            },
-            'REPLAY': {
-                'exact_duplicates': lambda msgs: self._check_exact_duplicates(msgs),
-                'burst_pattern': lambda msgs: self._check_burst_pattern(msgs)
-            },
-            'SPOOFING': {
-                'unrealistic_values': lambda msgs: self._check_unrealistic_values(msgs),
-                'value_jumps': lambda msgs: self._check_value_jumps(msgs)
-            },
-            'FLOODING': {
-                'high_rate': lambda msgs: len(msgs) > 30,  # >30 msgs in window
-                'multiple_ids': lambda msgs: len(set(m['id'] for m in msgs)) > 5
-            }
-        }
+    def _init_metrics(self):
+        """Register hot-path counters, latency histograms and queue gauges"""
+        m = self.metrics
+        self.m_stage = m.histogram('ids_stage_seconds', 'Time spent per monitoring stage', label='stage')
+        self.m_frames = m.counter('ids_frames_total', 'Frames processed by verdict', label='attack_type')
+        self.m_idle = m.counter('ids_recv_timeouts_total', 'Receive calls that timed out without traffic')
+        self.m_errors = m.counter('ids_errors_total', 'Frames dropped by processing errors', label='stage')
+        self.m_incidents = m.counter('ids_incidents_total', 'Incidents emitted', label='attack_type')
+        m.gauge('ids_recent_messages', 'Frames held in the pattern-analysis window',
+                fn=lambda: len(self.recent_messages))
+        m.gauge('ids_incidents_open', 'Incidents currently being aggregated',
+                fn=lambda: len(self.incidents.open))
+        m.gauge('ids_incidents_pending', 'Closed incidents waiting for an emit slot',
+                fn=lambda: len(self.incidents.pending))
+        m.counter('ids_incidents_dropped_total', 'Incidents dropped because the backlog was full',
+                  fn=lambda: self.incidents.dropped)
+        m.gauge('ids_tier_resolved_fraction', 'Fraction of frames resolved by each evaluation tier',
+                label='tier', fn=lambda: {'rules': self.evaluator.stats()['tier1_fraction'],
+                                          'model': self.evaluator.stats()['tier2_fraction']})
+        m.counter('ids_rule_hits_total', 'Frames decided by each prefilter rule', label='rule',
+                  fn=lambda: dict(self.evaluator.rule_hits))
+        m.counter('ids_model_cpu_saved_seconds_total', 'Estimated model CPU time saved by the rule tier',
+                  fn=lambda: self.evaluator.stats()['cpu_saved_seconds'])
+        m.counter('ids_verdicts_written_total', 'Verdict records written to the binary sink',
+                  fn=lambda: self.verdict_sink.records_written)
     
     def extract_features(self, msg):
         """Extract 9 features compatible with simple model"""
@@ -69,7 +93,7 @@ class AdvancedIDS:
         data_bytes = (data_bytes + [0]*8)[:8]
         return [msg.arbitration_id] + data_bytes
     
-    def detect_attack_type(self, msg, recent_messages):
+    def detect_attack_type(self, msg, recent_messages, decoded=None, timing_anomaly=False):
         """Detect specific attack type based on message characteristics"""
         if len(recent_messages) < 2:
             return "NORMAL"
@@ -85,23 +109,23 @@ class AdvancedIDS:
             return "FUZZING"
         
         # SPOOFING: Unrealistic values
-        if msg_id == CAN_IDS['SPEED'] and len(data) > 0 and data[0] > 200:
+        if decoded is None:
+            decoded = self._decode_message(msg)
+        if self.decoder.is_unrealistic(msg_id, decoded):
             return "SPOOFING"
-        if msg_id == CAN_IDS['RPM'] and len(data) >= 2:
-            rpm = int.from_bytes(data[:2], byteorder='big')
-            if rpm > 8000:
-                return "SPOOFING"
-        if msg_id == CAN_IDS['ENGINE_TEMP'] and len(data) > 0 and data[0] > 120:
-            return "SPOOFING"
-        
-        # DOS/FLOODING: High frequency patterns
-        recent_count = len([m for m in recent_messages[-20:] if m['id'] == msg_id])
-        if recent_count > 5:  # More sensitive threshold
-            return "FLOODING"
         
-        # Check overall message rate
-        if len(recent_messages) >= 15:  # High overall rate
-            return "FLOODING"
+        # DOS/FLOODING: learned periodicity when available, crude counts otherwise
+        if self.timing.has_profile(msg_id):
+            if timing_anomaly:
+                return "FLOODING"
+        else:
+            recent_count = len([m for m in recent_messages[-20:] if m['id'] == msg_id])
+            if recent_count > 5:  # More sensitive threshold
+                return "FLOODING"
+            
+            # Check overall message rate
+            if len(recent_messages) >= 15:  # High overall rate
+                return "FLOODING"
         
         # REPLAY: Check for exact duplicates
         msg_signature = (msg_id, tuple(data))
@@ -112,116 +136,9 @@ class AdvancedIDS:
         
         return "DOS"  # Default for other anomalies
     
-    def _check_repeated_ids(self, msgs, threshold):
-        """Check for repeated message IDs (DoS indicator)"""
-        id_counts = {}
-        for msg in msgs:
-            id_counts[msg['id']] = id_counts.get(msg['id'], 0) + 1
-        return any(count > threshold for count in id_counts.values())
-    
-    def _check_random_ids(self, msgs):
-        """Check for random/unusual CAN IDs (Fuzzing indicator)"""
-        known_ids = set(CAN_IDS.values())
-        unknown_ids = [msg['id'] for msg in msgs if msg['id'] not in known_ids]
-        return len(unknown_ids) > len(msgs) * 0.3  # >30% unknown IDs
-    
-    def _check_invalid_data(self, msgs):
-        """Check for invalid/malformed data (Fuzzing indicator)"""
-        invalid_count = 0
-        for msg in msgs:
-            # Check for all 0xFF (common fuzzing pattern)
-            if all(b == 0xFF for b in msg['data']):
-                invalid_count += 1
-            # Check for data length anomalies
-            elif len(msg['data']) not in [1, 2, 4, 8]:  # Common CAN data lengths
-                invalid_count += 1
-        return invalid_count > len(msgs) * 0.2  # >20% invalid
-    
-    def _check_exact_duplicates(self, msgs):
-        """Check for exact message duplicates (Replay indicator)"""
-        seen = set()
-        duplicates = 0
-        for msg in msgs:
-            msg_signature = (msg['id'], tuple(msg['data']))
-            if msg_signature in seen:
-                duplicates += 1
-            seen.add(msg_signature)
-        return duplicates > len(msgs) * 0.4  # >40% duplicates
-    
-    def _check_burst_pattern(self, msgs):
-        """Check for burst patterns (Replay indicator)"""
-        if len(msgs) < 10:
-            return False
-        
-        # Check for repeated sequences
-        for i in range(len(msgs) - 5):
-            sequence = msgs[i:i+3]
-            for j in range(i+3, len(msgs) - 2):
-                if msgs[j:j+3] == sequence:
-                    return True
-        return False
-    
-    def _check_unrealistic_values(self, msgs):
-        """Check for unrealistic sensor values (Spoofing indicator)"""
-        unrealistic_count = 0
-        for msg in msgs:
-            if msg['id'] == CAN_IDS['SPEED'] and len(msg['data']) > 0:
-                if msg['data'][0] > 200:  # >200 km/h
-                    unrealistic_count += 1
-            elif msg['id'] == CAN_IDS['RPM'] and len(msg['data']) >= 2:
-                rpm = int.from_bytes(msg['data'][:2], byteorder='big')
-                if rpm > 8000:  # >8000 RPM
-                    unrealistic_count += 1
-            elif msg['id'] == CAN_IDS['ENGINE_TEMP'] and len(msg['data']) > 0:
-                if msg['data'][0] > 120:  # >120°C
-                    unrealistic_count += 1
-        
-        return unrealistic_count > len(msgs) * 0.3  # >30% unrealistic
-    
-    def _check_value_jumps(self, msgs):
-        """Check for sudden value jumps (Spoofing indicator)"""
-        # Group by message ID
-        id_groups = {}
-        for msg in msgs:
-            if msg['id'] not in id_groups:
-                id_groups[msg['id']] = []
-            id_groups[msg['id']].append(msg)
-        
-        # Check for jumps in each group
-        for msg_id, group in id_groups.items():
-            if len(group) < 3:
-                continue
-            
-            if msg_id == CAN_IDS['SPEED']:
-                values = [msg['data'][0] if msg['data'] else 0 for msg in group]
-                for i in range(1, len(values)):
-                    if abs(values[i] - values[i-1]) > 50:  # >50 km/h jump
-                        return True
-        
-        return False
-    
     def _decode_message(self, msg):
         """Decode CAN message to semantic values"""
-        decoded = {}
-        data = list(msg.data) if msg.data else []
-        
-        if msg.arbitration_id == CAN_IDS['SPEED'] and len(data) >= 1:
-            decoded['speed'] = data[0]
-        elif msg.arbitration_id == CAN_IDS['RPM'] and len(data) >= 2:
-            decoded['rpm'] = int.from_bytes(data[:2], byteorder='big')
-        elif msg.arbitration_id == CAN_IDS['ENGINE_TEMP'] and len(data) >= 1:
-            decoded['engine_temp'] = data[0]
-        
-        return decoded
-    
-    def _calc_interarrival(self, msg_id, now):
-        """Calculate interarrival time"""
-        if msg_id in self.last_timestamps:
-            interarrival = (now - self.last_timestamps[msg_id]) * 1000
-        else:
-            interarrival = 0
-        self.last_timestamps[msg_id] = now
-        return interarrival
+        return self.decoder.decode_frame(msg.arbitration_id, msg.data or b'')
     
     def _calc_rate_features(self, msg_id, now):
         """Calculate message rate features"""
@@ -264,90 +181,185 @@ class AdvancedIDS:
         
         return stats
     
-    def log_detection(self, msg, prediction, attack_type, confidence=None):
-        """Log detection results with consistent format"""
+    def log_detection(self, msg, prediction, attack_type, now=None):
+        """Record the raw per-frame verdict in the binary verdict sink"""
         try:
-            file_exists = False
-            try:
-                with open(LOG_FILE, 'r'):
-                    file_exists = True
-            except FileNotFoundError:
-                pass
-            
+            self.verdict_sink.write(now or time.time(), msg.arbitration_id, msg.data,
+                                    prediction, attack_type)
+        except Exception as e:
+            self.m_errors.inc(label_value='verdict_log')
+            print(f"⚠️ Logging error: {e}")
+    
+    def log_incident(self, incident):
+        """Append an aggregated incident to the CSV log and report it"""
+        self.m_incidents.inc(label_value=incident.attack_type)
+        icon = ATTACK_TYPES.get(incident.attack_type, {}).get('icon', '🚨')
+        print(f"{icon} ALERT! {incident.summary()}")
+        try:
+            file_exists = self._check_log_header()
             with open(LOG_FILE, 'a', newline='') as f:
-                writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+                writer = csv.DictWriter(f, fieldnames=INCIDENT_COLUMNS, quoting=csv.QUOTE_ALL)
                 if not file_exists:
-                    headers = ['timestamp', 'id', 'data', 'prediction', 'attack_type', 'confidence']
-                    writer.writerow(headers)
-                
-                now = time.time()
-                
-                writer.writerow([
-                    datetime.fromtimestamp(now).isoformat(),
-                    f"0x{msg.arbitration_id:03X}",
-                    msg.data.hex() if msg.data else "",
-                    "Anomaly" if prediction == -1 else "Normal",
-                    attack_type,
-                    confidence or "N/A"
-                ])
+                    writer.writeheader()
+                writer.writerow(incident.to_row())
         except Exception as e:
             print(f"⚠️ Logging error: {e}")
     
+    @staticmethod
+    def _check_log_header():
+        """Whether LOG_FILE exists with the incident header; a log with any other
+        header (e.g. the per-frame columns) is moved to LOG_FILE.bak"""
+        try:
+            with open(LOG_FILE, newline='') as f:
+                header = next(csv.reader(f), None)
+        except FileNotFoundError:
+            return False
+        if header == INCIDENT_COLUMNS:
+            return True
+        os.replace(LOG_FILE, LOG_FILE + '.bak')
+        print(f"⚠️ {LOG_FILE} had a different header; moved it to {LOG_FILE}.bak")
+        return False
+    
+    def _recv_batch(self):
+        """Block for one frame, then drain whatever else is already queued on the bus"""
+        msg = self.bus.recv(timeout=RECV_TIMEOUT)
+        if msg is None:
+            return []
+        batch = [msg]
+        while len(batch) < IDS_BATCH_SIZE:
+            msg = self.bus.recv(timeout=0)
+            if msg is None:
+                break
+            batch.append(msg)
+        return batch
+    
+    def process_batch(self, msgs, now):
+        """Evaluate a batch of frames: rule tier first, ML model only for undecided frames"""
+        stage = self.m_stage
+        clock = time.perf_counter
+        t1 = clock()
+        
+        frames = [{
+            'timestamp': msg.timestamp or now,
+            'id': msg.arbitration_id,
+            'data': list(msg.data)
+        } for msg in msgs]
+        
+        # Decode once for the whole batch; every tier reuses these columns
+        batch = self.decoder.decode_messages(frames)
+        
+        # Periodicity check: O(1) per frame against the learned profile
+        timing_flags = np.fromiter(
+            (self.timing.observe(f['id'], f['timestamp']) for f in frames),
+            dtype=bool, count=len(frames)
+        )
+        t2 = clock()
+        stage.observe(t2 - t1, 'feature_extraction')
+        
+        # Tier 1: cheap vectorized rules
+        if PREFILTER_ENABLED:
+            verdicts, decided = self.evaluator.evaluate(batch, timing_flags)
+        else:
+            verdicts = np.full(len(frames), None, dtype=object)
+            decided = np.zeros(len(frames), dtype=bool)
+        t3 = clock()
+        stage.observe(t3 - t2, 'prefilter')
+        
+        # Tier 2: one model call over the frames the rules could not decide
+        predictions = np.where(decided & (verdicts != 'NORMAL'), -1, 1)
+        undecided = np.flatnonzero(~decided)
+        if len(undecided):
+            X = np.column_stack((batch.ids[undecided], batch.payload[undecided]))
+            try:
+                predictions[undecided] = self.model.predict(X)  # -1 = anomaly, 1 = normal
+            except Exception as e:
+                self.m_errors.inc(len(undecided), label_value='predict')
+                print(f"⚠️ Prediction error: {e}")
+                verdicts[undecided] = 'NORMAL'
+                undecided = undecided[:0]
+        t4 = clock()
+        stage.observe(t4 - t3, 'model_predict')
+        if len(undecided):
+            self.evaluator.record_model(len(undecided), t4 - t3)
+        
+        # Pattern-based attack type detection for model-flagged frames, each against the
+        # window as it was when that frame arrived (the frame itself is its newest entry)
+        window = self.recent_messages + frames
+        base = len(self.recent_messages)
+        for i in undecided:
+            if predictions[i] == -1:
+                end = base + i + 1
+                verdicts[i] = self.detect_attack_type(msgs[i], window[max(0, end - self.message_window):end],
+                                                      batch.row(i), bool(timing_flags[i]))
+            else:
+                verdicts[i] = "NORMAL"
+        self.recent_messages = window[-self.message_window:]
+        t5 = clock()
+        stage.observe(t5 - t4, 'pattern_detection')
+        
+        for msg, frame, prediction, attack_type in zip(msgs, frames, predictions, verdicts):
+            # Raw verdicts go to the binary sink only
+            self.log_detection(msg, prediction, attack_type, frame['timestamp'])
+            
+            # Anomalies are collapsed into rate-limited incidents
+            if prediction == -1:
+                ready = self.incidents.observe(frame['timestamp'], frame['id'], msg.data, attack_type)
+            else:
+                ready = self.incidents.poll(frame['timestamp'])
+            for incident in ready:
+                self.log_incident(incident)
+            self.m_frames.inc(label_value=attack_type)
+        stage.observe(clock() - t5, 'logging')
+    
     def monitor(self):
         """Main monitoring loop"""
         print("🔍 Advanced IDS monitoring CAN traffic... Press Ctrl+C to stop.")
         
-        recent_messages = []  # Keep last 100 messages for pattern analysis
-        message_window = 100
+        clock = time.perf_counter
+        
+        if METRICS_ENABLED:
+            try:
+                start_metrics_server(self.metrics)
+            except OSError as e:
+                print(f"⚠️ Metrics endpoint unavailable: {e}")
         
         try:
             while True:
-                msg = self.bus.recv(timeout=RECV_TIMEOUT)
-                if msg:
-                    # Add to recent messages
-                    msg_data = {
-                        'timestamp': time.time(),
-                        'id': msg.arbitration_id,
-                        'data': list(msg.data)
-                    }
-                    recent_messages.append(msg_data)
-                    
-                    # Keep only recent messages
-                    if len(recent_messages) > message_window:
-                        recent_messages.pop(0)
-                    
-                    # ML-based anomaly detection
-                    features = self.extract_features(msg)
-                    X = pd.DataFrame([features])
-                    
-                    try:
-                        prediction = self.model.predict(X)[0]  # -1 = anomaly, 1 = normal
-                        
-                        # Pattern-based attack type detection
-                        attack_type = "NORMAL"
-                        if prediction == -1:
-                            attack_type = self.detect_attack_type(msg, recent_messages)
-                        
-                        # Log the detection
-                        self.log_detection(msg, prediction, attack_type)
-                        
-                        # Print results
-                        if prediction == -1:
-                            icon = ATTACK_TYPES.get(attack_type, {}).get('icon', '🚨')
-                            print(f"{icon} ALERT! {attack_type} detected: ID=0x{msg.arbitration_id:03X}, Data={list(msg.data)}")
-                        else:
-                            print(f"✅ Normal: ID=0x{msg.arbitration_id:03X}, Data={list(msg.data)}")
-                            
-                    except Exception as e:
-                        print(f"⚠️ Prediction error: {e}")
-                        
+                t0 = clock()
+                msgs = self._recv_batch()
+                self.m_stage.observe(clock() - t0, 'recv_wait')
+                now = time.time()
+                if msgs:
+                    self.process_batch(msgs, now)
                 else:
+                    self.m_idle.inc()
+                    for incident in self.incidents.poll(now):
+                        self.log_incident(incident)
                     print("⏳ No CAN traffic detected...")
                     
         except KeyboardInterrupt:
             print("\n🛑 IDS monitoring stopped")
         except Exception as e:
             print(f"❌ IDS error: {e}")
+        finally:
+            for incident in self.incidents.flush():
+                self.log_incident(incident)
+            if self.incidents.dropped:
+                print(f"⚠️ {self.incidents.dropped} incidents dropped by the alert backlog")
+            self.verdict_sink.close()
+            self.print_tier_stats()
+    
+    def print_tier_stats(self):
+        """Report how much work the rule tier took off the model"""
+        stats = self.evaluator.stats()
+        if not stats['frames']:
+            return
+        print(f"📊 Rules resolved {stats['tier1_fraction']:.1%} of {stats['frames']} frames, "
+              f"model {stats['tier2_fraction']:.1%}; "
+              f"~{stats['cpu_saved_seconds']:.2f}s model CPU saved")
+        for name, hits in stats['rule_hits'].items():
+            if hits:
+                print(f"   {name}: {hits}")
 
 def main():
     try:
@@ -0,0 +1,144 @@
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import *
+
+# Latency buckets in seconds, tuned for per-frame work (10 µs .. 1 s)
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+                   0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _format_labels(label_name, label_value, extra=None):
+    pairs = []
+    if label_name is not None and label_value is not None:
+        pairs.append(f'{label_name}="{label_value}"')
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Sampled:
+    """Values set in place or sampled from a callback at scrape time, optionally split by one label"""
+
+    def __init__(self, name, help_text, label=None, fn=None):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.fn = fn
+        self.values = {}
+
+    def render(self):
+        if self.fn is not None:
+            sampled = self.fn()
+            values = sampled if isinstance(sampled, dict) else {None: sampled}
+        else:
+            values = self.values
+        for label_value, value in list(values.items()):
+            yield f"{self.name}{_format_labels(self.label, label_value)} {value}"
+
+
+class Counter(_Sampled):
+    """Monotonic counter; a callback can export a total another object already keeps"""
+    kind = 'counter'
+
+    def inc(self, amount=1, label_value=None):
+        # Plain dict update: the GIL keeps this safe enough for a scrape-only reader
+        self.values[label_value] = self.values.get(label_value, 0) + amount
+
+
+class Gauge(_Sampled):
+    """Point-in-time value, either set explicitly or sampled from a callback at scrape time"""
+    kind = 'gauge'
+
+    def set(self, value, label_value=None):
+        self.values[label_value] = value
+
+
+class Histogram:
+    """Fixed-bucket histogram, optionally split by one label"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label=None, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self.series = {}
+
+    def observe(self, value, label_value=None):
+        series = self.series.get(label_value)
+        if series is None:
+            # bucket counts (+Inf last), sum, count
+            series = self.series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        for label_value, (counts, total, count) in list(self.series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                labels = _format_labels(self.label, label_value, f'le="{le}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.label, label_value)
+            yield f"{self.name}_sum{labels} {total}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, label=None, fn=None):
+        return self.register(Counter(name, help_text, label, fn))
+
+    def gauge(self, name, help_text, label=None, fn=None):
+        return self.register(Gauge(name, help_text, label, fn))
+
+    def histogram(self, name, help_text, label=None, buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, label, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f"# error rendering {metric.name}: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+def start_metrics_server(registry, host=METRICS_HOST, port=METRICS_PORT):
+    """Serve the registry on http://host:port/metrics from a daemon thread"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    print(f"📈 Metrics available at http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Pre-aggregated time-bucket store for dashboard charts.
+
+Per-second, per-minute and per-hour counts by attack type and CAN ID are folded in
+incrementally from the binary verdict log and persisted in SQLite, so any chart range
+renders from a few hundred buckets instead of raw rows.
+"""
+
+import time
+import sqlite3
+import threading
+import argparse
+from config import *
+from alerts import tail_verdicts
+
+RESOLUTIONS = sorted(ROLLUP_RETENTION)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    resolution INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    attack_type TEXT NOT NULL,
+    can_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (resolution, bucket, attack_type, can_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class RollupStore:
+    """Incrementally maintained multi-resolution counts"""
+
+    def __init__(self, db_file=ROLLUP_DB_FILE, verdict_file=VERDICT_LOG_FILE):
+        self.verdict_file = verdict_file
+        # Streamlit shares one store (and connection) between the threads of every dashboard session
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_file, timeout=10, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+
+    def update(self):
+        """Fold verdicts appended since the last update into every resolution
+
+        The read offset is stored in the same transaction as the counts, so concurrent
+        writers (stream server and dashboard) never count a record twice.
+        """
+        with self.lock:
+            return self._update()
+
+    def _update(self):
+        folded = 0
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.db.execute("SELECT value FROM meta WHERE key = 'verdict_offset'").fetchone()
+            offset = row[0] if row else 0
+            while True:
+                # tail_verdicts restarts from 0 by itself if the file was replaced
+                verdicts, new_offset = tail_verdicts(self.verdict_file, offset)
+                if not verdicts:
+                    offset = new_offset
+                    break
+                self._fold(verdicts)
+                folded += len(verdicts)
+                offset = new_offset
+            self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('verdict_offset', ?)", (offset,))
+            if folded:
+                self._prune(time.time())
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+        return folded
+
+    def _fold(self, verdicts):
+        counts = {}
+        for ts, msg_id, data, prediction, attack_type in verdicts:
+            second = int(ts)
+            for resolution in RESOLUTIONS:
+                key = (resolution, second - second % resolution, attack_type, msg_id)
+                counts[key] = counts.get(key, 0) + 1
+        self.db.executemany(
+            "INSERT INTO rollups (resolution, bucket, attack_type, can_id, count) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (resolution, bucket, attack_type, can_id) DO UPDATE SET count = count + excluded.count",
+            [key + (count,) for key, count in counts.items()]
+        )
+
+    def _prune(self, now):
+        for resolution, retention in ROLLUP_RETENTION.items():
+            self.db.execute("DELETE FROM rollups WHERE resolution = ? AND bucket < ?",
+                            (resolution, int(now - retention)))
+
+    def resolution_for(self, start, end):
+        """Finest resolution that covers the range within ROLLUP_MAX_BUCKETS"""
+        now = time.time()
+        for resolution in RESOLUTIONS:
+            if (end - start) / resolution <= ROLLUP_MAX_BUCKETS and now - ROLLUP_RETENTION[resolution] <= start:
+                return resolution
+        return RESOLUTIONS[-1]
+
+    def timeline(self, start, end, by='attack_type', resolution=None):
+        """[(bucket_start, key, count)] for the range, grouped by attack_type or can_id"""
+        column = 'can_id' if by == 'can_id' else 'attack_type'
+        resolution = resolution or self.resolution_for(start, end)
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT bucket, {column}, SUM(count) FROM rollups "
+                f"WHERE resolution = ? AND bucket >= ? AND bucket < ? "
+                f"GROUP BY bucket, {column} ORDER BY bucket",
+                (resolution, int(start) - int(start) % resolution, int(end))
+            ).fetchall()
+        return resolution, rows
+
+    def totals(self, start, end, by='attack_type'):
+        """{key: count} over the range, grouped by attack_type or can_id"""
+        resolution, rows = self.timeline(start, end, by)
+        totals = {}
+        for bucket, key, count in rows:
+            totals[key] = totals.get(key, 0) + count
+        return totals
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the dashboard rollup store')
+    parser.add_argument('--rebuild', action='store_true', help='Drop all buckets and re-read the verdict log')
+    args = parser.parse_args()
+
+    store = RollupStore()
+    if args.rebuild:
+        store.db.execute("DELETE FROM rollups")
+        store.db.execute("DELETE FROM meta")
+    start = time.perf_counter()
+    folded = store.update()
+    print(f"✅ Folded {folded} verdicts into {ROLLUP_DB_FILE} in {time.perf_counter() - start:.2f}s")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import numpy as np
+from config import *
+
+
+class Rule:
+    """A vectorized predicate that decides a verdict for the frames it matches"""
+
+    def __init__(self, name, verdict, predicate):
+        self.name = name
+        self.verdict = verdict
+        self.predicate = predicate
+
+
+class TieredEvaluator:
+    """Tier 1: compiled rule masks over the whole batch. Tier 2: the ML model on the rest."""
+
+    def __init__(self, decoder, timing, rules=None):
+        self.decoder = decoder
+        self.timing = timing
+        self.known_ids = np.array(sorted(CAN_IDS.values()), dtype=np.int64)
+        # Payload length a frame needs for every byte to be covered by a signal
+        self.covered_dlc = {}
+        for sig in decoder.signals:
+            self.covered_dlc[sig.id] = max(self.covered_dlc.get(sig.id, 0), sig.end_byte)
+        self.rules = rules if rules is not None else self.default_rules()
+
+        self.frames = 0
+        self.rule_hits = {rule.name: 0 for rule in self.rules}
+        self.model_frames = 0
+        self.model_seconds = 0.0
+
+    def default_rules(self):
+        """Rules in priority order; the first match decides a frame"""
+        rules = [
+            Rule('id_above_11bit', 'FUZZING', lambda b, t: b.ids > 0x7FF),
+            Rule('unknown_id', 'FUZZING', lambda b, t: ~np.isin(b.ids, self.known_ids)),
+            Rule('all_ff_payload', 'FUZZING', lambda b, t: (b.dlc == 8) & (b.payload == 0xFF).all(axis=1)),
+            Rule('unrealistic_value', 'SPOOFING', lambda b, t: b.out_of_range),
+            Rule('timing_violation', 'FLOODING', lambda b, t: t),
+        ]
+        if PREFILTER_ACCEPT_NORMAL:
+            rules.append(Rule('profiled_in_spec', 'NORMAL', self._in_spec))
+        return rules
+
+    def _in_spec(self, batch, timing_flags):
+        """Frames fully explained by the signal database and on time for a profiled ID"""
+        covered = np.zeros(len(batch), dtype=bool)
+        for msg_id, dlc in self.covered_dlc.items():
+            if self.timing.has_profile(msg_id):
+                covered |= (batch.ids == msg_id) & (batch.dlc == dlc)
+        return covered & ~batch.out_of_range & ~timing_flags
+
+    def evaluate(self, batch, timing_flags):
+        """Return (verdicts, decided): attack type per frame and mask of rule-decided frames"""
+        n = len(batch)
+        verdicts = np.full(n, None, dtype=object)
+        decided = np.zeros(n, dtype=bool)
+        for rule in self.rules:
+            mask = rule.predicate(batch, timing_flags) & ~decided
+            hits = int(mask.sum())
+            if hits:
+                verdicts[mask] = rule.verdict
+                decided |= mask
+                self.rule_hits[rule.name] += hits
+            if decided.all():
+                break
+        self.frames += n
+        return verdicts, decided
+
+    def record_model(self, frames, seconds):
+        """Account for one model call so savings can be estimated"""
+        self.model_frames += frames
+        self.model_seconds += seconds
+
+    def stats(self):
+        """Fraction of frames resolved per tier and model CPU time saved by the rules"""
+        rule_frames = sum(self.rule_hits.values())
+        per_frame = self.model_seconds / self.model_frames if self.model_frames else 0.0
+        return {
+            'frames': self.frames,
+            'tier1_fraction': rule_frames / self.frames if self.frames else 0.0,
+            'tier2_fraction': self.model_frames / self.frames if self.frames else 0.0,
+            'rule_hits': dict(self.rule_hits),
+            'model_seconds': self.model_seconds,
+            'cpu_saved_seconds': rule_frames * per_frame
+        }
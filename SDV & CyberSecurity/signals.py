@@ -0,0 +1,132 @@
+import numpy as np
+from config import *
+
+
+class Signal:
+    """One physical signal from the signal database"""
+
+    def __init__(self, name, id, start_byte, length, byte_order='big',
+                 scale=1.0, offset=0.0, min=None, max=None, unit=''):
+        self.name = name
+        self.id = id
+        self.start_byte = start_byte
+        self.length = length
+        self.byte_order = byte_order
+        self.scale = scale
+        self.offset = offset
+        self.min = -np.inf if min is None else min
+        self.max = np.inf if max is None else max
+        self.unit = unit
+
+        # Bit shift applied to each payload byte when assembling the raw value
+        if byte_order == 'big':
+            self.shifts = [8 * (length - 1 - k) for k in range(length)]
+        else:
+            self.shifts = [8 * k for k in range(length)]
+
+    @property
+    def end_byte(self):
+        return self.start_byte + self.length
+
+    def decode(self, data):
+        """Physical value from a single payload, or None if the frame is too short"""
+        if len(data) < self.end_byte:
+            return None
+        raw = 0
+        for byte, shift in zip(data[self.start_byte:self.end_byte], self.shifts):
+            raw |= byte << shift
+        return raw * self.scale + self.offset
+
+    def in_range(self, value):
+        return self.min <= value <= self.max
+
+
+class DecodedBatch:
+    """Columnar view of a batch of frames with one column per signal"""
+
+    def __init__(self, ids, dlc, payload, values, names):
+        self.ids = ids
+        self.dlc = dlc
+        self.payload = payload
+        self.values = values
+        self.names = names
+        self.columns = {name: i for i, name in enumerate(names)}
+        self._out_of_range = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def column(self, name):
+        """Physical values of one signal (NaN where the frame does not carry it)"""
+        return self.values[:, self.columns[name]]
+
+    def row(self, i):
+        """Decoded {signal_name: value} dict for one frame of the batch"""
+        return {name: float(v) for name, v in zip(self.names, self.values[i]) if not np.isnan(v)}
+
+    @property
+    def out_of_range(self):
+        """Per-frame mask of frames carrying any physically impossible value"""
+        return self._out_of_range
+
+
+class SignalDecoder:
+    """Decode CAN frames into physical values using the signal database"""
+
+    def __init__(self, signal_database=SIGNAL_DATABASE):
+        self.signals = [Signal(**definition) for definition in signal_database]
+        self.names = [sig.name for sig in self.signals]
+        self.by_id = {}
+        for sig in self.signals:
+            self.by_id.setdefault(sig.id, []).append(sig)
+        self.mins = np.array([sig.min for sig in self.signals], dtype=float)
+        self.maxs = np.array([sig.max for sig in self.signals], dtype=float)
+
+    def decode_frame(self, msg_id, data):
+        """Decode a single frame into {signal_name: physical_value}"""
+        decoded = {}
+        for sig in self.by_id.get(msg_id, ()):
+            value = sig.decode(data)
+            if value is not None:
+                decoded[sig.name] = value
+        return decoded
+
+    def is_unrealistic(self, msg_id, decoded):
+        """True if any decoded signal of this frame is outside its physical bounds"""
+        for sig in self.by_id.get(msg_id, ()):
+            value = decoded.get(sig.name)
+            if value is not None and not sig.in_range(value):
+                return True
+        return False
+
+    def decode_batch(self, ids, payloads):
+        """Decode many frames in one vectorized pass
+
+        ids: sequence of arbitration IDs
+        payloads: sequence of byte strings / byte lists (up to 8 bytes each)
+        """
+        n = len(ids)
+        ids = np.asarray(ids, dtype=np.int64).reshape(n)
+        dlc = np.fromiter((min(len(p), 8) for p in payloads), dtype=np.int64, count=n)
+        packed = b''.join(bytes(p)[:8].ljust(8, b'\0') for p in payloads)
+        payload = np.frombuffer(packed, dtype=np.uint8).reshape(n, 8)
+
+        values = np.full((n, len(self.signals)), np.nan)
+        wide = payload.astype(np.int64)
+        for j, sig in enumerate(self.signals):
+            valid = (ids == sig.id) & (dlc >= sig.end_byte)
+            if not valid.any():
+                continue
+            raw = np.zeros(n, dtype=np.int64)
+            for k, shift in enumerate(sig.shifts):
+                raw |= wide[:, sig.start_byte + k] << shift
+            values[valid, j] = raw[valid] * sig.scale + sig.offset
+
+        batch = DecodedBatch(ids, dlc, payload, values, self.names)
+        with np.errstate(invalid='ignore'):
+            batch._out_of_range = ((values < self.mins) | (values > self.maxs)).any(axis=1)
+        return batch
+
+    def decode_messages(self, msgs):
+        """Decode a list of {'id': ..., 'data': [...]} message dicts"""
+        return self.decode_batch([m['id'] for m in msgs], [m['data'] for m in msgs])
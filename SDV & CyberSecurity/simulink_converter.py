@@ -1,5 +1,3 @@
-import pandas as pd
-import numpy as np
 from config import *
 
 class SimulinkDataConverter:
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Streaming aggregation service for the IDS dashboard.
+
+Tails the IDS verdict and incident logs once, keeps rolling aggregates in memory
+and pushes incremental deltas to every dashboard client over Server-Sent Events.
+"""
+
+import os
+import csv
+import io
+import json
+import time
+import queue
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import *
+from alerts import tail_verdicts, verdict_offset_at
+from rollups import RollupStore
+from history import HistoryStore
+
+
+class LogFollower:
+    """Incrementally read rows appended to the incident CSV log"""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.header = None
+
+    def read_new(self):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            self.offset, self.header = 0, None
+            return []
+        if size < self.offset:
+            self.offset, self.header = 0, None
+        if size == self.offset:
+            return []
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            chunk = f.read(size - self.offset)
+        # Only consume complete lines; a partially written row is picked up next tick
+        end = chunk.rfind(b'\n') + 1
+        if not end:
+            return []
+        self.offset += end
+        rows = list(csv.reader(io.StringIO(chunk[:end].decode('utf-8', 'replace'))))
+        if self.header is None and rows:
+            self.header, rows = rows[0], rows[1:]
+        return [dict(zip(self.header, row)) for row in rows if row]
+
+
+class RollingAggregates:
+    """Running totals and a per-minute timeline, updated from new verdicts"""
+
+    def __init__(self):
+        self.totals = {'frames': 0, 'anomalies': 0}
+        self.by_type = {}
+        self.timeline = {}   # minute epoch -> {attack_type: count}
+        self.incidents = deque(maxlen=STREAM_RECENT_INCIDENTS)
+        self.rate = 0.0
+        self.last_ts = None
+
+    def apply(self, verdicts, incidents, elapsed):
+        """Fold new records in and return the delta describing the change"""
+        delta_types = {}
+        anomalies = 0
+        for ts, msg_id, data, prediction, attack_type in verdicts:
+            delta_types[attack_type] = delta_types.get(attack_type, 0) + 1
+            if prediction == -1:
+                anomalies += 1
+            bucket = self.timeline.setdefault(int(ts // 60) * 60, {})
+            bucket[attack_type] = bucket.get(attack_type, 0) + 1
+            self.last_ts = ts
+
+        self.totals['frames'] += len(verdicts)
+        self.totals['anomalies'] += anomalies
+        for attack_type, count in delta_types.items():
+            self.by_type[attack_type] = self.by_type.get(attack_type, 0) + count
+        self._trim_timeline()
+        self.incidents.extend(incidents)
+        self.rate = len(verdicts) / elapsed if elapsed > 0 else 0.0
+
+        return {
+            'type': 'delta',
+            'frames': len(verdicts),
+            'anomalies': anomalies,
+            'by_type': delta_types,
+            'incidents': incidents,
+            'rate': round(self.rate, 1)
+        }
+
+    def _trim_timeline(self):
+        if not self.timeline:
+            return
+        cutoff = max(self.timeline) - STREAM_TIMELINE_MINUTES * 60
+        for minute in [m for m in self.timeline if m <= cutoff]:
+            del self.timeline[minute]
+
+    def snapshot(self):
+        return {
+            'type': 'snapshot',
+            'totals': dict(self.totals),
+            'by_type': dict(self.by_type),
+            'timeline': {str(k): v for k, v in sorted(self.timeline.items())},
+            'incidents': list(self.incidents),
+            'rate': round(self.rate, 1)
+        }
+
+
+class StreamServer:
+    """Aggregate IDS output once and fan deltas out to subscribed clients"""
+
+    def __init__(self, verdict_file=VERDICT_LOG_FILE, incident_file=LOG_FILE):
+        self.verdict_file = verdict_file
+        # Aggregates cover the rolling window, so skip older history on startup
+        self.verdict_offset = verdict_offset_at(verdict_file, time.time() - STREAM_TIMELINE_MINUTES * 60)
+        self.incident_log = LogFollower(incident_file)
+        self.aggregates = RollingAggregates()
+        self.rollups = RollupStore(verdict_file=verdict_file)
+        self.history = HistoryStore(verdict_file=verdict_file)
+        self.clients = set()
+        self.lock = threading.Lock()
+        self.running = False
+
+    def subscribe(self):
+        """Register a client; it receives the current snapshot first"""
+        q = queue.Queue(maxsize=STREAM_CLIENT_QUEUE)
+        with self.lock:
+            q.put_nowait(self.aggregates.snapshot())
+            self.clients.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            self.clients.discard(q)
+
+    def tick(self, elapsed):
+        """Read newly appended records and broadcast the resulting delta"""
+        try:
+            self.rollups.update()
+        except Exception as e:
+            print(f"⚠️ Rollup update failed: {e}")
+        try:
+            self.history.update()
+        except Exception as e:
+            print(f"⚠️ History update failed: {e}")
+        verdicts, self.verdict_offset = tail_verdicts(self.verdict_file, self.verdict_offset)
+        incidents = self.incident_log.read_new()
+        if not verdicts and not incidents:
+            return None
+        with self.lock:
+            delta = self.aggregates.apply(verdicts, incidents, elapsed)
+            for q in list(self.clients):
+                try:
+                    q.put_nowait(delta)
+                except queue.Full:
+                    # Resync a stalled client with one snapshot instead of a backlog of deltas
+                    with q.mutex:
+                        q.queue.clear()
+                    q.put_nowait(self.aggregates.snapshot())
+        return delta
+
+    def run(self):
+        self.running = True
+        last = time.monotonic()
+        while self.running:
+            time.sleep(STREAM_TICK)
+            now = time.monotonic()
+            try:
+                self.tick(now - last)
+            except Exception as e:
+                # A bad tick must not end the only thread that feeds the clients
+                print(f"⚠️ Stream tick failed: {e}")
+            last = now
+
+    def snapshot(self):
+        with self.lock:
+            return self.aggregates.snapshot()
+
+
+def make_handler(stream):
+    class StreamHandler(BaseHTTPRequestHandler):
+        def _headers(self, content_type):
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+
+        def do_GET(self):
+            path = self.path.split('?')[0]
+            if path == '/snapshot':
+                self._headers('application/json')
+                self.wfile.write(json.dumps(stream.snapshot()).encode())
+            elif path == '/events':
+                self._stream_events()
+            else:
+                self.send_error(404)
+
+        def _stream_events(self):
+            self._headers('text/event-stream')
+            q = stream.subscribe()
+            try:
+                while True:
+                    try:
+                        event = q.get(timeout=15)
+                        self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+                    except queue.Empty:
+                        self.wfile.write(b": keep-alive\n\n")
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                stream.unsubscribe(q)
+
+        def log_message(self, *args):
+            pass
+
+    return StreamHandler
+
+
+def start_stream_server(host=STREAM_HOST, port=STREAM_PORT):
+    """Start the aggregator and HTTP endpoints on daemon threads"""
+    stream = StreamServer()
+    threading.Thread(target=stream.run, daemon=True).start()
+    server = ThreadingHTTPServer((host, port), make_handler(stream))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return stream, server
+
+
+def main():
+    stream, server = start_stream_server()
+    print(f"📡 Dashboard stream on http://{STREAM_HOST}:{STREAM_PORT}/events "
+          f"(snapshot: /snapshot)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stream.running = False
+        server.shutdown()
+        print("\n🛑 Stream server stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Per-ID inter-arrival timing anomaly detector with learned periodicity profiles
+"""
+
+import json
+import math
+import time
+import argparse
+from config import *
+
+
+class QuantileSketch:
+    """Log-bucketed streaming quantile sketch with bounded relative error"""
+
+    def __init__(self, accuracy=TIMING_SKETCH_ACCURACY):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.count = 0
+        self.zeros = 0
+
+    def add(self, value):
+        self.count += 1
+        if value <= 0:
+            self.zeros += 1
+            return
+        key = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                # Midpoint of the bucket (gamma^(k-1), gamma^k]
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class TimingProfile:
+    """Compact learned period and jitter band for one CAN ID"""
+    __slots__ = ('period', 'low', 'high', 'samples')
+
+    def __init__(self, period, low, high, samples):
+        self.period = period
+        self.low = low
+        self.high = high
+        self.samples = samples
+
+    def to_dict(self):
+        return {'period': self.period, 'low': self.low, 'high': self.high, 'samples': self.samples}
+
+
+class TimingDetector:
+    """Flag frames arriving earlier than an ID's learned period allows"""
+
+    def __init__(self, profiles=None, tolerance=TIMING_TOLERANCE,
+                 min_violations=TIMING_MIN_VIOLATIONS):
+        self.profiles = profiles or {}
+        self.tolerance = tolerance
+        self.min_violations = min_violations
+        self.last_seen = {}
+        self.violations = {}
+        # Precomputed early-arrival threshold per ID keeps observe() to a dict lookup and compare
+        self.early_limits = {msg_id: p.low * (1 - tolerance) for msg_id, p in self.profiles.items()}
+        self.sketches = {}
+
+    # Learning -----------------------------------------------------------
+
+    def learn(self, msg_id, timestamp):
+        """Feed one frame of known-normal traffic into the per-ID sketches"""
+        last = self.last_seen.get(msg_id)
+        self.last_seen[msg_id] = timestamp
+        if last is None:
+            return
+        sketch = self.sketches.get(msg_id)
+        if sketch is None:
+            sketch = self.sketches[msg_id] = QuantileSketch()
+        sketch.add(timestamp - last)
+
+    def build_profiles(self, min_samples=TIMING_MIN_SAMPLES):
+        """Freeze learned sketches into compact profiles"""
+        for msg_id, sketch in self.sketches.items():
+            if sketch.count < min_samples:
+                continue
+            self.profiles[msg_id] = TimingProfile(
+                period=sketch.quantile(0.5),
+                low=sketch.quantile(TIMING_LOW_QUANTILE),
+                high=sketch.quantile(TIMING_HIGH_QUANTILE),
+                samples=sketch.count
+            )
+        self.early_limits = {msg_id: p.low * (1 - self.tolerance) for msg_id, p in self.profiles.items()}
+        self.sketches = {}
+        self.last_seen = {}
+        return self.profiles
+
+    # Detection ----------------------------------------------------------
+
+    def observe(self, msg_id, timestamp):
+        """Return True when this frame breaks the ID's learned periodicity (O(1))"""
+        last = self.last_seen.get(msg_id)
+        self.last_seen[msg_id] = timestamp
+        limit = self.early_limits.get(msg_id)
+        if last is None or limit is None:
+            return False
+
+        # Leaky violation count: early arrivals add one, on-time arrivals drain one.
+        # Only early frames are flagged, once the count shows a sustained pattern.
+        count = self.violations.get(msg_id, 0)
+        early = timestamp - last < limit
+        if early:
+            count = min(count + 1, 2 * self.min_violations)
+        elif count:
+            count -= 1
+        self.violations[msg_id] = count
+        return early and count >= self.min_violations
+
+    def has_profile(self, msg_id):
+        return msg_id in self.early_limits
+
+    # Persistence --------------------------------------------------------
+
+    def save(self, path=TIMING_PROFILE_FILE):
+        with open(path, 'w') as f:
+            json.dump({f"0x{msg_id:03X}": p.to_dict() for msg_id, p in self.profiles.items()}, f, indent=2)
+
+    @classmethod
+    def load(cls, path=TIMING_PROFILE_FILE, **kwargs):
+        with open(path) as f:
+            raw = json.load(f)
+        profiles = {int(key, 16): TimingProfile(**value) for key, value in raw.items()}
+        return cls(profiles, **kwargs)
+
+
+def learn_from_verdicts(path):
+    """Learn profiles from frames marked normal in a binary verdict file"""
+    from alerts import read_verdicts
+
+    detector = TimingDetector()
+    for timestamp, msg_id, data, prediction, attack_type in read_verdicts(path):
+        if prediction == 1:
+            detector.learn(msg_id, timestamp)
+    return detector
+
+
+def learn_from_bus(seconds):
+    """Learn profiles from live traffic assumed to be attack-free"""
+    import can
+
+    detector = TimingDetector()
+    bus = can.interface.Bus(channel=CAN_CHANNEL, interface=CAN_INTERFACE)
+    print(f"📡 Capturing normal traffic for {seconds}s...")
+    deadline = time.time() + seconds
+    try:
+        while time.time() < deadline:
+            msg = bus.recv(timeout=RECV_TIMEOUT)
+            if msg:
+                detector.learn(msg.arbitration_id, msg.timestamp or time.time())
+    finally:
+        bus.shutdown()
+    return detector
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Learn CAN timing profiles from normal traffic')
+    parser.add_argument('--from-verdicts', help='Binary verdict file to learn from (normal frames only)')
+    parser.add_argument('--seconds', type=float, default=60, help='Live capture duration [60]')
+    parser.add_argument('--output', default=TIMING_PROFILE_FILE, help=f'Profile file [{TIMING_PROFILE_FILE}]')
+    args = parser.parse_args()
+
+    if args.from_verdicts:
+        detector = learn_from_verdicts(args.from_verdicts)
+    else:
+        detector = learn_from_bus(args.seconds)
+
+    profiles = detector.build_profiles()
+    if not profiles:
+        print("❌ Not enough traffic to build any timing profile")
+        return
+    detector.save(args.output)
+    for msg_id, p in sorted(profiles.items()):
+        print(f"⏱️ ID=0x{msg_id:03X}: period {p.period * 1000:.1f} ms, "
+              f"band [{p.low * 1000:.1f}, {p.high * 1000:.1f}] ms from {p.samples} samples")
+    print(f"✅ Timing profiles saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,14 @@
 import pandas as pd
-from sklearn.ensemble import IsolationForest, RandomForestClassifier
-from sklearn.model_selection import train_test_split, TimeSeriesSplit
-from sklearn.metrics import classification_report, confusion_matrix, roc_auc_score
-from sklearn.preprocessing import StandardScaler
-import xgboost as xgb
 import joblib
 import ast
 import numpy as np
 from config import *
+from signals import SignalDecoder
+
+# Spoofing labels come from speed and RPM only, as they always have; labeling on the other
+# signals of the database would change what existing models were trained on
+LABEL_SIGNALS = ('speed', 'rpm')
+signal_decoder = SignalDecoder([sig for sig in SIGNAL_DATABASE if sig['name'] in LABEL_SIGNALS])
 def extract_enhanced_features(df):
     """Extract enhanced features with temporal and statistical analysis"""
     features_list = []
@@ -54,6 +55,11 @@ def extract_enhanced_features(df):
 
 def train_enhanced_models():
     """Train multiple ML models with enhanced features"""
+    from sklearn.ensemble import IsolationForest, RandomForestClassifier
+    from sklearn.model_selection import train_test_split, TimeSeriesSplit
+    from sklearn.metrics import classification_report, roc_auc_score
+    import xgboost as xgb
+    
     try:
         print("📊 Loading training data...")
         df = pd.read_csv(TRAINING_DATA_FILE)
@@ -166,14 +172,10 @@ def classify_attack_type(row):
         if label == 0:  # Normal traffic
             return 'NORMAL'
         
-        # Simple heuristic classification
-        if msg_id == CAN_IDS['SPEED'] and len(data) > 0:
-            if data[0] > 200:  # Unrealistic speed
-                return 'SPOOFING'
-        elif msg_id == CAN_IDS['RPM'] and len(data) >= 2:
-            rpm = int.from_bytes(data[:2], byteorder='big')
-            if rpm > 8000:  # Unrealistic RPM
-                return 'SPOOFING'
+        # Simple heuristic classification: physically impossible signal values
+        decoded = signal_decoder.decode_frame(msg_id, data)
+        if signal_decoder.is_unrealistic(msg_id, decoded):
+            return 'SPOOFING'
         
         # Check for fuzzing patterns
         if all(b == 0xFF for b in data):  # All max values
@@ -280,6 +282,8 @@ def generate_enhanced_synthetic_data():
 
 def train_ids_model():
     """Train simple IDS model"""
+    from sklearn.ensemble import IsolationForest
+    
     try:
         print("📊 Loading training data...")
         df = pd.read_csv(TRAINING_DATA_FILE)